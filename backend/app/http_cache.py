@@ -0,0 +1,170 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+
+try:
+    import brotli
+except ImportError:  # optional: gzip is always available
+    brotli = None
+
+# Conditional GET helpers. ETags are derived from data versions (registry
+# content hash, template index hash, template file stamp), so a request
+# for an unchanged resource is answered with 304 before anything is
+# loaded or serialized.
+#
+# With FAST_RESPONSES=1, hot read-only responses are also serialized and
+# compressed once per data version and served from memory as bytes.
+# Large one-off bodies (readings aggregates) are compressed in the handler
+# at a fast level; the GZip middleware passes pre-encoded bodies through.
+
+FAST_RESPONSES = os.getenv("FAST_RESPONSES", "0") == "1"
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+FAST_GZIP_LEVEL = 1
+FAST_BROTLI_QUALITY = 1
+MIN_COMPRESS_SIZE = 1024
+
+REGISTRY_CACHE_CONTROL = "public, max-age=60, must-revalidate"
+TEMPLATE_CACHE_CONTROL = "no-cache"
+
+
+def make_etag(*parts) -> str:
+    """Strong ETag from a version and any request parameters that shape the body."""
+    digest = hashlib.sha256("\x1f".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+
+def _etag_matches_strong(if_match: str, etag: str) -> bool:
+    if if_match.strip() == "*":
+        return True
+    # Strong comparison, as RFC 9110 requires for If-Match: a weak tag never matches
+    if etag.startswith("W/"):
+        return False
+    return etag in {tag.strip() for tag in if_match.split(",")}
+
+
+def not_modified(request: Request, etag: str, cache_control: str) -> Response | None:
+    """Return a 304 response if the client already holds `etag`, else None."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+    return None
+
+
+def precondition_failed(request: Request, etag: str) -> Response | None:
+    """Return a 412 response if an If-Match header does not match `etag`, else None."""
+    if_match = request.headers.get("if-match")
+    if if_match and not _etag_matches_strong(if_match, etag):
+        return JSONResponse(status_code=412, content={"error": "Resource has changed"}, headers={"ETag": etag})
+    return None
+
+
+def set_cache_headers(response: Response, etag: str, cache_control: str) -> None:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+
+
+def negotiate_encoding(accept_encoding: str) -> str | None:
+    """Pick "br" or "gzip" from an Accept-Encoding header, or None for identity."""
+    offered: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        offered[coding.strip().lower()] = q
+    if brotli is not None and offered.get("br", 0) > 0:
+        return "br"
+    if offered.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+class EncodedBody:
+    """A JSON body kept as bytes, compressed lazily once per encoding."""
+
+    def __init__(self, body: bytes, gzip_level: int = GZIP_LEVEL, brotli_quality: int = BROTLI_QUALITY):
+        self.identity = body
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self._encoded: dict[str, bytes] = {}
+
+    def get(self, encoding: str | None) -> bytes:
+        if encoding is None or len(self.identity) < MIN_COMPRESS_SIZE:
+            return self.identity
+        if encoding not in self._encoded:
+            if encoding == "br":
+                self._encoded[encoding] = brotli.compress(self.identity, quality=self.brotli_quality)
+            else:
+                self._encoded[encoding] = gzip.compress(self.identity, compresslevel=self.gzip_level)
+        return self._encoded[encoding]
+
+
+class EncodedBodyCache:
+    """Small LRU of EncodedBody keyed by (data version, request key)."""
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple, EncodedBody] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple, build: Callable[[], bytes]) -> EncodedBody:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+        entry = EncodedBody(build())
+        with self._lock:
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+
+def encoded_response(request: Request, body: EncodedBody, etag: str, cache_control: str) -> Response:
+    """Serve a pre-serialized JSON body with the best encoding the client accepts."""
+    encoding = negotiate_encoding(request.headers.get("accept-encoding", ""))
+    content = body.get(encoding)
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if content is not body.identity:
+        headers["Content-Encoding"] = encoding
+    return Response(content=content, media_type="application/json", headers=headers)
+
+
+def fast_json_response(request: Request, content) -> Response:
+    """
+    Serialize `content` like JSONResponse and compress it at a fast level.
+    For large bodies that are built per request, where GZIP_LEVEL would
+    cost more than the query.
+    """
+    body = EncodedBody(
+        json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8"),
+        gzip_level=FAST_GZIP_LEVEL,
+        brotli_quality=FAST_BROTLI_QUALITY,
+    )
+    encoding = negotiate_encoding(request.headers.get("accept-encoding", ""))
+    data = body.get(encoding)
+    headers = {"Vary": "Accept-Encoding"}
+    if data is not body.identity:
+        headers["Content-Encoding"] = encoding
+    return Response(content=data, media_type="application/json", headers=headers)
@@ -1,11 +1,37 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import parameters, formulas, onboarding, suggestions, imports, templates
+from fastapi.middleware.gzip import GZipMiddleware
+from app.metrics import REGISTRY, MetricsMiddleware
+from app.routers import parameters, formulas, onboarding, suggestions, imports, templates, readings
+from app.services import ai_suggester, cpu_pool, parameter_service, template_store
+
+
+def preload_shared_state() -> None:
+    """
+    Load the registry and build the suggestion/ranking and template indexes.
+    Under gunicorn (gunicorn.conf.py) this runs once in the master before
+    workers fork, so every worker starts with them already in memory.
+    """
+    parameter_service.registry.refresh()
+    ai_suggester.build_indexes()
+    template_store.store.index_digest()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    preload_shared_state()  # no-op when the gunicorn master already did it
+    yield
+    cpu_pool.pool.shutdown()
+
 
 app = FastAPI(
     title="Plant Onboarding API",
     description="Backend for the plant onboarding wizard",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 # CORS — allow everything for production demo
@@ -15,8 +41,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets the cross-origin frontend read ETags and send them back as If-Match
+    expose_headers=["ETag"],
 )
 
+# Compress large responses (templates, imports); pre-encoded ones pass through
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=6)
+
+# Outermost, so latency and response sizes reflect what goes on the wire
+app.add_middleware(MetricsMiddleware)
+
 # Mount routers
 app.include_router(parameters.router)
 app.include_router(formulas.router)
@@ -24,8 +58,15 @@ app.include_router(onboarding.router)
 app.include_router(suggestions.router)
 app.include_router(imports.router)
 app.include_router(templates.router)
+app.include_router(readings.router)
 
 
 @app.get("/")
 def root():
     return {"message": "Plant Onboarding API is running"}
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus text exposition of request and service metrics."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,201 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Minimal in-process metrics with Prometheus text exposition.
+# - MetricsMiddleware records per-route latency, request/response sizes
+#   and in-flight requests
+# - timed("operation") records time spent inside services (registry
+#   loading, formula compilation, CSV parsing, template disk I/O)
+# Metrics are per process; under gunicorn each scrape of /metrics is
+# answered by one worker.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._lock = threading.Lock()
+
+    def _header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = self._header()
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., sum, count]
+        self._series: dict[tuple[str, ...], list[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = self._header()
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    le = _format_labels(self.labels, labels, f'le="{_format_value(float(bound))}"')
+                    lines.append(f"{self.name}_bucket{le} {cumulative}")
+                le = _format_labels(self.labels, labels, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{le} {series[-1]}")
+                base = _format_labels(self.labels, labels)
+                lines.append(f"{self.name}_sum{base} {_format_value(series[-2])}")
+                lines.append(f"{self.name}_count{base} {series[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: list[_Metric] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+http_request_duration = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ("method", "route", "status"),
+))
+http_request_size = REGISTRY.register(Histogram(
+    "http_request_size_bytes", "HTTP request body size by route.", ("method", "route"), SIZE_BUCKETS,
+))
+http_response_size = REGISTRY.register(Histogram(
+    "http_response_size_bytes", "HTTP response body size by route.", ("method", "route"), SIZE_BUCKETS,
+))
+http_requests_in_flight = REGISTRY.register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served.", ("method",),
+))
+service_operation_duration = REGISTRY.register(Histogram(
+    "service_operation_duration_seconds", "Time spent inside service operations.", ("operation",),
+))
+
+
+@contextmanager
+def timed(operation: str):
+    """Record the duration of the enclosed block under `operation`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        service_operation_duration.observe(time.perf_counter() - start, operation)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware, so streamed responses are measured until the
+    last body chunk rather than when the handler returns.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        start = time.perf_counter()
+        request_size = 0
+        response_size = 0
+        status = "500"
+
+        async def receive_wrapper() -> Message:
+            nonlocal request_size
+            message = await receive()
+            if message["type"] == "http.request":
+                request_size += len(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal response_size, status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            elif message["type"] == "http.response.body":
+                response_size += len(message.get("body", b""))
+            await send(message)
+
+        http_requests_in_flight.inc(method)
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            http_requests_in_flight.dec(method)
+            # Route templates (not raw paths) keep label cardinality bounded
+            route = getattr(scope.get("route"), "path", "<unmatched>")
+            http_request_duration.observe(time.perf_counter() - start, method, route, status)
+            http_request_size.observe(request_size, method, route)
+            http_response_size.observe(response_size, method, route)
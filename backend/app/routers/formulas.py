@@ -1,9 +1,22 @@
 from fastapi import APIRouter
-from app.schemas import FormulaValidationRequest, FormulaValidationResponse
-from app.services.formula_validator import validate_formula
+from fastapi.responses import JSONResponse
+from app.schemas import (
+    FormulaValidationRequest,
+    FormulaValidationResponse,
+    BatchFormulaValidationRequest,
+    BatchFormulaValidationResponse,
+)
+from app.services.cpu_pool import PoolError, pool
+from app.services.formula_dry_run import DryRunError
+from app.services.formula_validator import validate_formula, validate_formulas
+from app.services.parameter_service import registry
 
 router = APIRouter(prefix="/api", tags=["formulas"])
 
+# Smaller batches validate faster in-process than a round trip to the pool;
+# single-formula validation (every keystroke) always stays in-process
+POOL_MIN_FORMULAS = 100
+
 
 @router.post("/validate-formula", response_model=FormulaValidationResponse)
 def validate_formula_endpoint(req: FormulaValidationRequest):
@@ -12,6 +25,43 @@ def validate_formula_endpoint(req: FormulaValidationRequest):
     - Checks syntax
     - Ensures referenced parameters exist in enabled list
     - Blocks unsafe tokens
+    - dry_run: evaluates over sample inputs (generated, or `samples`
+      columns) and reports division by zero, NaN/inf and, for "%" units
+      with samples, out-of-range results
     """
-    result = validate_formula(req.expression, req.enabled_parameters)
+    try:
+        result = validate_formula(req.expression, req.enabled_parameters, req.dry_run, req.samples, req.unit)
+    except DryRunError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
     return FormulaValidationResponse(**result)
+
+
+@router.post("/validate-formulas", response_model=BatchFormulaValidationResponse)
+async def validate_formulas_endpoint(req: BatchFormulaValidationRequest):
+    """
+    Validate many formulas in one round trip.
+    - Shares one enabled-parameter list across all expressions
+    - Reports cycles between calculated parameters
+    - Warns about references to calculated parameters with no formula
+    - dry_run: evaluates the formulas in order over one sample grid;
+      units default to the registry's
+    Large batches run in the CPU process pool.
+    """
+    calculated = registry.by_categories(["calculated"])
+    units = {p["name"]: p["unit"] for p in calculated} | req.units
+    try:
+        result = await pool.run(
+            validate_formulas,
+            [f.model_dump() for f in req.formulas],
+            req.enabled_parameters,
+            {p["name"] for p in calculated},
+            req.dry_run,
+            req.samples,
+            units,
+            offload=len(req.formulas) >= POOL_MIN_FORMULAS,
+        )
+    except PoolError as e:
+        return JSONResponse(status_code=e.status_code, content={"error": str(e)})
+    except DryRunError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    return BatchFormulaValidationResponse(**result)
@@ -1,61 +1,190 @@
 from fastapi import APIRouter, UploadFile, File
-from fastapi.responses import JSONResponse
-import csv
-import io
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import iterate_in_threadpool
+from typing import BinaryIO
+import anyio.to_thread
+import json
+import os
+
+from app.schemas import MergePlanApplyRequest
+from app.services.cpu_pool import PoolError, pool
+from app.services.import_merge import ImportMerger, MergePlanConflict, apply_merge_plan
+from app.services.import_service import (
+    CHUNK_SIZE,
+    VALID_CATEGORIES,
+    ParameterImportError,
+    import_csv,
+    import_rows,
+    iter_xlsx_batches,
+)
 
 router = APIRouter(prefix="/api", tags=["import"])
 
 
-@router.post("/import-parameters")
-async def import_parameters(file: UploadFile = File(...)):
-    """
-    Import parameters from a CSV/Excel file.
-    Expected columns: name, display_name, unit, category, section
-    """
+def _check_extension(file: UploadFile) -> JSONResponse | str:
+    """Return the lowercased extension, or an error response."""
     if not file.filename:
         return JSONResponse(status_code=400, content={"error": "No file provided"})
 
     ext = file.filename.rsplit(".", 1)[-1].lower() if "." in file.filename else ""
-    if ext not in ("csv", "tsv", "txt"):
+    if ext not in ("csv", "tsv", "txt", "xlsx"):
         return JSONResponse(
             status_code=400,
-            content={"error": f"Unsupported file type: .{ext}. Please upload a CSV file."},
+            content={"error": f"Unsupported file type: .{ext}. Please upload a CSV or .xlsx file."},
         )
+    return ext
 
-    content = await file.read()
-    text = content.decode("utf-8-sig")  # Handle BOM
-    reader = csv.DictReader(io.StringIO(text))
 
-    required_cols = {"name", "display_name", "unit", "category", "section"}
-    if not reader.fieldnames or not required_cols.issubset(set(reader.fieldnames)):
-        missing = required_cols - set(reader.fieldnames or [])
-        return JSONResponse(
-            status_code=400,
-            content={"error": f"Missing required columns: {', '.join(sorted(missing))}"},
-        )
+def _detach(file: UploadFile) -> BinaryIO:
+    """
+    A handle on the upload that outlives the endpoint: FastAPI closes the
+    UploadFile when the handler returns, before a streamed body is sent.
+    fileno() moves an in-memory spool to its temp file first.
+    """
+    f = file.file
+    f.seek(0)
+    return os.fdopen(os.dup(f.fileno()), "rb")
+
+
+async def _read_chunks(f: BinaryIO):
+    try:
+        while chunk := await anyio.to_thread.run_sync(f.read, CHUNK_SIZE):
+            yield chunk
+    finally:
+        f.close()
+
+
+def _iter_workbook(f: BinaryIO):
+    try:
+        yield from iter_xlsx_batches(f)
+    finally:
+        f.close()
+
+
+def _import_events(file: UploadFile, ext: str):
+    f = _detach(file)
+    if ext == "xlsx":
+        # openpyxl is synchronous; iterate the workbook off the event loop.
+        # A workbook is one sequential XML stream, so it is not split into pool jobs.
+        events = import_rows(iterate_in_threadpool(_iter_workbook(f)))
+    else:
+        # Each decoded chunk is parsed and validated in the CPU process pool
+        events = import_csv(_read_chunks(f), run=pool.run)
+    return _with_merge(events)
+
+
+async def _with_merge(events):
+    """
+    Classify each validated batch against the registry (see import_merge).
+    Runs here rather than in the pool, so the registry index is built once
+    per import and never shipped to workers.
+    """
+    merger = None
+    async for event in events:
+        if merger is None:
+            merger = await anyio.to_thread.run_sync(ImportMerger)
+        if "summary" in event:
+            event["summary"]["merge"] = dict(merger.totals)
+        else:
+            event["merge"] = merger.classify(event["parameters"])
+        yield event
+
+
+@router.post("/import-parameters")
+async def import_parameters(file: UploadFile = File(...)):
+    """
+    Import parameters from a CSV/Excel file.
+    Expected columns: name, display_name, unit, category, section
+    Every sheet of an .xlsx workbook is imported.
+    `merge` classifies the rows against the registry: a merge plan
+    ({add, conflicts}) for POST /import-parameters/merge, the rows that
+    repeat an earlier name in the file, and counts per class.
+    """
+    ext = _check_extension(file)
+    if isinstance(ext, JSONResponse):
+        return ext
 
     parameters = []
     errors = []
-    for i, row in enumerate(reader, start=2):
-        name = row.get("name", "").strip()
-        if not name:
-            errors.append(f"Row {i}: missing name")
-            continue
-        if row.get("category", "").strip() not in ("input", "output", "calculated"):
-            errors.append(f"Row {i}: invalid category '{row.get('category', '')}'")
-            continue
-        parameters.append({
-            "name": name,
-            "display_name": row.get("display_name", name).strip(),
-            "unit": row.get("unit", "").strip(),
-            "category": row.get("category", "input").strip(),
-            "section": row.get("section", "IMPORTED").strip(),
-            "applicable_asset_types": [],
-            "enabled": True,
-        })
+    merge = {"summary": {}, "add": [], "conflicts": [], "duplicates": []}
+    try:
+        async for event in _import_events(file, ext):
+            if "summary" in event:
+                merge["summary"] = event["summary"]["merge"]
+            else:
+                parameters.extend(event["parameters"])
+                errors.extend(event["errors"])
+                for key in ("add", "conflicts", "duplicates"):
+                    merge[key].extend(event["merge"][key])
+    except ParameterImportError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    except PoolError as e:
+        return JSONResponse(status_code=e.status_code, content={"error": str(e)})
 
     return {
         "parameters": parameters,
         "count": len(parameters),
         "errors": errors,
+        "merge": merge,
     }
+
+
+@router.post("/import-parameters/stream")
+async def import_parameters_stream(file: UploadFile = File(...)):
+    """
+    Import parameters from a large CSV/Excel file as NDJSON.
+    The upload is parsed in bounded chunks; each line of the response is a
+    batch {"parameters": [...], "errors": [...], "merge": {...}}, and the
+    last line is {"summary": {"count", "error_count", "rows", "merge"}}.
+    If the import fails midway, the last line is {"error": "..."} instead.
+    """
+    ext = _check_extension(file)
+    if isinstance(ext, JSONResponse):
+        return ext
+
+    events = _import_events(file, ext)
+    try:
+        # Pull the first batch up front so header errors still get a 400
+        first = await events.__anext__()
+    except ParameterImportError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    except PoolError as e:
+        return JSONResponse(status_code=e.status_code, content={"error": str(e)})
+
+    async def body():
+        yield json.dumps(first) + "\n"
+        try:
+            async for event in events:
+                yield json.dumps(event) + "\n"
+        except (ParameterImportError, PoolError) as e:
+            yield json.dumps({"error": str(e)}) + "\n"
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+
+@router.post("/import-parameters/merge")
+def apply_import_merge(request: MergePlanApplyRequest):
+    """
+    Apply a merge plan from an import to the parameter registry.
+    - add: new parameters to append
+    - conflicts: the plan's conflicts; `replace` names those that take the
+      imported fields, the others keep the registry's
+    All or nothing: if the registry changed under the plan, nothing is
+    written and 409 lists the affected names, so the import can be re-run.
+    """
+    replaced = set(request.replace)
+    categories = {p.category for p in request.add} | {
+        c.incoming.category for c in request.conflicts if c.name in replaced}
+    bad = sorted(categories - set(VALID_CATEGORIES))
+    if bad:
+        return JSONResponse(status_code=400, content={"error": f"Invalid category: {', '.join(bad)}"})
+    try:
+        return apply_merge_plan(
+            [p.model_dump() for p in request.add],
+            [c.model_dump() for c in request.conflicts],
+            request.replace,
+        )
+    except MergePlanConflict as e:
+        return JSONResponse(status_code=409, content={"error": str(e), "names": e.names})
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
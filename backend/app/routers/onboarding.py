@@ -1,6 +1,9 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Query
+from fastapi.responses import JSONResponse
 from app.schemas import OnboardingPayload
-from datetime import datetime
+from app.services.formula_engine import FormulaError
+from app.services.formula_graph import FormulaGraph
+from app.services.onboarding_store import store
 
 router = APIRouter(prefix="/api", tags=["onboarding"])
 
@@ -9,17 +12,42 @@ router = APIRouter(prefix="/api", tags=["onboarding"])
 def submit_onboarding(payload: OnboardingPayload):
     """
     Accept the final onboarding JSON payload.
-    In production this would persist to a database.
-    For now, log and return confirmation.
+    Plant, assets, parameters and formulas are persisted to SQLite
+    in a single transaction.
     """
+    try:
+        graph = FormulaGraph([f.model_dump() for f in payload.formulas])
+    except FormulaError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+
+    plant = store.save(payload.model_dump())
+
     return {
         "status": "success",
         "message": f"Plant '{payload.plant.name}' onboarded successfully",
         "summary": {
+            "plant_id": plant["id"],
             "plant_name": payload.plant.name,
             "num_assets": len(payload.assets),
             "num_parameters": len(payload.parameters),
             "num_formulas": len(payload.formulas),
-            "submitted_at": datetime.utcnow().isoformat()
+            "evaluation_order": graph.order,
+            "submitted_at": plant["submitted_at"]
         }
     }
+
+
+@router.get("/plants")
+def list_plants(offset: int = Query(0, ge=0), limit: int = Query(50, ge=1, le=500)):
+    """Page through onboarded plants, newest first."""
+    plants, total = store.list_plants(offset, limit)
+    return {"plants": plants, "total": total, "offset": offset, "limit": limit}
+
+
+@router.get("/plants/{plant_id}")
+def get_plant(plant_id: int):
+    """Load an onboarded plant with its assets, parameters and formulas."""
+    plant = store.get_plant(plant_id)
+    if plant is None:
+        return JSONResponse(status_code=404, content={"error": "Plant not found"})
+    return plant
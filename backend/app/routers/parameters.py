@@ -1,18 +1,54 @@
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Query, Request, Response
+from pydantic import TypeAdapter
 from typing import Optional
-from app.services.parameter_service import filter_parameters
+from app.http_cache import (
+    FAST_RESPONSES,
+    REGISTRY_CACHE_CONTROL,
+    EncodedBodyCache,
+    encoded_response,
+    make_etag,
+    not_modified,
+    set_cache_headers,
+)
+from app.services.parameter_service import filter_parameters, registry
 from app.schemas import ParameterOut
 
 router = APIRouter(prefix="/api", tags=["parameters"])
 
+_parameter_list = TypeAdapter(list[ParameterOut])
+_bodies = EncodedBodyCache()
+
 
 @router.get("/parameters", response_model=list[ParameterOut])
-def get_parameters(asset_types: Optional[str] = Query(None, description="Comma-separated asset types")):
+def get_parameters(
+    request: Request,
+    response: Response,
+    asset_types: Optional[str] = Query(None, description="Comma-separated asset types"),
+):
     """
     Load parameter registry, optionally filtered by asset type(s).
     Example: /api/parameters?asset_types=boiler,turbine
+    Supports If-None-Match; the ETag follows the registry content hash.
     """
     types_list = []
     if asset_types:
         types_list = [t.strip() for t in asset_types.split(",") if t.strip()]
-    return filter_parameters(types_list)
+
+    # One load for both the ETag and the body, even if a reload lands in between
+    state = registry.current()
+    digest = state.digest
+    etag = make_etag(digest, *sorted(set(types_list)))
+    cached = not_modified(request, etag, REGISTRY_CACHE_CONTROL)
+    if cached:
+        return cached
+
+    if FAST_RESPONSES:
+        # Validated and serialized once per registry version and filter
+        body = _bodies.get(
+            (digest, etag),
+            lambda: _parameter_list.dump_json(_parameter_list.validate_python(filter_parameters(types_list, state))),
+        )
+        return encoded_response(request, body, etag, REGISTRY_CACHE_CONTROL)
+
+    set_cache_headers(response, etag, REGISTRY_CACHE_CONTROL)
+    return filter_parameters(types_list, state)
@@ -0,0 +1,106 @@
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import JSONResponse
+from typing import Optional
+import anyio.to_thread
+
+from app.http_cache import fast_json_response
+from app.services.readings_ingest import ReadingsFormatError, ingest_readings, load_plant_model, timestamp_ms
+from app.services.readings_store import store as readings_store
+from app.services.rollups import AGGREGATES, TIERS, store as rollup_store
+
+router = APIRouter(prefix="/api", tags=["readings"])
+
+CSV_TYPES = {"text/csv", "application/csv"}
+NDJSON_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl", "application/json"}
+
+
+@router.post("/plants/{plant_id}/readings")
+async def ingest_plant_readings(plant_id: int, request: Request):
+    """
+    Ingest a batch of parameter readings for an onboarded plant.
+    - Body: NDJSON (one {"timestamp", "asset"?, <parameter>: value} object
+      per line) or CSV (text/csv; header timestamp,asset?,<parameters>)
+    - Timestamps are ISO 8601 (naive = UTC) or epoch seconds
+    - The body is streamed, buffered in columnar arrays and appended to
+      the plant's readings log in large chunks
+    - Calculated parameters are evaluated for every row that has their inputs
+    Returns counts of stored and rejected readings.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type not in CSV_TYPES | NDJSON_TYPES:
+        return JSONResponse(status_code=415, content={"error": "Send readings as application/x-ndjson or text/csv"})
+
+    try:
+        model = await anyio.to_thread.run_sync(load_plant_model, plant_id)
+    except ReadingsFormatError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    if model is None:
+        return JSONResponse(status_code=404, content={"error": "Plant not found"})
+
+    try:
+        return await ingest_readings(model, request.stream(), content_type in CSV_TYPES,
+                                     store=readings_store, rollups=rollup_store)
+    except ReadingsFormatError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+
+
+@router.get("/plants/{plant_id}/readings/aggregates")
+def readings_aggregates(
+    plant_id: int,
+    request: Request,
+    interval: str = Query("hour", pattern="^(" + "|".join(TIERS) + ")$"),
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    section: Optional[str] = None,
+    asset: Optional[str] = None,
+    parameters: Optional[str] = None,
+    aggregates: Optional[str] = None,
+):
+    """
+    min/max/avg/sum/count per parameter per hour or day, from the rollups.
+    - start (inclusive) / end (exclusive): ISO 8601 or epoch seconds
+    - section: only parameters of that section
+    - asset: one asset's readings; without it, all assets are merged
+    - parameters: comma-separated names to narrow further
+    - aggregates: comma-separated subset of count,sum,min,max,avg (default all)
+    Each series is columnar: timestamps (bucket start, epoch ms) and one
+    list per aggregate. Served from stored buckets, so a year of hourly
+    data costs a few partition reads; most of the time goes to JSON.
+    """
+    try:
+        model = load_plant_model(plant_id)
+    except ReadingsFormatError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    if model is None:
+        return JSONResponse(status_code=404, content={"error": "Plant not found"})
+    if asset is not None and asset not in model.assets:
+        return JSONResponse(status_code=400, content={"error": f"Unknown asset '{asset}'"})
+    wanted_aggregates = AGGREGATES
+    if aggregates:
+        wanted_aggregates = tuple(a.strip() for a in aggregates.split(","))
+        unknown = [a for a in wanted_aggregates if a not in AGGREGATES]
+        if unknown:
+            return JSONResponse(status_code=400, content={"error": f"Unknown aggregate(s): {', '.join(unknown)}"})
+    try:
+        start_ms = timestamp_ms(start) if start is not None else None
+        end_ms = timestamp_ms(end) if end is not None else None
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": f"Invalid time range: {e}"})
+
+    names = [name for name, s in model.sections.items() if section is None or s == section]
+    if parameters:
+        wanted = {p.strip() for p in parameters.split(",")}
+        names = [name for name in names if name in wanted]
+
+    series = rollup_store.query(plant_id, interval, names, asset, start_ms, end_ms, wanted_aggregates)
+    for s in series:
+        s["section"] = model.sections[s["parameter"]]
+    # Serialized here: long numeric lists skip jsonable_encoder, and are
+    # compressed at a fast level instead of the middleware's
+    return fast_json_response(request, {
+        "plant_id": plant_id,
+        "interval": interval,
+        "asset": asset,
+        "section": section,
+        "series": series,
+    })
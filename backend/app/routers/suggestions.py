@@ -1,6 +1,7 @@
 from fastapi import APIRouter, UploadFile, File
-from app.services.ai_suggester import suggest_parameters
-from pydantic import BaseModel
+from app.services.ai_suggester import suggest_parameters, rank_parameters
+from pydantic import BaseModel, Field
+from typing import Literal
 import csv
 import io
 
@@ -10,6 +11,8 @@ router = APIRouter(prefix="/api", tags=["suggestions"])
 class SuggestionRequest(BaseModel):
     description: str
     asset_types: list[str]
+    mode: Literal["keyword", "ranked"] = "keyword"
+    top_k: int = Field(10, ge=1, le=100)
 
 
 @router.post("/suggest-parameters")
@@ -17,8 +20,13 @@ def suggest_params(req: SuggestionRequest):
     """
     AI-assisted parameter suggestion based on plant description and asset types.
     Returns a list of suggested parameters with reasons.
+    mode="ranked" scores the whole parameter registry instead and returns
+    the top_k matches with a relevance score.
     """
-    suggestions = suggest_parameters(req.description, req.asset_types)
+    if req.mode == "ranked":
+        suggestions = rank_parameters(req.description, req.asset_types, req.top_k)
+    else:
+        suggestions = suggest_parameters(req.description, req.asset_types)
     return {
         "suggestions": suggestions,
         "count": len(suggestions),
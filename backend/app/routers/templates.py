@@ -1,14 +1,13 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Query, Request, Response
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-from pathlib import Path
-import json
-from datetime import datetime
+from typing import Optional
 
-router = APIRouter(prefix="/api", tags=["templates"])
+from app.http_cache import TEMPLATE_CACHE_CONTROL, make_etag, not_modified, precondition_failed, set_cache_headers
+from app.services.json_patch import PatchError, PatchTestFailed
+from app.services.template_store import TemplateHistoryUnavailable, TemplateVersionMismatch, async_store
 
-TEMPLATES_DIR = Path(__file__).parent.parent / "data" / "templates"
-TEMPLATES_DIR.mkdir(parents=True, exist_ok=True)
+router = APIRouter(prefix="/api", tags=["templates"])
 
 
 class TemplateSaveRequest(BaseModel):
@@ -18,57 +17,111 @@ class TemplateSaveRequest(BaseModel):
 
 
 @router.get("/templates")
-def list_templates():
-    """List all saved templates."""
-    templates = []
-    for f in TEMPLATES_DIR.glob("*.json"):
-        try:
-            data = json.loads(f.read_text(encoding="utf-8"))
-            templates.append({
-                "id": f.stem,
-                "name": data.get("name", f.stem),
-                "description": data.get("description", ""),
-                "created_at": data.get("created_at", ""),
-            })
-        except Exception:
-            continue
-    return {"templates": templates}
+async def list_templates(
+    request: Request,
+    response: Response,
+    q: Optional[str] = Query(None, description="Search name and description"),
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+):
+    """
+    List saved templates (metadata only), newest first.
+    Example: /api/templates?q=cooling&offset=0&limit=20
+    Without `limit`, every template from `offset` on is returned.
+    """
+    etag = make_etag(await async_store.index_digest(), q or "", offset, limit)
+    cached = not_modified(request, etag, TEMPLATE_CACHE_CONTROL)
+    if cached:
+        return cached
+    set_cache_headers(response, etag, TEMPLATE_CACHE_CONTROL)
+
+    templates, total = await async_store.list(q or "", offset, limit)
+    return {"templates": templates, "total": total, "offset": offset, "limit": limit}
 
 
 @router.get("/templates/{template_id}")
-def get_template(template_id: str):
-    """Load a specific template."""
-    path = TEMPLATES_DIR / f"{template_id}.json"
-    if not path.exists():
+async def get_template(template_id: str, request: Request, response: Response):
+    """Load a specific template. Unchanged templates are answered with 304."""
+    version = await async_store.file_version(template_id)
+    if version is None:
         return JSONResponse(status_code=404, content={"error": "Template not found"})
-    data = json.loads(path.read_text(encoding="utf-8"))
+    etag = make_etag(template_id, version)
+    cached = not_modified(request, etag, TEMPLATE_CACHE_CONTROL)
+    if cached:
+        return cached
+
+    data = await async_store.get(template_id)
+    if data is None:
+        return JSONResponse(status_code=404, content={"error": "Template not found"})
+    set_cache_headers(response, etag, TEMPLATE_CACHE_CONTROL)
     return data
 
 
 @router.post("/templates")
-def save_template(req: TemplateSaveRequest):
+async def save_template(req: TemplateSaveRequest):
     """Save current config as a reusable template."""
-    template_id = req.name.lower().replace(" ", "_").replace("-", "_")
-    template_id = "".join(c for c in template_id if c.isalnum() or c == "_")
+    try:
+        template_id = await async_store.save(req.name, req.description, req.config)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    return {"status": "saved", "id": template_id, "name": req.name}
 
-    data = {
-        "name": req.name,
-        "description": req.description,
-        "config": req.config,
-        "created_at": datetime.utcnow().isoformat(),
-    }
 
-    path = TEMPLATES_DIR / f"{template_id}.json"
-    path.write_text(json.dumps(data, indent=2), encoding="utf-8")
+@router.patch("/templates/{template_id}")
+async def patch_template(template_id: str, request: Request):
+    """
+    Partially update a template's config without re-uploading it.
+    - `application/json-patch+json`: RFC 6902 operation list
+    - `application/merge-patch+json`: RFC 7396 merge patch
+    - Plain JSON: a list is a JSON Patch, an object a merge patch
+    Send `If-Match: <etag>` to reject the patch if the template changed.
+    """
+    version = await async_store.file_version(template_id)
+    if version is None:
+        return JSONResponse(status_code=404, content={"error": "Template not found"})
+    failed = precondition_failed(request, make_etag(template_id, version))
+    if failed:
+        return failed
+    try:
+        patch = await request.json()
+    except ValueError:
+        return JSONResponse(status_code=400, content={"error": "Body must be valid JSON"})
 
-    return {"status": "saved", "id": template_id, "name": req.name}
+    media_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    expected = version if request.headers.get("if-match") else None
+    try:
+        result = await async_store.patch(template_id, patch, media_type, expected)
+    except TemplateVersionMismatch:
+        return JSONResponse(status_code=412, content={"error": "Resource has changed"})
+    except PatchTestFailed as e:
+        return JSONResponse(status_code=409, content={"error": str(e)})
+    except PatchError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    if result is None:
+        return JSONResponse(status_code=404, content={"error": "Template not found"})
+
+    etag = make_etag(template_id, await async_store.file_version(template_id))
+    return JSONResponse(content={"status": "patched", **result}, headers={"ETag": etag})
+
+
+@router.get("/templates/{template_id}/changes")
+async def template_changes(template_id: str, since: int = Query(..., ge=0)):
+    """
+    Deltas applied after version `since`, oldest first, to replay on a
+    cached copy. 410 means the history no longer reaches back that far.
+    """
+    try:
+        changes = await async_store.changes_since(template_id, since)
+    except TemplateHistoryUnavailable:
+        return JSONResponse(status_code=410, content={"error": "History not available; reload the template"})
+    if changes is None:
+        return JSONResponse(status_code=404, content={"error": "Template not found"})
+    return changes
 
 
 @router.delete("/templates/{template_id}")
-def delete_template(template_id: str):
+async def delete_template(template_id: str):
     """Delete a template."""
-    path = TEMPLATES_DIR / f"{template_id}.json"
-    if not path.exists():
+    if not await async_store.delete(template_id):
         return JSONResponse(status_code=404, content={"error": "Template not found"})
-    path.unlink()
     return {"status": "deleted", "id": template_id}
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional
+from pydantic import BaseModel, EmailStr, StringConstraints
+from typing import Annotated, Optional
 
 
 # --- Parameter Models ---
@@ -13,17 +13,81 @@ class ParameterOut(BaseModel):
     applicable_asset_types: list[str]
 
 
+# --- Import Merge ---
+
+class MergeFields(BaseModel):
+    display_name: str
+    unit: str
+    category: str
+    section: str
+
+
+class ImportedParameter(MergeFields):
+    name: Annotated[str, StringConstraints(strip_whitespace=True, min_length=1)]
+    applicable_asset_types: list[str] = []
+
+
+class MergeConflict(BaseModel):
+    name: str
+    fields: list[str] = []
+    existing: MergeFields
+    incoming: MergeFields
+
+
+class MergePlanApplyRequest(BaseModel):
+    add: list[ImportedParameter] = []
+    conflicts: list[MergeConflict] = []
+    replace: list[str] = []  # conflict names that take the incoming fields
+
+
 # --- Formula Validation ---
 
 class FormulaValidationRequest(BaseModel):
     expression: str
     enabled_parameters: list[str]
+    dry_run: bool = False
+    samples: Optional[dict[str, list[float]]] = None
+    unit: Optional[str] = None
+
+
+class FormulaIssue(BaseModel):
+    kind: str  # division_by_zero | domain | overflow | nan | non_finite | out_of_range
+    expression: str
+    message: str
+    rows: int
+    example: dict[str, Optional[float]]
 
 
 class FormulaValidationResponse(BaseModel):
     valid: bool
     depends_on: list[str]
     error: Optional[str] = None
+    issues: list[FormulaIssue] = []
+
+
+class FormulaBatchItem(BaseModel):
+    parameter_name: str
+    expression: str
+
+
+class BatchFormulaValidationRequest(BaseModel):
+    enabled_parameters: list[str]
+    formulas: list[FormulaBatchItem]
+    dry_run: bool = False
+    samples: Optional[dict[str, list[float]]] = None
+    units: dict[str, str] = {}
+
+
+class BatchFormulaValidationResult(FormulaValidationResponse):
+    parameter_name: str
+
+
+class BatchFormulaValidationResponse(BaseModel):
+    valid: bool
+    results: list[BatchFormulaValidationResult]
+    evaluation_order: list[str]
+    errors: list[str] = []
+    warnings: list[str] = []
 
 
 # --- Onboarding Payload ---
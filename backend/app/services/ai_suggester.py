@@ -1,4 +1,10 @@
+import heapq
+import math
 import re
+import threading
+from types import MappingProxyType
+
+from app.services.parameter_service import ParameterRegistry, registry
 
 # Simple keyword-based parameter suggestion engine.
 # Maps plant description keywords / asset types to suggested parameter names.
@@ -36,25 +42,176 @@ SUGGESTION_RULES: dict[str, list[dict]] = {
 }
 
 
-def suggest_parameters(description: str, asset_types: list[str]) -> list[dict]:
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _tokenize(text: str) -> list[str]:
+    # Underscores and punctuation separate words, so asset types such as
+    # "cooling_tower" contribute "cooling" and "tower"
+    return TOKEN_RE.findall(text.lower())
+
+
+class SuggestionIndex:
     """
-    Suggest parameters based on plant description keywords and asset types.
-    Uses keyword matching against the suggestion rules.
+    Rulebook compiled once into a token index.
+    - Keywords (single words or phrases) are matched on word boundaries,
+      so "power" matches "power plant" but not "powerful"
+    - A trailing plural "s" is accepted ("boilers" matches "boiler")
+    - Suggestions per keyword are prebuilt and frozen
+    Matching costs O(tokens × longest phrase), independent of rulebook size.
     """
-    suggestions: list[dict] = []
-    seen_names: set[str] = set()
 
-    text = (description + " " + " ".join(asset_types)).lower()
+    def __init__(self, rules: dict[str, list[dict]]):
+        self.phrases: dict[tuple[str, ...], str] = {}
+        self.rank: dict[str, int] = {}
+        self.suggestions: dict[str, tuple[MappingProxyType, ...]] = {}
+        for rank, (keyword, params) in enumerate(rules.items()):
+            tokens = tuple(_tokenize(keyword))
+            if not tokens:
+                continue
+            self.phrases[tokens] = keyword
+            self.phrases.setdefault(tokens[:-1] + (tokens[-1] + "s",), keyword)
+            self.rank[keyword] = rank
+            self.suggestions[keyword] = tuple(
+                MappingProxyType({
+                    **p,
+                    "reason": f"Suggested based on keyword '{keyword}' in plant description",
+                })
+                for p in params
+            )
+        self.max_phrase = max((len(t) for t in self.phrases), default=0)
+
+    def match(self, text: str) -> list[str]:
+        """Keywords found in `text`, in rulebook order."""
+        tokens = _tokenize(text)
+        found: set[str] = set()
+        for i in range(len(tokens)):
+            for n in range(1, min(self.max_phrase, len(tokens) - i) + 1):
+                keyword = self.phrases.get(tuple(tokens[i:i + n]))
+                if keyword is not None:
+                    found.add(keyword)
+        return sorted(found, key=self.rank.__getitem__)
 
-    for keyword, params in SUGGESTION_RULES.items():
-        if keyword in text:
-            for p in params:
+    def suggest(self, description: str, asset_types: list[str]) -> list[dict]:
+        suggestions: list[dict] = []
+        seen_names: set[str] = set()
+        for keyword in self.match(description + " " + " ".join(asset_types)):
+            for p in self.suggestions[keyword]:
                 if p["name"] not in seen_names:
-                    suggestions.append({
-                        **p,
-                        "applicable_asset_types": asset_types,
-                        "reason": f"Suggested based on keyword '{keyword}' in plant description",
-                    })
+                    suggestions.append({**p, "applicable_asset_types": asset_types})
                     seen_names.add(p["name"])
+        return suggestions
+
+
+_index = SuggestionIndex(SUGGESTION_RULES)
+
+
+def suggest_parameters(description: str, asset_types: list[str]) -> list[dict]:
+    """
+    Suggest parameters based on plant description keywords and asset types.
+    Uses whole-word matching against the compiled suggestion rules.
+    """
+    return _index.suggest(description, asset_types)
+
+
+def _stem(token: str) -> str:
+    return token[:-1] if len(token) > 3 and token.endswith("s") and not token.endswith("ss") else token
+
 
-    return suggestions
+class RegistryRanker:
+    """
+    BM25 index over the parameter registry.
+    Each parameter is a document made of its name, display name, section
+    and asset types. The index is sparse (term -> postings), so scoring
+    touches only the documents that share a term with the query.
+    Rebuilt automatically when the registry reloads.
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, source: ParameterRegistry = registry):
+        self.source = source
+        self._version = -1
+        self._lock = threading.Lock()
+        # (parameters, postings, doc_terms), swapped as one tuple so a query
+        # never mixes two generations of the index
+        self.index: tuple[list[dict], dict[str, list[tuple[int, float]]], list[frozenset[str]]] = ([], {}, [])
+
+    def _build(self, parameters: list[dict]) -> None:
+        postings: dict[str, list[tuple[int, int]]] = {}
+        lengths: list[int] = []
+        doc_terms: list[frozenset[str]] = []
+        for i, p in enumerate(parameters):
+            text = " ".join([
+                p["name"], p.get("display_name", ""), p.get("section", ""),
+                *p.get("applicable_asset_types", []),
+            ])
+            tokens = [_stem(t) for t in _tokenize(text)]
+            lengths.append(len(tokens))
+            doc_terms.append(frozenset(tokens))
+            counts: dict[str, int] = {}
+            for t in tokens:
+                counts[t] = counts.get(t, 0) + 1
+            for t, tf in counts.items():
+                postings.setdefault(t, []).append((i, tf))
+
+        n = len(parameters)
+        avg_len = (sum(lengths) / n if n else 0.0) or 1.0
+        # Precompute each posting's full BM25 weight so a query is only sums
+        weighted: dict[str, list[tuple[int, float]]] = {}
+        for t, docs in postings.items():
+            idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            weighted[t] = [
+                (doc, idf * tf * (self.K1 + 1) / (tf + self.K1 * (1 - self.B + self.B * lengths[doc] / avg_len)))
+                for doc, tf in docs
+            ]
+        self.index = (parameters, weighted, doc_terms)
+
+    def _refresh(self) -> None:
+        self.source.refresh()
+        # Read the version before the list: the list is then at least as new
+        version = self.source.version
+        if version == self._version:
+            return
+        with self._lock:
+            if version != self._version:
+                self._build(self.source.all())
+                self._version = version
+
+    def rank(self, description: str, asset_types: list[str], top_k: int = 10) -> list[dict]:
+        """Top-k registry parameters for the description, with BM25 scores."""
+        self._refresh()
+        parameters, postings, doc_terms = self.index
+        query = {_stem(t) for t in _tokenize(description + " " + " ".join(asset_types))}
+
+        scores: dict[int, float] = {}
+        for term in query:
+            for doc, weight in postings.get(term, ()):
+                scores[doc] = scores.get(doc, 0.0) + weight
+
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: (item[1], -item[0]))
+        return [
+            {
+                **parameters[doc],
+                "score": round(score, 4),
+                "reason": "Matched " + ", ".join(f"'{t}'" for t in sorted(query & doc_terms[doc])) + " in parameter registry",
+            }
+            for doc, score in best
+        ]
+
+
+_ranker = RegistryRanker()
+
+
+def build_indexes() -> None:
+    """Build the registry ranking index now rather than on the first query."""
+    _ranker._refresh()
+
+
+def rank_parameters(description: str, asset_types: list[str], top_k: int = 10) -> list[dict]:
+    """
+    Rank registry parameters by BM25 relevance to the plant description
+    and asset types. Returns the top-k with scores.
+    """
+    return _ranker.rank(description, asset_types, top_k)
@@ -0,0 +1,178 @@
+import asyncio
+import multiprocessing
+import os
+import signal
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import anyio
+import anyio.to_thread
+
+from app.metrics import REGISTRY, Counter, Gauge, timed
+
+# Bounded process pool for CPU-bound jobs (batch formula validation, CSV
+# parsing and validation), so they run on spare cores instead of holding
+# the GIL in the serving process.
+# - Backpressure: at most CPU_POOL_QUEUE jobs are admitted at once; a job
+#   that cannot be admitted within CPU_POOL_WAIT seconds fails with PoolBusy
+# - Timeouts: a job running past CPU_JOB_TIMEOUT is interrupted inside the
+#   worker (SIGALRM where available); a worker stuck in native code past
+#   the deadline gets the whole pool recycled
+# - CPU_POOL_WORKERS=0 runs jobs in the threadpool instead (development)
+# Processes are spawned lazily on the first job, so a gunicorn master
+# never forks with a pool attached.
+
+
+def _default_workers() -> int:
+    # Share the cores between the web workers of a multi-worker deployment
+    web_workers = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+    return max(1, (os.cpu_count() or 1) // web_workers)
+
+
+CPU_POOL_WORKERS = int(os.getenv("CPU_POOL_WORKERS", _default_workers()))
+CPU_POOL_QUEUE = int(os.getenv("CPU_POOL_QUEUE", 4 * max(1, CPU_POOL_WORKERS)))
+CPU_POOL_WAIT = float(os.getenv("CPU_POOL_WAIT", "5"))
+CPU_JOB_TIMEOUT = float(os.getenv("CPU_JOB_TIMEOUT", "30"))
+KILL_GRACE = 2.0  # extra seconds before a job stuck past its deadline recycles the pool
+
+cpu_pool_jobs = REGISTRY.register(Counter(
+    "cpu_pool_jobs_total", "Process-pool jobs by outcome.", ("job", "outcome"),
+))
+cpu_pool_jobs_in_flight = REGISTRY.register(Gauge(
+    "cpu_pool_jobs_in_flight", "Process-pool jobs admitted and not yet finished.",
+))
+
+
+class PoolError(RuntimeError):
+    """Base class for jobs the pool could not complete."""
+
+    status_code = 503
+
+
+class PoolBusy(PoolError):
+    """Raised when a job waits too long for a free slot."""
+
+
+class JobTimeout(PoolError, TimeoutError):
+    """Raised when a job runs past its deadline."""
+
+    status_code = 504
+
+
+class _Deadline(BaseException):
+    # BaseException, so the job's own `except Exception` blocks cannot swallow it
+    pass
+
+
+def _expire(signum, frame):
+    raise _Deadline
+
+
+def _call_with_deadline(timeout: float, fn, *args):
+    """Runs in the worker process: interrupt `fn` if it overruns `timeout`."""
+    if not hasattr(signal, "setitimer"):
+        return fn(*args)
+    signal.signal(signal.SIGALRM, _expire)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return fn(*args)
+    except _Deadline:
+        raise JobTimeout("Job exceeded its time limit") from None
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+class CpuPool:
+    """Process pool with admission control and per-job deadlines."""
+
+    def __init__(
+        self,
+        workers: int = CPU_POOL_WORKERS,
+        max_jobs: int = CPU_POOL_QUEUE,
+        wait: float = CPU_POOL_WAIT,
+        timeout: float = CPU_JOB_TIMEOUT,
+    ):
+        self.workers = workers
+        self.max_jobs = max_jobs
+        self.wait = wait
+        self.timeout = timeout
+        self._executor: ProcessPoolExecutor | None = None
+        self._limiter: anyio.CapacityLimiter | None = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: never fork a process that has an event loop and threads
+                self._executor = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def _recycle(self, executor: ProcessPoolExecutor) -> None:
+        """Kill a pool whose worker is stuck or dead; the next job starts a new one."""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        for process in list((executor._processes or {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    async def run(self, fn, *args, offload: bool = True):
+        """
+        Run `fn(*args)` in a worker process and return its result.
+        `fn` and its arguments must be picklable (module-level functions).
+        With offload=False, or a pool of 0 workers, it runs in the threadpool.
+        """
+        if not offload or self.workers <= 0:
+            return await anyio.to_thread.run_sync(fn, *args)
+
+        job = fn.__name__
+        if self._limiter is None:
+            # Created lazily: a limiter must be made inside a running event loop
+            self._limiter = anyio.CapacityLimiter(self.max_jobs)
+        try:
+            with anyio.fail_after(self.wait):
+                await self._limiter.acquire()
+        except TimeoutError:
+            cpu_pool_jobs.inc(job, "rejected")
+            raise PoolBusy("Server is busy; retry shortly") from None
+
+        cpu_pool_jobs_in_flight.inc()
+        try:
+            executor = self._get_executor()
+            future = executor.submit(_call_with_deadline, self.timeout, fn, *args)
+            try:
+                with timed(f"cpu_pool_{job}"), anyio.fail_after(self.timeout + KILL_GRACE):
+                    result = await asyncio.wrap_future(future)
+            except JobTimeout:
+                cpu_pool_jobs.inc(job, "timeout")
+                raise
+            except TimeoutError:
+                # The in-worker deadline did not fire (stuck in native code)
+                cpu_pool_jobs.inc(job, "timeout")
+                self._recycle(executor)
+                raise JobTimeout("Job exceeded its time limit") from None
+            except BrokenProcessPool:
+                cpu_pool_jobs.inc(job, "failed")
+                self._recycle(executor)
+                raise PoolError("A worker process died; retry the request") from None
+            except BaseException:
+                future.cancel()
+                cpu_pool_jobs.inc(job, "error")
+                raise
+            cpu_pool_jobs.inc(job, "completed")
+            return result
+        finally:
+            cpu_pool_jobs_in_flight.dec()
+            self._limiter.release()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+pool = CpuPool()
@@ -0,0 +1,22 @@
+import os
+import tempfile
+from pathlib import Path
+
+# File helpers shared by the stores that rewrite JSON files in place
+# (templates and their index, the parameter registry).
+
+
+def write_atomic(path: Path, text: str) -> None:
+    """
+    Write via a uniquely named temp file and rename over the target, so
+    readers see either the old or the new file and concurrent writers of
+    the same path never interleave.
+    """
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
@@ -0,0 +1,211 @@
+import ast
+import operator
+from functools import reduce
+
+import numpy as np
+
+from app.metrics import timed
+from app.services.formula_engine import CONSTANTS, FUNCTIONS, FormulaError, compile_formula, literal_value, round_decimals
+
+# Dry run: evaluate a formula over a grid of sample inputs in one batched
+# pass and report numeric problems that a successful compile() cannot see.
+# The tree is interpreted node by node over whole arrays, so a non-finite
+# value is traced to the sub-expression where it first appears (the
+# division whose denominator hit zero, the log of a negative number, the
+# power that overflowed) instead of only to the final result.
+
+SAMPLE_ROWS = 64  # typical rows in a generated grid
+EDGE_VALUES = (0.0, -1.0)  # each input takes each edge value once, others typical
+TYPICAL_RANGE = (0.1, 1000.0)  # generated typical values are log-uniform in this range
+MAX_SAMPLE_ROWS = 10_000
+PERCENT_UNITS = frozenset({"%"})
+PERCENT_RANGE = (0.0, 100.0)
+
+BINARY_OPS = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: np.true_divide,
+    ast.FloorDiv: np.floor_divide,
+    ast.Mod: np.mod,
+    ast.Pow: np.power,
+}
+UNARY_OPS = {ast.UAdd: operator.pos, ast.USub: np.negative}
+DIVISIONS = (ast.Div, ast.FloorDiv, ast.Mod)
+DOMAINS = {"log": operator.le, "sqrt": operator.lt}  # invalid when arg <op> 0
+
+
+class DryRunError(ValueError):
+    """Raised when uploaded sample data is unusable."""
+
+
+def sample_grid(variables, samples: dict | None = None, rows: int = SAMPLE_ROWS) -> dict[str, np.ndarray]:
+    """
+    Sample input columns for `variables`.
+    - Uploaded `samples` are used as the rows; inputs without a column get
+      typical values
+    - Otherwise `rows` typical rows, then one row per input and edge value
+      (zero, negative) with the other inputs typical
+    Generated values are seeded, so the same formula always gets the same grid.
+    """
+    variables = sorted(variables)
+    rng = np.random.default_rng(0)
+    low, high = np.log(TYPICAL_RANGE[0]), np.log(TYPICAL_RANGE[1])
+
+    if samples:
+        columns = {name: np.asarray(values, dtype=float) for name, values in samples.items()
+                   if name in variables}
+        lengths = {len(c) for c in columns.values()}
+        if len(lengths) > 1:
+            raise DryRunError("Sample columns must all have the same length")
+        n = lengths.pop() if lengths else rows
+        if n > MAX_SAMPLE_ROWS:
+            raise DryRunError(f"At most {MAX_SAMPLE_ROWS} sample rows are allowed")
+        for name in variables:
+            if name not in columns:
+                columns[name] = np.exp(rng.uniform(low, high, n))
+        return columns
+
+    n = rows + len(variables) * len(EDGE_VALUES)
+    grid = np.exp(rng.uniform(low, high, (len(variables), n)))
+    for i in range(len(variables)):
+        for j, value in enumerate(EDGE_VALUES):
+            grid[i, rows + i * len(EDGE_VALUES) + j] = value
+    return dict(zip(variables, grid))
+
+
+def _finite_or_none(value) -> float | None:
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+
+class _Interpreter:
+    """Evaluates a formula tree over sample columns, recording where problems arise."""
+
+    def __init__(self, columns: dict[str, np.ndarray], variables: tuple[str, ...], n: int):
+        self.columns = columns
+        self.variables = variables
+        self.n = n
+        self.issues: dict[tuple[str, str], dict] = {}
+
+    def report(self, kind: str, node: ast.AST, rows: np.ndarray, message: str) -> None:
+        key = (kind, ast.unparse(node))
+        rows = np.broadcast_to(rows, (self.n,))
+        if key in self.issues or not rows.any():
+            return
+        first = int(np.flatnonzero(rows)[0])
+        count = int(rows.sum())
+        self.issues[key] = {
+            "kind": kind,
+            "expression": key[1],
+            "message": f"{message} in `{key[1]}` for {count} of {self.n} sample rows",
+            "rows": count,
+            # Non-finite inputs (from upstream formulas) become null: JSON has no inf/NaN
+            "example": {v: _finite_or_none(self.columns[v][first]) for v in self.variables},
+        }
+
+    def eval(self, node: ast.AST) -> np.ndarray:
+        if isinstance(node, ast.Expression):
+            return self.eval(node.body)
+        if isinstance(node, ast.Constant):
+            return literal_value(node)
+        if isinstance(node, ast.Name):
+            if node.id in CONSTANTS:
+                return np.float64(CONSTANTS[node.id])
+            if node.id not in self.columns:
+                # compile_formula rejects this; keep a hand-built tree from a KeyError
+                raise FormulaError(f"Evaluation error: {node.id!r} is not a value")
+            return self.columns[node.id]
+        if isinstance(node, ast.UnaryOp):
+            return UNARY_OPS[type(node.op)](self.eval(node.operand))
+
+        if isinstance(node, ast.BinOp):
+            operands = [self.eval(node.left), self.eval(node.right)]
+            result = BINARY_OPS[type(node.op)](*operands)
+            if isinstance(node.op, DIVISIONS):
+                self.report("division_by_zero", node, (operands[1] == 0) & np.isfinite(operands[0]),
+                            "Division by zero")
+        else:  # ast.Call (the tree was whitelisted by compile_formula)
+            if node.func.id == "round" and len(node.args) == 2:
+                # Decimals stay a small int literal, as the engine evaluates them
+                operands = [self.eval(node.args[0])]
+                extra = [round_decimals(node.args[1])]
+            else:
+                operands = [self.eval(arg) for arg in node.args]
+                extra = []
+            try:
+                result = np.asarray(FUNCTIONS[node.func.id](*operands, *extra), dtype=float)
+            except (TypeError, ValueError) as e:
+                raise FormulaError(f"Evaluation error: {e}") from e
+            check = DOMAINS.get(node.func.id)
+            if check and operands:
+                self.report("domain", node, check(operands[0], 0), f"{node.func.id}() of an out-of-domain value")
+
+        # Non-finite values that originate here rather than flow up from an operand
+        finite_in = reduce(np.logical_and, [np.isfinite(o) for o in operands], True)
+        fresh = ~np.isfinite(result) & finite_in
+        if fresh.any() and not any((kind, ast.unparse(node)) in self.issues
+                                   for kind in ("division_by_zero", "domain")):
+            self.report("overflow", node, fresh & np.isinf(result), "Overflow to infinity")
+            self.report("nan", node, fresh & np.isnan(result), "Undefined result (NaN)")
+        return np.broadcast_to(result, (self.n,))
+
+
+def dry_run(expression: str, samples: dict | None = None, unit: str | None = None) -> dict:
+    """
+    Evaluate `expression` over a sample grid (see sample_grid).
+    `unit` is the unit of the calculated parameter; with uploaded samples,
+    "%" results outside 0-100 are reported (generated inputs have no
+    physical scale, so their ratios say nothing about the range).
+    Returns {rows, issues, result}; `result` is the output column.
+    Raises FormulaError if the expression does not compile.
+    """
+    compiled = compile_formula(expression)
+    columns = sample_grid(compiled.variables, samples)
+    return _dry_run(compiled.tree, compiled.variables, columns, unit if samples else None)
+
+
+def _dry_run(tree: ast.Expression, variables: tuple[str, ...], columns: dict, unit: str | None) -> dict:
+    with timed("formula_dry_run"):
+        n = len(next(iter(columns.values()))) if columns else 1
+        interpreter = _Interpreter(columns, variables, n)
+        with np.errstate(all="ignore"):
+            result = np.broadcast_to(interpreter.eval(tree), (n,))
+            if unit in PERCENT_UNITS:
+                low, high = PERCENT_RANGE
+                interpreter.report("out_of_range", tree.body,
+                                   np.isfinite(result) & ((result < low) | (result > high)),
+                                   f"Percentage outside {low:g}-{high:g}")
+        issues = list(interpreter.issues.values())
+        non_finite = ~np.isfinite(result)
+        if non_finite.any() and all(i["kind"] == "out_of_range" for i in issues):
+            # Only inherited from upstream calculated parameters
+            interpreter.report("non_finite", tree.body, non_finite, "Non-finite input")
+            issues = list(interpreter.issues.values())
+        return {"rows": n, "issues": issues, "result": result}
+
+
+def dry_run_formulas(
+    formulas: list[dict],
+    order: list[str],
+    samples: dict | None = None,
+    units: dict[str, str] | None = None,
+) -> dict[str, list[dict]]:
+    """
+    Dry-run a batch of formulas in evaluation `order` over one shared grid.
+    Calculated results feed the formulas that reference them, so a problem
+    upstream is seen downstream the way it would be at runtime.
+    Returns {parameter_name: issues}.
+    """
+    units = units or {}
+    compiled = {f["parameter_name"]: compile_formula(f["expression"]) for f in formulas
+                if f["parameter_name"] in order}
+    inputs = {v for c in compiled.values() for v in c.variables} - compiled.keys()
+    columns = sample_grid(inputs, samples)
+    issues: dict[str, list[dict]] = {}
+    for name in order:
+        formula = compiled[name]
+        run = _dry_run(formula.tree, formula.variables, columns, units.get(name) if samples else None)
+        columns[name] = run["result"]
+        issues[name] = run["issues"]
+    return issues
@@ -0,0 +1,200 @@
+import ast
+import copy
+from functools import lru_cache, reduce
+
+import numpy as np
+
+from app.metrics import timed
+
+# Formula engine: parses an expression once into a whitelisted AST,
+# caches the compiled code and evaluates it over whole NumPy arrays of
+# readings, so a batch of thousands of rows costs one pass per operator.
+
+
+def _nary(ufunc):
+    return lambda *args: reduce(ufunc, args)
+
+
+FUNCTIONS = {
+    "abs": np.abs,
+    "round": np.round,
+    "min": _nary(np.minimum),
+    "max": _nary(np.maximum),
+    "sum": _nary(np.add),
+    "pow": np.power,
+    "sqrt": np.sqrt,
+    "log": np.log,
+    "sin": np.sin,
+    "cos": np.cos,
+    "tan": np.tan,
+}
+# (min, max) positional arguments per function; None is unbounded. Extra
+# arguments must never reach a ufunc, which would take them as `out=`.
+ARITY = {
+    "abs": (1, 1),
+    "round": (1, 2),
+    "min": (1, None),
+    "max": (1, None),
+    "sum": (1, None),
+    "pow": (2, 2),
+    "sqrt": (1, 1),
+    "log": (1, 1),
+    "sin": (1, 1),
+    "cos": (1, 1),
+    "tan": (1, 1),
+}
+MAX_ROUND_DECIMALS = 15
+CONSTANTS = {"pi": np.float64(np.pi), "e": np.float64(np.e)}
+
+ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Call, ast.Name, ast.Load, ast.Constant,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow, ast.UAdd, ast.USub,
+)
+
+
+class FormulaError(ValueError):
+    """Raised when an expression cannot be compiled or evaluated."""
+
+
+class CompiledFormula:
+    """A parsed, whitelisted and compiled formula expression."""
+
+    def __init__(self, expression: str, tree: ast.Expression, variables: tuple[str, ...]):
+        self.expression = expression
+        self.tree = tree
+        self.variables = variables
+        self.code, self.constants = _numeric_code(tree)
+
+    def evaluate(self, inputs: dict) -> np.ndarray:
+        """
+        Evaluate over arrays of readings in one vectorized pass.
+        `inputs` maps each variable to a scalar or a sequence of readings.
+        """
+        missing = [v for v in self.variables if v not in inputs]
+        if missing:
+            raise FormulaError(f"Missing input(s): {', '.join(missing)}")
+
+        arrays = [np.asarray(inputs[v], dtype=float) for v in self.variables]
+        namespace = {**FUNCTIONS, **CONSTANTS, **self.constants, **dict(zip(self.variables, arrays))}
+        try:
+            with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+                result = eval(self.code, {"__builtins__": {}}, namespace)
+        except (ArithmeticError, TypeError, ValueError) as e:
+            raise FormulaError(f"Evaluation error: {e}") from e
+
+        result = np.asarray(result, dtype=float)
+        if arrays:
+            # Constant sub-results still line up with the input rows
+            result = np.broadcast_arrays(result, *arrays)[0]
+        return result
+
+
+class _BindConstants(ast.NodeTransformer):
+    """Replaces numeric literals with names bound to np.float64 values."""
+
+    def __init__(self):
+        self.constants: dict[str, np.float64] = {}
+
+    def visit_Constant(self, node: ast.Constant) -> ast.AST:
+        name = f"#{len(self.constants)}"  # not an identifier, so no formula can spell it
+        self.constants[name] = literal_value(node)
+        return ast.copy_location(ast.Name(id=name, ctx=ast.Load()), node)
+
+    def visit_Call(self, node: ast.Call) -> ast.AST:
+        if node.func.id == "round" and len(node.args) == 2:
+            # round()'s decimals must stay an int
+            node.args[0] = self.visit(node.args[0])
+            return node
+        return self.generic_visit(node)
+
+
+def _numeric_code(tree: ast.Expression) -> tuple:
+    """
+    Compile `tree` with every numeric literal as an np.float64, so constant
+    sub-expressions follow NumPy semantics (inf/nan under errstate) rather
+    than Python's: no ZeroDivisionError, no OverflowError, and no unbounded
+    integer power such as 9**9**9. Returns (code, {name: value}).
+    """
+    binder = _BindConstants()
+    numeric = ast.fix_missing_locations(binder.visit(copy.deepcopy(tree)))
+    return compile(numeric, "<formula>", "eval"), binder.constants
+
+
+def _check_node(node: ast.AST) -> None:
+    if not isinstance(node, ALLOWED_NODES):
+        raise FormulaError(f"Unsupported syntax: {type(node).__name__}")
+    if isinstance(node, ast.Constant) and (
+        isinstance(node.value, bool) or not isinstance(node.value, (int, float))
+    ):
+        raise FormulaError(f"Unsupported constant: {node.value!r}")
+    if isinstance(node, ast.Constant):
+        literal_value(node)
+    if isinstance(node, ast.Call):
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+            raise FormulaError("Only math functions may be called")
+        if node.keywords:
+            raise FormulaError("Keyword arguments are not supported")
+        name = node.func.id
+        low, high = ARITY[name]
+        if len(node.args) < low or (high is not None and len(node.args) > high):
+            expected = str(low) if low == high else f"{low} to {high}" if high else f"at least {low}"
+            raise FormulaError(f"{name}() takes {expected} argument(s), got {len(node.args)}")
+        if name == "round" and len(node.args) == 2 and round_decimals(node.args[1]) is None:
+            raise FormulaError(
+                f"round() decimals must be an integer literal between "
+                f"-{MAX_ROUND_DECIMALS} and {MAX_ROUND_DECIMALS}"
+            )
+
+
+def literal_value(node: ast.Constant) -> np.float64:
+    """A numeric literal as the np.float64 every evaluator binds it to."""
+    try:
+        return np.float64(node.value)
+    except OverflowError:
+        raise FormulaError("Number literal is too large for a float") from None
+
+
+def round_decimals(node: ast.AST) -> int | None:
+    """The value of round()'s decimals argument, or None unless it is a small integer literal."""
+    sign = 1
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.UAdd, ast.USub)):
+        sign = -1 if isinstance(node.op, ast.USub) else 1
+        node = node.operand
+    if not isinstance(node, ast.Constant) or type(node.value) is not int:
+        return None
+    value = sign * node.value
+    return value if abs(value) <= MAX_ROUND_DECIMALS else None
+
+
+@lru_cache(maxsize=4096)
+def compile_formula(expression: str) -> CompiledFormula:
+    """Parse, whitelist and compile an expression. Results are cached."""
+    with timed("formula_compile"):
+        try:
+            tree = ast.parse(expression.strip(), mode="eval")
+        except SyntaxError as e:
+            raise FormulaError(f"Syntax error: {e.msg}") from e
+
+        variables: set[str] = set()
+        callees: set[int] = set()
+        for node in ast.walk(tree):  # breadth-first: a call comes before its callee
+            _check_node(node)
+            if isinstance(node, ast.Call):
+                callees.add(id(node.func))
+            elif isinstance(node, ast.Name) and node.id in FUNCTIONS and id(node) not in callees:
+                raise FormulaError(f"{node.id}() is a function; call it with arguments")
+            elif isinstance(node, ast.Name) and node.id not in FUNCTIONS and node.id not in CONSTANTS:
+                variables.add(node.id)
+
+        return CompiledFormula(expression, tree, tuple(sorted(variables)))
+
+
+def evaluate_formulas(formulas: list[dict], inputs: dict) -> dict[str, np.ndarray]:
+    """
+    Evaluate a batch of FormulaConfig-shaped dicts over the same input arrays.
+    Returns {parameter_name: result_array}.
+    """
+    return {
+        f["parameter_name"]: compile_formula(f["expression"]).evaluate(inputs)
+        for f in formulas
+    }
@@ -0,0 +1,139 @@
+from collections import deque
+
+from app.services.formula_engine import CompiledFormula, FormulaError, compile_formula
+from app.services.formula_plan import FormulaPlan
+
+# Dependency graph between calculated parameters.
+# Formulas are ordered topologically once; when an input changes only the
+# calculated parameters downstream of it are recomputed.
+
+
+class FormulaCycleError(FormulaError):
+    """Raised when calculated parameters depend on each other in a loop."""
+
+    def __init__(self, cycle: list[str]):
+        self.cycle = cycle
+        super().__init__(f"Circular dependency: {' -> '.join(cycle)}")
+
+
+def _find_cycle(dependencies: dict[str, set[str]], nodes: set[str]) -> list[str]:
+    """Return one cycle (first node repeated at the end) among `nodes`."""
+    visited: set[str] = set()
+    for start in sorted(nodes):
+        if start in visited:
+            continue
+        # Iterative DFS: a long dependency chain must not hit the recursion limit
+        path = [start]
+        on_path = {start}
+        stack = [iter(sorted(dependencies[start] & nodes))]
+        while stack:
+            dep = next(stack[-1], None)
+            if dep is None:
+                stack.pop()
+                visited.add(path[-1])
+                on_path.discard(path.pop())
+            elif dep in on_path:
+                return path[path.index(dep):] + [dep]
+            elif dep not in visited:
+                path.append(dep)
+                on_path.add(dep)
+                stack.append(iter(sorted(dependencies[dep] & nodes)))
+    return sorted(nodes)
+
+
+def topological_order(dependencies: dict[str, set[str]]) -> list[str]:
+    """
+    Order calculated parameters so each comes after the ones it uses.
+    Dependencies that are not keys (plain inputs) are ignored.
+    Raises FormulaCycleError if the graph has a loop.
+    """
+    dependents: dict[str, list[str]] = {}
+    remaining: dict[str, int] = {}
+    for name, deps in dependencies.items():
+        internal = deps & dependencies.keys()
+        remaining[name] = len(internal)
+        for dep in internal:
+            dependents.setdefault(dep, []).append(name)
+
+    ready = deque(name for name in dependencies if remaining[name] == 0)
+    order: list[str] = []
+    while ready:
+        name = ready.popleft()
+        order.append(name)
+        for child in dependents.get(name, ()):
+            remaining[child] -= 1
+            if remaining[child] == 0:
+                ready.append(child)
+
+    if len(order) < len(dependencies):
+        raise FormulaCycleError(_find_cycle(dependencies, set(dependencies) - set(order)))
+    return order
+
+
+class FormulaGraph:
+    """
+    DAG of calculated parameters built from FormulaConfig-shaped dicts.
+    Dependencies come from the compiled expression, so a stale
+    `depends_on` list cannot break the evaluation order.
+    Raises FormulaError if two formulas compute the same parameter.
+    """
+
+    def __init__(self, formulas: list[dict]):
+        self.formulas: dict[str, CompiledFormula] = {}
+        for f in formulas:
+            name = f["parameter_name"]
+            if name in self.formulas:
+                raise FormulaError(f"Duplicate formula for parameter: {name}")
+            self.formulas[name] = compile_formula(f["expression"])
+        self.dependencies: dict[str, set[str]] = {
+            name: set(compiled.variables) for name, compiled in self.formulas.items()
+        }
+        self.dependents: dict[str, set[str]] = {}
+        for name, deps in self.dependencies.items():
+            for dep in deps:
+                self.dependents.setdefault(dep, set()).add(name)
+        self.order: list[str] = topological_order(self.dependencies)
+        self._position = {name: i for i, name in enumerate(self.order)}
+        self._plan: FormulaPlan | None = None
+
+    @property
+    def plan(self) -> FormulaPlan:
+        """Fused plan over all formulas, sharing common sub-expressions (built once)."""
+        if self._plan is None:
+            self._plan = FormulaPlan(self.formulas, self.order)
+        return self._plan
+
+    @property
+    def inputs(self) -> set[str]:
+        """Parameters referenced by formulas that are not themselves calculated."""
+        return set(self.dependents) - set(self.formulas)
+
+    def downstream(self, changed: set[str]) -> list[str]:
+        """Calculated parameters affected by `changed`, in evaluation order."""
+        affected: set[str] = set()
+        stack = list(changed)
+        while stack:
+            for child in self.dependents.get(stack.pop(), ()):
+                if child not in affected:
+                    affected.add(child)
+                    stack.append(child)
+        return sorted(affected, key=self._position.__getitem__)
+
+    def evaluate(self, inputs: dict) -> dict:
+        """
+        Evaluate every calculated parameter through the fused plan.
+        Returns inputs plus results.
+        """
+        return self.plan.evaluate(inputs)
+
+    def recompute(self, values: dict, changed: dict) -> list[str]:
+        """
+        Apply `changed` input readings to `values` in place and recompute
+        only the calculated parameters downstream of them.
+        Returns the names that were recomputed.
+        """
+        values.update(changed)
+        affected = self.downstream(set(changed))
+        for name in affected:
+            values[name] = self.formulas[name].evaluate(values)
+        return affected
@@ -0,0 +1,189 @@
+import ast
+import operator
+
+import numpy as np
+
+from app.metrics import timed
+from app.services.formula_engine import CONSTANTS, FUNCTIONS, CompiledFormula, FormulaError, literal_value, round_decimals
+
+# Fused evaluation plan for a set of formulas (one plant's FormulaConfigs).
+# Every formula's AST is normalized and hash-consed into one list of steps:
+# a sub-expression that appears in several formulas (the same ratio over
+# the same inputs, written in either operand order) becomes one step, so
+# each batch of readings computes it once. References to calculated
+# parameters link straight to the step that produces them.
+#
+# Only reorderings that are exact in floating point are applied: operands
+# of a binary + or * and the arguments of min/max are sorted; longer sums
+# are never reassociated. A fused plan gives the same bits as evaluating
+# each formula on its own.
+
+BINARY_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+COMMUTATIVE = (ast.Add, ast.Mult)
+SYMMETRIC_FUNCTIONS = frozenset({"min", "max"})
+
+
+class FormulaPlan:
+    """
+    Steps that evaluate every formula in `order` over shared slots.
+    Build it from compiled formulas in evaluation order (see
+    FormulaGraph.plan, which orders and checks for cycles).
+    """
+
+    def __init__(self, formulas: dict[str, CompiledFormula], order: list[str]):
+        self._keys: dict[tuple, int] = {}  # normalized sub-expression -> slot
+        self.constants: dict[int, object] = {}
+        self.input_slots: dict[str, int] = {}
+        self.steps: list[tuple[int, object, tuple[int, ...]]] = []  # (slot, function, argument slots)
+        self.outputs: dict[str, int] = {}
+        self.nodes = 0  # AST nodes across all formulas
+        self.shared = 0  # sub-expressions reused instead of planned again
+        self._size = 0
+        self._variables = {name: formulas[name].variables for name in order}
+
+        with timed("formula_plan_build"):
+            for name in order:
+                self.outputs[name] = self._plan(formulas[name].tree.body)
+            self._release = self._liveness()
+        self.inputs = sorted(self.input_slots)
+
+    @property
+    def stats(self) -> dict:
+        return {"formulas": len(self.outputs), "nodes": self.nodes,
+                "steps": len(self.steps), "shared": self.shared}
+
+    def _slot(self) -> int:
+        self._size += 1
+        return self._size - 1
+
+    def _constant(self, value) -> int:
+        # Floats are keyed by their bits: -0.0 == 0.0 and nan != nan, but
+        # neither may stand in for the other
+        key = ("const", type(value).__name__, np.float64(value).tobytes() if isinstance(value, float) else value)
+        slot = self._keys.get(key)
+        if slot is None:
+            slot = self._keys[key] = self._slot()
+            self.constants[slot] = value
+        return slot
+
+    def _apply(self, name: str, fn, args: tuple[int, ...]) -> int:
+        key = (name, *args)
+        slot = self._keys.get(key)
+        if slot is not None:
+            self.shared += 1
+            return slot
+        if all(a in self.constants for a in args):
+            # Fold constant sub-expressions with the engine's np.float64 semantics
+            try:
+                with np.errstate(all="ignore"):
+                    value = fn(*(self.constants[a] for a in args))
+            except (ArithmeticError, TypeError, ValueError):
+                pass  # left as a step, so evaluation fails the way the engine does
+            else:
+                slot = self._keys[key] = self._constant(value)
+                return slot
+        slot = self._keys[key] = self._slot()
+        self.steps.append((slot, fn, args))
+        return slot
+
+    def _liveness(self) -> list[tuple[int, ...]]:
+        """
+        For each step, the intermediate slots whose last use it is.
+        Dropping them as soon as possible keeps the working set to a few
+        arrays instead of one per step.
+        """
+        keep = set(self.outputs.values()) | set(self.input_slots.values()) | set(self.constants)
+        last_use: dict[int, int] = {}
+        for i, (_, _, args) in enumerate(self.steps):
+            for a in args:
+                last_use[a] = i
+        release: list[list[int]] = [[] for _ in self.steps]
+        for slot, i in last_use.items():
+            if slot not in keep:
+                release[i].append(slot)
+        return [tuple(r) for r in release]
+
+    def _plan(self, node: ast.AST) -> int:
+        """
+        Plan `node` and return its slot. Literals go through the engine's
+        literal_value and bind to the same np.float64, except round()'s
+        decimals: a small int literal, checked by compile_formula, so
+        folding never meets an unbounded Python int.
+        """
+        self.nodes += 1
+        if isinstance(node, ast.Constant):
+            return self._constant(literal_value(node))
+        if isinstance(node, ast.Name):
+            if node.id in CONSTANTS:
+                return self._constant(CONSTANTS[node.id])
+            if node.id in self.outputs:
+                return self.outputs[node.id]
+            key = ("input", node.id)
+            slot = self._keys.get(key)
+            if slot is None:
+                slot = self._keys[key] = self.input_slots[node.id] = self._slot()
+            return slot
+        if isinstance(node, ast.UnaryOp):
+            operand = self._plan(node.operand)
+            if isinstance(node.op, ast.UAdd):
+                return operand
+            return self._apply("neg", operator.neg, (operand,))
+        if isinstance(node, ast.BinOp):
+            args = (self._plan(node.left), self._plan(node.right))
+            if isinstance(node.op, COMMUTATIVE):
+                args = tuple(sorted(args))
+            return self._apply(type(node.op).__name__, BINARY_OPS[type(node.op)], args)
+        # ast.Call (the tree was whitelisted by compile_formula)
+        if node.func.id == "round" and len(node.args) == 2:
+            self.nodes += 1
+            args = (self._plan(node.args[0]), self._constant(round_decimals(node.args[1])))
+        else:
+            args = tuple(self._plan(arg) for arg in node.args)
+        if node.func.id in SYMMETRIC_FUNCTIONS:
+            args = tuple(sorted(args))
+        return self._apply(node.func.id, FUNCTIONS[node.func.id], args)
+
+    def evaluate(self, inputs: dict) -> dict:
+        """
+        Evaluate every formula over arrays of readings, each shared step once.
+        Returns inputs plus {parameter_name: result_array}, like
+        FormulaGraph.evaluate.
+        """
+        missing = [v for v in self.inputs if v not in inputs]
+        if missing:
+            raise FormulaError(f"Missing input(s): {', '.join(missing)}")
+
+        values: list = [None] * self._size
+        for slot, value in self.constants.items():
+            values[slot] = value
+        arrays = {}
+        for name, slot in self.input_slots.items():
+            values[slot] = arrays[name] = np.asarray(inputs[name], dtype=float)
+
+        with timed("formula_plan_evaluate"):
+            try:
+                with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+                    for (slot, fn, args), release in zip(self.steps, self._release):
+                        values[slot] = fn(*[values[a] for a in args])
+                        for r in release:
+                            values[r] = None
+            except (ArithmeticError, TypeError, ValueError) as e:
+                raise FormulaError(f"Evaluation error: {e}") from e
+
+        results = dict(inputs)
+        for name, slot in self.outputs.items():
+            result = np.asarray(values[slot], dtype=float)
+            operands = [arrays[v] if v in arrays else results[v] for v in self._variables[name]]
+            if operands:
+                # Constant sub-results still line up with the input rows
+                result = np.broadcast_arrays(result, *operands)[0]
+            results[name] = result
+        return results
@@ -1,18 +1,18 @@
 import json
 import re
+from collections import Counter
+
+from app.services import formula_dry_run
+from app.services.formula_engine import FormulaError, compile_formula
+from app.services.formula_graph import FormulaCycleError, topological_order
 
 UNSAFE_TOKENS = {"import", "eval", "exec", "__", "open", "os", "sys", "subprocess"}
 ALLOWED_OPERATORS = set("+-*/()., 0123456789")
+MATH_BUILTINS = frozenset({"abs", "round", "min", "max", "sum", "pow", "sqrt", "log", "sin", "cos", "tan", "pi", "e"})
+IDENTIFIER_RE = re.compile(r'[a-zA-Z_][a-zA-Z0-9_]*')
 
 
-def validate_formula(expression: str, enabled_parameters: list[str]) -> dict:
-    """
-    Validate a formula expression.
-    - Extract variable names
-    - Check all referenced params are enabled
-    - Block unsafe tokens
-    Returns dict with valid, depends_on, error.
-    """
+def _validate(expression: str, enabled: set[str] | frozenset[str]) -> dict:
     # 1. Check for unsafe tokens
     for token in UNSAFE_TOKENS:
         if token in expression:
@@ -23,12 +23,11 @@ def validate_formula(expression: str, enabled_parameters: list[str]) -> dict:
             }
 
     # 2. Extract variable names (identifiers that are not Python math builtins)
-    math_builtins = {"abs", "round", "min", "max", "sum", "pow", "sqrt", "log", "sin", "cos", "tan", "pi", "e"}
-    identifiers = set(re.findall(r'[a-zA-Z_][a-zA-Z0-9_]*', expression))
-    variables = identifiers - math_builtins
+    identifiers = set(IDENTIFIER_RE.findall(expression))
+    variables = identifiers - MATH_BUILTINS
 
     # 3. Check all variables are in enabled parameters
-    missing = variables - set(enabled_parameters)
+    missing = variables - enabled
     if missing:
         return {
             "valid": False,
@@ -55,3 +54,100 @@ def validate_formula(expression: str, enabled_parameters: list[str]) -> dict:
         "depends_on": sorted(list(variables)),
         "error": None
     }
+
+
+def validate_formula(
+    expression: str,
+    enabled_parameters: list[str],
+    dry_run: bool = False,
+    samples: dict[str, list[float]] | None = None,
+    unit: str | None = None,
+) -> dict:
+    """
+    Validate a formula expression.
+    - Extract variable names
+    - Check all referenced params are enabled
+    - Block unsafe tokens
+    - With dry_run, evaluate a valid formula over sample inputs and report
+      numeric issues (see formula_dry_run.dry_run)
+    Returns dict with valid, depends_on, error (and issues with dry_run).
+    """
+    result = _validate(expression, set(enabled_parameters))
+    if dry_run and result["valid"]:
+        try:
+            result["issues"] = formula_dry_run.dry_run(expression, samples, unit)["issues"]
+        except FormulaError as e:
+            result.update(valid=False, error=str(e))
+    return result
+
+
+def validate_formulas(
+    formulas: list[dict],
+    enabled_parameters: list[str],
+    calculated_parameters: set[str] | None = None,
+    dry_run: bool = False,
+    samples: dict[str, list[float]] | None = None,
+    units: dict[str, str] | None = None,
+) -> dict:
+    """
+    Validate many formulas against one enabled-parameter list.
+    - Lookup structures are built once for the whole batch
+    - Each formula is validated as in validate_formula; a parameter with
+      more than one formula is a batch error and all of its formulas are
+      invalid
+    - The valid formulas are checked as a graph: cycles, and references
+      to calculated parameters that have no formula in the batch
+    - With dry_run, the formulas are evaluated in order over one shared
+      sample grid and each result gets its numeric issues
+    Returns dict with valid, results, evaluation_order, errors, warnings.
+    """
+    enabled = frozenset(enabled_parameters)
+    calculated_parameters = calculated_parameters or set()
+
+    counts = Counter(f["parameter_name"] for f in formulas)
+    duplicates = {name for name, count in counts.items() if count > 1}
+
+    results = []
+    dependencies: dict[str, set[str]] = {}
+    for f in formulas:
+        result = _validate(f["expression"], enabled)
+        if f["parameter_name"] in duplicates:
+            result.update(valid=False, error=f"Duplicate formula for parameter: {f['parameter_name']}")
+        elif dry_run and result["valid"]:
+            try:
+                compile_formula(f["expression"])
+            except FormulaError as e:
+                result.update(valid=False, error=str(e))
+        results.append({"parameter_name": f["parameter_name"], **result})
+        if result["valid"]:
+            dependencies[f["parameter_name"]] = set(result["depends_on"])
+
+    errors = [f"Duplicate formula for parameter: {name}" for name in counts if name in duplicates]
+    warnings: list[str] = []
+    evaluation_order: list[str] = []
+    try:
+        evaluation_order = topological_order(dependencies)
+    except FormulaCycleError as e:
+        errors.append(str(e))
+        for r in results:
+            if r["parameter_name"] in e.cycle:
+                r["valid"] = False
+                r["error"] = str(e)
+
+    for name, deps in dependencies.items():
+        for dep in sorted((deps & calculated_parameters) - dependencies.keys() - duplicates):
+            warnings.append(f"'{name}' references calculated parameter '{dep}' which has no formula")
+
+    if dry_run and evaluation_order:
+        issues = formula_dry_run.dry_run_formulas(formulas, evaluation_order, samples, units)
+        for r in results:
+            if r["parameter_name"] in issues:
+                r["issues"] = issues[r["parameter_name"]]
+
+    return {
+        "valid": not errors and all(r["valid"] for r in results),
+        "results": results,
+        "evaluation_order": evaluation_order,
+        "errors": errors,
+        "warnings": warnings,
+    }
@@ -0,0 +1,185 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+from operator import itemgetter
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: merges are serialized within one process only
+    fcntl = None
+
+from app.metrics import timed
+from app.services.file_utils import write_atomic
+from app.services.parameter_service import ParameterRegistry, registry as parameter_registry
+from app.services.registry_snapshot import build_snapshot, snapshot_path_for
+
+# Deduplication of imported parameters against the registry and the file.
+# Every row is classified with dict lookups (O(1) per row):
+#
+#   new        - the name is in neither the registry nor earlier rows
+#   identical  - the registry has the name with the same fields
+#   conflict   - the registry has the name with different fields
+#   duplicate  - an earlier row of the same file has the name; the first
+#                occurrence is the one classified against the registry
+#
+# The classifier keeps one fingerprint per distinct name, so memory and
+# time stay linear in the file. Its output is a merge plan ("add" and
+# "conflicts") that apply_merge_plan writes to the registry in one atomic
+# replace, after checking that nothing it relied on has changed since.
+
+MERGE_FIELDS = ("display_name", "unit", "category", "section")
+LOCK_SUFFIX = ".lock"
+
+_validated_fingerprint = itemgetter(*MERGE_FIELDS)  # validated rows have every field
+
+_merge_lock = threading.Lock()
+
+
+class MergePlanConflict(ValueError):
+    """Raised when the registry changed under a merge plan; nothing was written."""
+
+    def __init__(self, names: list[str]):
+        self.names = names
+        super().__init__(f"Registry changed since the import for: {', '.join(names[:20])}")
+
+
+@contextmanager
+def _file_lock(path: Path):
+    """Exclusive flock on a sidecar file, so worker processes merge one at a time."""
+    if fcntl is None:
+        yield
+        return
+    fd = os.open(path.with_name(path.name + LOCK_SUFFIX), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)  # also releases the flock
+
+
+def fingerprint(parameter: dict) -> tuple[str, ...]:
+    return tuple(parameter.get(f, "") for f in MERGE_FIELDS)
+
+
+def _fields(parameter: dict) -> dict:
+    return {f: parameter.get(f, "") for f in MERGE_FIELDS}
+
+
+def _differing(a: tuple[str, ...], b: tuple[str, ...]) -> list[str]:
+    return [f for f, x, y in zip(MERGE_FIELDS, a, b) if x != y]
+
+
+class ImportMerger:
+    """
+    Classifies validated import batches against a registry index built
+    once per import. Feed batches in file order; totals accumulate.
+    """
+
+    def __init__(self, registry: ParameterRegistry = parameter_registry):
+        with timed("import_merge_index"):
+            self.existing = {p["name"]: fingerprint(p) for p in registry.all()}
+        self.seen: dict[str, tuple[str, ...]] = {}
+        self.totals = {"new": 0, "identical": 0, "conflict": 0, "duplicate": 0}
+
+    def classify(self, parameters: list[dict]) -> dict:
+        """
+        Classify one batch. Returns its part of the merge plan:
+        {add, conflicts, duplicates, identical}.
+        """
+        add, conflicts, duplicates = [], [], []
+        identical = 0
+        existing, seen = self.existing, self.seen
+        with timed("import_merge_classify"):
+            for p in parameters:
+                name = p["name"]
+                incoming = _validated_fingerprint(p)
+                first = seen.get(name)
+                if first is not None:
+                    duplicates.append({"name": name, "fields": _differing(first, incoming)})
+                    continue
+                seen[name] = incoming
+                current = existing.get(name)
+                if current is None:
+                    add.append({"name": name, **dict(zip(MERGE_FIELDS, incoming)), "applicable_asset_types": []})
+                elif current == incoming:
+                    identical += 1
+                else:
+                    conflicts.append({
+                        "name": name,
+                        "fields": _differing(current, incoming),
+                        "existing": dict(zip(MERGE_FIELDS, current)),
+                        "incoming": _fields(p),
+                    })
+        self.totals["new"] += len(add)
+        self.totals["identical"] += identical
+        self.totals["conflict"] += len(conflicts)
+        self.totals["duplicate"] += len(duplicates)
+        return {"add": add, "conflicts": conflicts, "duplicates": duplicates, "identical": identical}
+
+
+def apply_merge_plan(
+    add: list[dict],
+    conflicts: list[dict],
+    replace: list[str],
+    registry: ParameterRegistry = parameter_registry,
+) -> dict:
+    """
+    Write a merge plan to the registry file in one atomic replace.
+    - add: new parameters, appended in order
+    - conflicts: the plan's conflicts; those named in `replace` take the
+      incoming fields (asset types and other keys are kept), the rest keep
+      the registry's
+    Every entry is re-checked against the file as it is now: an added name
+    that appeared meanwhile (unless identical), or a replaced one whose
+    fields changed since the plan, raises MergePlanConflict and nothing is
+    written. Concurrent imports of different names both succeed.
+    Returns {added, replaced, unchanged, count}.
+    """
+    path = registry.path
+    replace = list(dict.fromkeys(replace))
+    incoming_by_name = {c["name"]: c for c in conflicts}
+    unknown = [name for name in replace if name not in incoming_by_name]
+    if unknown:
+        raise ValueError(f"Not a conflict in this plan: {', '.join(unknown[:20])}")
+
+    with timed("import_merge_apply"), _merge_lock, _file_lock(path):
+        parameters = json.loads(path.read_bytes())
+        position = {p["name"]: i for i, p in enumerate(parameters)}
+
+        stale = []
+        additions = []
+        for p in add:
+            i = position.get(p["name"])
+            if i is None:
+                additions.append(p)
+            elif fingerprint(parameters[i]) != fingerprint(p):
+                stale.append(p["name"])
+        for name in replace:
+            conflict = incoming_by_name[name]
+            i = position.get(name)
+            if i is None or fingerprint(parameters[i]) != fingerprint(conflict["existing"]):
+                stale.append(name)
+        if stale:
+            raise MergePlanConflict(stale)
+
+        for name in replace:
+            parameters[position[name]].update(_fields(incoming_by_name[name]["incoming"]))
+        added = {}
+        for p in additions:
+            added.setdefault(p["name"], {"name": p["name"], **_fields(p),
+                                         "applicable_asset_types": list(p.get("applicable_asset_types", []))})
+        parameters.extend(added.values())
+
+        if added or replace:
+            write_atomic(path, json.dumps(parameters, indent=2, ensure_ascii=False) + "\n")
+            if snapshot_path_for(path).exists():
+                # A stale snapshot is ignored anyway; rebuilding keeps the mapped fast path
+                build_snapshot(path)
+    return {
+        "added": len(added),
+        "replaced": len(replace),
+        "unchanged": len(add) - len(added) + len(conflicts) - len(replace),
+        "count": len(parameters),
+    }
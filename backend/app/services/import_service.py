@@ -0,0 +1,319 @@
+import codecs
+import csv
+import io
+import re
+import zipfile
+from typing import AsyncIterator, BinaryIO, Callable, Iterator
+
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+
+from app.metrics import timed
+
+# Chunked parameter import: CSV uploads are decoded incrementally and parsed
+# one chunk of complete records at a time; workbooks are read row by row in
+# read-only mode. Memory stays bounded by the chunk size, not the file size.
+
+CHUNK_SIZE = 64 * 1024
+BATCH_SIZE = 1000
+MAX_RECORD_SIZE = 1024 * 1024  # one CSV record, quoted newlines included
+REQUIRED_COLUMNS = {"name", "display_name", "unit", "category", "section"}
+VALID_CATEGORIES = ("input", "output", "calculated")
+
+_BOUNDARY_RE = re.compile(r'["\n]')
+
+# The csv module's own field limit (128 KB) would fail records that the
+# splitter below accepts; lift it to the record limit
+csv.field_size_limit(max(csv.field_size_limit(), MAX_RECORD_SIZE))
+
+
+class ParameterImportError(ValueError):
+    """Raised when an upload cannot be imported at all (e.g. bad header)."""
+
+
+class CsvRecordSplitter:
+    """
+    Splits decoded CSV text into complete records as chunks arrive.
+    The quote state at the end of the scanned text is carried over, so each
+    character is scanned once however long a record is. A record longer
+    than `max_record_size` (usually an unbalanced quote swallowing the rest
+    of the file) raises ParameterImportError instead of buffering it all.
+    Holds only plain data, so it can travel to a worker process and back.
+    """
+
+    def __init__(self, max_record_size: int = MAX_RECORD_SIZE):
+        self.max_record_size = max_record_size
+        self.pending = ""
+        self.scanned = 0  # length of `pending` already scanned
+        self.in_quotes = False  # quote state at `scanned`
+
+    def feed(self, text: str) -> str:
+        """Add decoded text; returns the complete records now available ("" if none)."""
+        self.pending += text
+        boundary = 0
+        for m in _BOUNDARY_RE.finditer(self.pending, self.scanned):
+            if m.group() == '"':
+                self.in_quotes = not self.in_quotes
+            elif not self.in_quotes:
+                boundary = m.end()
+        records, self.pending = self.pending[:boundary], self.pending[boundary:]
+        self.scanned = len(self.pending)
+        if self.scanned > self.max_record_size:
+            raise ParameterImportError(
+                f"A CSV record is longer than {self.max_record_size // 1024} KB; check for an unbalanced quote"
+            )
+        return records
+
+    def finish(self) -> str:
+        """The unterminated last record, if any."""
+        records, self.pending = self.pending, ""
+        self.scanned, self.in_quotes = 0, False
+        return records
+
+
+def _parse_records(text: str) -> list[list[str]]:
+    """Rows of complete CSV records; a malformed record raises ParameterImportError."""
+    try:
+        return list(csv.reader(io.StringIO(text)))
+    except csv.Error as e:
+        raise ParameterImportError(f"Malformed CSV: {e}") from e
+
+
+async def iter_csv_batches(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[str, list[list[str]]]]:
+    """
+    Yield ("", rows) as complete CSV records become available.
+    A CSV file is a single unnamed sheet.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    splitter = CsvRecordSplitter()
+    async for chunk in chunks:
+        with timed("csv_parse"):
+            records = splitter.feed(decoder.decode(chunk))
+            rows = _parse_records(records) if records else None
+        if rows is not None:
+            yield "", rows
+    rest = splitter.feed(decoder.decode(b"", final=True)) + splitter.finish()
+    if rest:
+        with timed("csv_parse"):
+            rows = _parse_records(rest)
+        yield "", rows
+
+
+def _cell_text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def iter_xlsx_batches(fileobj: BinaryIO, batch_size: int = BATCH_SIZE) -> Iterator[tuple[str, list[list[str]]]]:
+    """
+    Yield (sheet_title, rows) for every sheet of a workbook.
+    The workbook is opened read-only, so rows are streamed from the sheet
+    XML instead of building the full cell tree.
+    """
+    try:
+        with timed("xlsx_open"):
+            workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    except (zipfile.BadZipFile, InvalidFileException, KeyError) as e:
+        raise ParameterImportError(f"Could not read workbook: {e}") from e
+    try:
+        for sheet in workbook.worksheets:
+            rows: list[list[str]] = []
+            for values in sheet.iter_rows(values_only=True):
+                row = [_cell_text(v) for v in values]
+                # Read-only sheets pad short rows with None; trim them back
+                while row and row[-1] == "":
+                    row.pop()
+                rows.append(row)
+                if len(rows) >= batch_size:
+                    yield sheet.title, rows
+                    rows = []
+            if rows:
+                yield sheet.title, rows
+    finally:
+        workbook.close()
+
+
+def check_header(header: list[str]) -> list[str]:
+    """Return the cleaned column names or raise if required ones are missing."""
+    columns = [c.strip() for c in header]
+    missing = REQUIRED_COLUMNS - set(columns)
+    if missing:
+        raise ParameterImportError(f"Missing required columns: {', '.join(sorted(missing))}")
+    return columns
+
+
+def validate_rows(
+    rows: list[list[str]], columns: list[str], start: int, sheet: str = ""
+) -> tuple[list[dict], list[str]]:
+    """
+    Validate a batch of rows. `start` is the line number of the first row;
+    errors are prefixed with the sheet name when there is one.
+    Returns (parameters, errors).
+    """
+    prefix = f"[{sheet}] " if sheet else ""
+    parameters = []
+    errors = []
+    for i, values in enumerate(rows, start=start):
+        row = dict(zip(columns, values))
+        name = row.get("name", "").strip()
+        if not name:
+            errors.append(f"{prefix}Row {i}: missing name")
+            continue
+        if row.get("category", "").strip() not in VALID_CATEGORIES:
+            errors.append(f"{prefix}Row {i}: invalid category '{row.get('category', '')}'")
+            continue
+        parameters.append({
+            "name": name,
+            "display_name": (row.get("display_name") or name).strip(),
+            "unit": row.get("unit", "").strip(),
+            "category": row.get("category", "input").strip(),
+            "section": (row.get("section") or "IMPORTED").strip(),
+            "applicable_asset_types": [],
+            "enabled": True,
+        })
+    return parameters, errors
+
+
+class RowImporter:
+    """
+    Header detection, validation and batching over (sheet, rows) batches
+    from iter_csv_batches or iter_xlsx_batches.
+    The first non-blank row of each sheet is its header. A CSV file with an
+    unusable header raises ParameterImportError on the first feed. Workbook
+    sheets without the required columns are reported and skipped; if no
+    sheet is usable, finish() raises.
+    Holds only plain data, so it can travel to a worker process and back.
+    """
+
+    def __init__(self, batch_size: int = BATCH_SIZE):
+        self.batch_size = batch_size
+        self.sheet: str | None = None
+        self.columns: list[str] | None = None
+        self.skip_sheet = False
+        self.sheets_used = 0
+        self.first_header_error: ParameterImportError | None = None
+        self.line = 0
+        self.rows_seen = 0
+        self.count = 0
+        self.error_count = 0
+        self.batch: list[list[str]] = []
+        self.pending_errors: list[str] = []
+
+    def flush(self) -> list[dict]:
+        """Validate the rows collected so far; returns [] or one batch event."""
+        if not self.batch and not self.pending_errors:
+            return []
+        parameters, errors = validate_rows(self.batch, self.columns, self.line, self.sheet)
+        errors = self.pending_errors + errors
+        self.pending_errors = []
+        self.line += len(self.batch)
+        self.rows_seen += len(self.batch)
+        self.count += len(parameters)
+        self.error_count += len(errors)
+        self.batch = []
+        return [{"parameters": parameters, "errors": errors}]
+
+    def feed(self, sheet: str, rows: list[list[str]]) -> list[dict]:
+        """Add rows of one sheet; returns the batch events that filled up."""
+        events = []
+        if sheet != self.sheet:
+            if self.batch:
+                events += self.flush()
+            self.sheet, self.columns, self.skip_sheet = sheet, None, False
+        if self.skip_sheet:
+            return events
+        for row in rows:
+            if not row:
+                continue  # blank lines are skipped, as csv.DictReader does
+            if self.columns is None:
+                try:
+                    self.columns = check_header(row)
+                except ParameterImportError as e:
+                    if not sheet:
+                        raise
+                    self.first_header_error = self.first_header_error or e
+                    self.pending_errors.append(f"[{sheet}] {e}; sheet skipped")
+                    self.skip_sheet = True
+                    break
+                self.sheets_used += 1
+                self.line = 2
+                continue
+            self.batch.append(row)
+            if len(self.batch) >= self.batch_size:
+                events += self.flush()
+        return events
+
+    def finish(self) -> list[dict]:
+        """Flush the last batch and return it with the final summary event."""
+        if not self.sheets_used:
+            raise self.first_header_error or ParameterImportError(
+                f"Missing required columns: {', '.join(sorted(REQUIRED_COLUMNS))}"
+            )
+        events = self.flush()
+        summary = {"count": self.count, "error_count": self.error_count, "rows": self.rows_seen}
+        return events + [{"summary": summary}]
+
+
+async def import_rows(
+    batches: AsyncIterator[tuple[str, list[list[str]]]], batch_size: int = BATCH_SIZE
+) -> AsyncIterator[dict]:
+    """
+    Validate (sheet, rows) batches (see RowImporter). Yields
+    {"parameters": [...], "errors": [...]} per batch and a final
+    {"summary": {...}}.
+    """
+    importer = RowImporter(batch_size)
+    async for sheet, rows in batches:
+        for event in importer.feed(sheet, rows):
+            yield event
+    for event in importer.finish():
+        yield event
+
+
+def import_csv_block(
+    importer: RowImporter, splitter: CsvRecordSplitter, text: str, final: bool
+) -> tuple[RowImporter, CsvRecordSplitter, list[dict]]:
+    """
+    Add decoded `text` to `splitter`, then parse and validate the complete
+    CSV records it releases. Self-contained so it can run in a worker
+    process: the importer and splitter state are returned with the events.
+    Each block ends its own batch, so no partial rows travel back.
+    """
+    with timed("csv_parse"):
+        records = splitter.feed(text)
+        if final:
+            records += splitter.finish()
+        rows = _parse_records(records) if records else []
+    events = importer.feed("", rows) + importer.flush()
+    if final:
+        events += importer.finish()
+    return importer, splitter, events
+
+
+async def import_csv(
+    chunks: AsyncIterator[bytes], batch_size: int = BATCH_SIZE, run: Callable | None = None
+) -> AsyncIterator[dict]:
+    """
+    Parse and validate a CSV upload in bounded batches (see import_rows).
+    With `run` (an async `run(fn, *args)`, e.g. a process pool), each
+    decoded chunk is parsed and validated by import_csv_block through it,
+    keeping that work off the event loop.
+    """
+    if run is None:
+        async for event in import_rows(iter_csv_batches(chunks), batch_size):
+            yield event
+        return
+
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    importer = RowImporter(batch_size)
+    splitter = CsvRecordSplitter()
+    async for chunk in chunks:
+        importer, splitter, events = await run(import_csv_block, importer, splitter, decoder.decode(chunk), False)
+        for event in events:
+            yield event
+    importer, _, events = await run(import_csv_block, importer, splitter, decoder.decode(b"", final=True), True)
+    for event in events:
+        yield event
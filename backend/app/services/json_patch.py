@@ -0,0 +1,185 @@
+import copy
+
+# JSON Patch (RFC 6902) and JSON Merge Patch (RFC 7396) over parsed JSON.
+# Patches never mutate their input: only the containers on the path of an
+# operation are copied, so a multi-megabyte document shared with a cache
+# costs a handful of shallow copies per edit.
+
+JSON_PATCH_TYPE = "application/json-patch+json"
+MERGE_PATCH_TYPE = "application/merge-patch+json"
+
+
+class PatchError(ValueError):
+    """Raised when a patch is malformed or cannot be applied."""
+
+
+class PatchTestFailed(PatchError):
+    """Raised when a JSON Patch "test" operation does not match."""
+
+
+def parse_pointer(pointer: str) -> list[str]:
+    """Split a JSON Pointer ("/a/b~1c") into unescaped tokens."""
+    if not isinstance(pointer, str):
+        raise PatchError(f"Invalid JSON pointer: {pointer!r}")
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise PatchError(f"Invalid JSON pointer: {pointer!r}")
+    return [t.replace("~1", "/").replace("~0", "~") for t in pointer[1:].split("/")]
+
+
+def _index(container: list, token: str, allow_end: bool = False) -> int:
+    if allow_end and token == "-":
+        return len(container)
+    # ASCII only: str.isdigit() also accepts "²", which int() rejects
+    if not (token.isascii() and token.isdigit()) or (len(token) > 1 and token[0] == "0"):
+        raise PatchError(f"Invalid array index: {token!r}")
+    i = int(token)
+    if i > len(container) or (i == len(container) and not allow_end):
+        raise PatchError(f"Array index out of range: {i}")
+    return i
+
+
+def _get(doc, tokens: list[str]):
+    for token in tokens:
+        if isinstance(doc, dict):
+            if token not in doc:
+                raise PatchError(f"Path not found: /{'/'.join(tokens)}")
+            doc = doc[token]
+        elif isinstance(doc, list):
+            doc = doc[_index(doc, token)]
+        else:
+            raise PatchError(f"Path not found: /{'/'.join(tokens)}")
+    return doc
+
+
+def _copy_path(doc, tokens: list[str]):
+    """
+    Shallow-copy every container from the root down to the parent of the
+    target. Returns (new_root, parent).
+    """
+    root = copy.copy(doc)
+    parent = root
+    for token in tokens[:-1]:
+        if isinstance(parent, dict):
+            if token not in parent:
+                raise PatchError(f"Path not found: /{'/'.join(tokens)}")
+            child = copy.copy(parent[token])
+            parent[token] = child
+        elif isinstance(parent, list):
+            i = _index(parent, token)
+            child = copy.copy(parent[i])
+            parent[i] = child
+        else:
+            raise PatchError(f"Path not found: /{'/'.join(tokens)}")
+        parent = child
+    if not isinstance(parent, (dict, list)):
+        raise PatchError(f"Path not found: /{'/'.join(tokens)}")
+    return root, parent
+
+
+def _add(doc, tokens: list[str], value):
+    if not tokens:
+        return value
+    root, parent = _copy_path(doc, tokens)
+    if isinstance(parent, dict):
+        parent[tokens[-1]] = value
+    else:
+        parent.insert(_index(parent, tokens[-1], allow_end=True), value)
+    return root
+
+
+def _remove(doc, tokens: list[str]):
+    if not tokens:
+        raise PatchError("Cannot remove the document root")
+    root, parent = _copy_path(doc, tokens)
+    if isinstance(parent, dict):
+        if tokens[-1] not in parent:
+            raise PatchError(f"Path not found: /{'/'.join(tokens)}")
+        del parent[tokens[-1]]
+    else:
+        del parent[_index(parent, tokens[-1])]
+    return root
+
+
+def _json_equal(a, b) -> bool:
+    """
+    RFC 6902 equality: same JSON type and value, with numbers compared by
+    value (1 == 1.0). Unlike Python's ==, true is not 1 and false is not 0.
+    """
+    if isinstance(a, bool) or isinstance(b, bool):
+        return type(a) is type(b) and a == b
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return a == b
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(_json_equal(a[k], b[k]) for k in a)
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(_json_equal(x, y) for x, y in zip(a, b))
+    return type(a) is type(b) and a == b
+
+
+def apply_json_patch(doc, operations: list):
+    """Apply an RFC 6902 operation list. Returns the patched document."""
+    if not isinstance(operations, list):
+        raise PatchError("A JSON Patch must be a list of operations")
+    for op in operations:
+        if not isinstance(op, dict) or "op" not in op or "path" not in op:
+            raise PatchError("Each operation needs 'op' and 'path'")
+        name = op["op"]
+        tokens = parse_pointer(op["path"])
+        if name in ("add", "replace", "test") and "value" not in op:
+            raise PatchError(f"'{name}' needs a 'value'")
+
+        if name == "add":
+            doc = _add(doc, tokens, op["value"])
+        elif name == "remove":
+            doc = _remove(doc, tokens)
+        elif name == "replace":
+            _get(doc, tokens)  # target must exist
+            doc = _add(_remove(doc, tokens), tokens, op["value"]) if tokens else op["value"]
+        elif name in ("move", "copy"):
+            if "from" not in op:
+                raise PatchError(f"'{name}' needs 'from'")
+            source = parse_pointer(op["from"])
+            if name == "move" and tokens[:len(source)] == source and tokens != source:
+                raise PatchError("Cannot move a value into one of its children")
+            value = _get(doc, source)
+            if name == "move":
+                doc = _remove(doc, source)
+            doc = _add(doc, tokens, value)
+        elif name == "test":
+            if not _json_equal(_get(doc, tokens), op["value"]):
+                raise PatchTestFailed(f"Test failed at {op['path']}")
+        else:
+            raise PatchError(f"Unknown operation: {name!r}")
+    return doc
+
+
+def apply_merge_patch(doc, patch):
+    """Apply an RFC 7396 merge patch. Returns the patched document."""
+    if not isinstance(patch, dict):
+        return patch
+    result = dict(doc) if isinstance(doc, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = apply_merge_patch(result.get(key), value)
+    return result
+
+
+def patch_format(patch, media_type: str = "") -> str:
+    """
+    "json-patch" or "merge-patch". The media type decides when given;
+    otherwise a list is a JSON Patch and an object a merge patch.
+    """
+    if media_type == JSON_PATCH_TYPE or (media_type != MERGE_PATCH_TYPE and isinstance(patch, list)):
+        return "json-patch"
+    return "merge-patch"
+
+
+def apply_patch(doc, patch, media_type: str = ""):
+    """Apply either patch format (see patch_format)."""
+    if patch_format(patch, media_type) == "json-patch":
+        return apply_json_patch(doc, patch)
+    return apply_merge_patch(doc, patch)
@@ -0,0 +1,227 @@
+import json
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+DB_DIR = DATA_DIR / "db"
+DB_PATH = DB_DIR / "onboarding.db"
+POOL_SIZE = 8
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS plants (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    address TEXT NOT NULL,
+    manager_email TEXT NOT NULL,
+    description TEXT NOT NULL DEFAULT '',
+    submitted_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS assets (
+    plant_id INTEGER NOT NULL REFERENCES plants(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    display_name TEXT NOT NULL,
+    asset_type TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS parameters (
+    plant_id INTEGER NOT NULL REFERENCES plants(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    display_name TEXT NOT NULL,
+    unit TEXT NOT NULL,
+    category TEXT NOT NULL,
+    section TEXT NOT NULL,
+    enabled INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS formulas (
+    plant_id INTEGER NOT NULL REFERENCES plants(id) ON DELETE CASCADE,
+    parameter_name TEXT NOT NULL,
+    expression TEXT NOT NULL,
+    depends_on TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_assets_plant ON assets(plant_id);
+CREATE INDEX IF NOT EXISTS idx_parameters_plant ON parameters(plant_id);
+CREATE INDEX IF NOT EXISTS idx_formulas_plant ON formulas(plant_id);
+"""
+
+
+class ConnectionPool:
+    """
+    Fixed-size pool of SQLite connections in WAL mode.
+    WAL lets readers run alongside the single writer; busy_timeout makes
+    concurrent writers queue up instead of failing with "database is locked".
+    """
+
+    def __init__(self, path: Path, size: int = POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit mode: transactions are opened explicitly with BEGIN
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        # busy_timeout first: switching to WAL needs a lock that another
+        # thread or worker process may hold while opening the same file
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create:
+                    self._created += 1
+            conn = self._connect() if can_create else self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        self._created = 0
+
+
+class SQLiteStore:
+    """Pooled SQLite database whose schema is created on first use."""
+
+    schema = ""
+
+    def __init__(self, path: Path, pool_size: int = POOL_SIZE):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.pool = ConnectionPool(path, pool_size)
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+
+    @contextmanager
+    def _connection(self):
+        with self.pool.connection() as conn:
+            if not self._schema_ready:
+                with self._schema_lock:
+                    if not self._schema_ready:
+                        conn.executescript(self.schema)
+                        self._schema_ready = True
+            yield conn
+
+    @contextmanager
+    def _transaction(self):
+        with self._connection() as conn:
+            # IMMEDIATE takes the write lock up front, so two writers never
+            # deadlock trying to upgrade from a read lock
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+
+class OnboardingStore(SQLiteStore):
+    """Normalized SQLite persistence for onboarding payloads."""
+
+    schema = SCHEMA
+
+    def __init__(self, path: Path = DB_PATH, pool_size: int = POOL_SIZE):
+        super().__init__(path, pool_size)
+
+    def save(self, payload: dict) -> dict:
+        """
+        Persist an OnboardingPayload-shaped dict in one transaction.
+        Returns the stored plant row.
+        """
+        plant = payload["plant"]
+        submitted_at = datetime.utcnow().isoformat()
+        with self._transaction() as conn:
+            cur = conn.execute(
+                "INSERT INTO plants (name, address, manager_email, description, submitted_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (plant["name"], plant["address"], plant["manager_email"],
+                 plant.get("description") or "", submitted_at),
+            )
+            plant_id = cur.lastrowid
+            conn.executemany(
+                "INSERT INTO assets (plant_id, name, display_name, asset_type) VALUES (?, ?, ?, ?)",
+                [(plant_id, a["name"], a["display_name"], a["asset_type"]) for a in payload["assets"]],
+            )
+            conn.executemany(
+                "INSERT INTO parameters (plant_id, name, display_name, unit, category, section, enabled)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (plant_id, p["name"], p["display_name"], p["unit"], p["category"],
+                     p["section"], int(p.get("enabled", True)))
+                    for p in payload["parameters"]
+                ],
+            )
+            conn.executemany(
+                "INSERT INTO formulas (plant_id, parameter_name, expression, depends_on) VALUES (?, ?, ?, ?)",
+                [
+                    (plant_id, f["parameter_name"], f["expression"], json.dumps(f.get("depends_on", [])))
+                    for f in payload.get("formulas", [])
+                ],
+            )
+        return {"id": plant_id, **plant, "submitted_at": submitted_at}
+
+    def list_plants(self, offset: int = 0, limit: int = 50) -> tuple[list[dict], int]:
+        """Page through stored plants, newest first. Returns (page, total)."""
+        with self._connection() as conn:
+            total = conn.execute("SELECT COUNT(*) FROM plants").fetchone()[0]
+            rows = conn.execute(
+                "SELECT p.*,"
+                " (SELECT COUNT(*) FROM assets WHERE plant_id = p.id) AS num_assets,"
+                " (SELECT COUNT(*) FROM parameters WHERE plant_id = p.id) AS num_parameters,"
+                " (SELECT COUNT(*) FROM formulas WHERE plant_id = p.id) AS num_formulas"
+                " FROM plants p ORDER BY p.id DESC LIMIT ? OFFSET ?",
+                (limit, offset),
+            ).fetchall()
+        return [dict(r) for r in rows], total
+
+    def get_plant(self, plant_id: int) -> dict | None:
+        """Load a stored plant with its assets, parameters and formulas."""
+        with self._connection() as conn:
+            plant = conn.execute("SELECT * FROM plants WHERE id = ?", (plant_id,)).fetchone()
+            if plant is None:
+                return None
+            assets = conn.execute(
+                "SELECT name, display_name, asset_type FROM assets WHERE plant_id = ? ORDER BY rowid",
+                (plant_id,),
+            ).fetchall()
+            parameters = conn.execute(
+                "SELECT name, display_name, unit, category, section, enabled"
+                " FROM parameters WHERE plant_id = ? ORDER BY rowid",
+                (plant_id,),
+            ).fetchall()
+            formulas = conn.execute(
+                "SELECT parameter_name, expression, depends_on FROM formulas WHERE plant_id = ? ORDER BY rowid",
+                (plant_id,),
+            ).fetchall()
+
+        plant = dict(plant)
+        plant_id = plant.pop("id")
+        submitted_at = plant.pop("submitted_at")
+        return {
+            "id": plant_id,
+            "submitted_at": submitted_at,
+            "plant": plant,
+            "assets": [dict(a) for a in assets],
+            "parameters": [{**dict(p), "enabled": bool(p["enabled"])} for p in parameters],
+            "formulas": [{**dict(f), "depends_on": json.loads(f["depends_on"])} for f in formulas],
+        }
+
+
+store = OnboardingStore()
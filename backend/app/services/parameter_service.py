@@ -1,22 +1,171 @@
+import hashlib
 import json
+import threading
 from pathlib import Path
+from typing import NamedTuple
+
+from app.metrics import timed
+from app.services.registry_snapshot import RegistrySnapshot, load_fresh
 
 DATA_DIR = Path(__file__).parent.parent / "data"
+REGISTRY_PATH = DATA_DIR / "parameter_registry.json"
+
+
+class RegistryState(NamedTuple):
+    """
+    Everything one load of the registry produced. `parameters` is None
+    while only the snapshot is loaded; `digest` is the content hash of the
+    loaded file and `version` is bumped on every (re)load so dependents
+    can rebuild.
+    """
+    snapshot: RegistrySnapshot | None
+    parameters: list[dict] | None
+    by_name: dict[str, dict]
+    by_asset_type: dict[str, list[int]]
+    by_section: dict[str, list[int]]
+    by_category: dict[str, list[int]]
+    digest: str
+    version: int
+
+
+class ParameterRegistry:
+    """
+    In-memory parameter registry.
+    - Loaded once, reloaded only when the file's mtime or size changes
+    - Inverted indexes by asset type, section and category
+    - If a fresh binary snapshot sits next to the JSON (see
+      registry_snapshot), it is memory-mapped instead of parsing the JSON:
+      asset-type filters run on its bitmaps, and the dicts and indexes
+      below are only built when something needs the whole registry
+    - The snapshot, list, indexes, digest and version of one load are
+      swapped as one RegistryState and each lookup reads it once, so a
+      request served during a reload never pairs an old index with a new
+      list, or a new body with an old ETag
+    Lookups cost time proportional to the result size.
+    """
+
+    def __init__(self, path: Path = REGISTRY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._stamp: tuple[int, int] | None = None  # (st_mtime_ns, st_size) of the loaded file
+        self.state = RegistryState(None, [], {}, {}, {}, {}, "", 0)
+
+    @property
+    def snapshot(self) -> RegistrySnapshot | None:
+        return self.state.snapshot
+
+    @property
+    def digest(self) -> str:
+        return self.state.digest
+
+    @property
+    def version(self) -> int:
+        return self.state.version
+
+    @property
+    def _materialized(self) -> bool:
+        return self.state.parameters is not None
+
+    @staticmethod
+    def _build(
+        parameters: list[dict], snapshot: RegistrySnapshot | None, digest: str, version: int
+    ) -> RegistryState:
+        by_name: dict[str, dict] = {}
+        by_asset_type: dict[str, list[int]] = {}
+        by_section: dict[str, list[int]] = {}
+        by_category: dict[str, list[int]] = {}
+        for i, p in enumerate(parameters):
+            by_name[p["name"]] = p
+            for at in p.get("applicable_asset_types", []):
+                by_asset_type.setdefault(at, []).append(i)
+            by_section.setdefault(p.get("section", ""), []).append(i)
+            by_category.setdefault(p.get("category", ""), []).append(i)
+        return RegistryState(snapshot, parameters, by_name, by_asset_type, by_section, by_category, digest, version)
+
+    def refresh(self) -> None:
+        """Reload the registry if the file has changed since the last load."""
+        st = self.path.stat()
+        stamp = (st.st_mtime_ns, st.st_size)
+        if stamp == self._stamp:
+            return
+        with self._lock:
+            if stamp == self._stamp:
+                return
+            version = self.version + 1
+            with timed("registry_load"):
+                snapshot = load_fresh(self.path)
+                if snapshot is not None:
+                    self.state = RegistryState(snapshot, None, {}, {}, {}, {}, snapshot.digest, version)
+                else:
+                    raw = self.path.read_bytes()
+                    self.state = self._build(json.loads(raw), None, hashlib.sha256(raw).hexdigest(), version)
+            self._stamp = stamp
+
+    def current(self) -> RegistryState:
+        """The state of the latest load; pass it to the lookups to answer from one load."""
+        self.refresh()
+        return self.state
+
+    def _loaded(self, state: RegistryState | None = None) -> RegistryState:
+        """The state with its dicts and indexes, built from the snapshot on first use."""
+        if state is None:
+            state = self.current()
+        if state.parameters is not None:
+            return state
+        with self._lock:
+            if self.state is state:
+                with timed("registry_materialize"):
+                    self.state = self._build(state.snapshot.records(), state.snapshot, state.digest, state.version)
+                return self.state
+            if self.state.version == state.version:
+                # Another request materialized this same load first
+                return self.state
+        # A state superseded by a reload: answer from it without publishing
+        return self._build(state.snapshot.records(), state.snapshot, state.digest, state.version)
+
+    def all(self, state: RegistryState | None = None) -> list[dict]:
+        return self._loaded(state).parameters
+
+    def get(self, name: str) -> dict | None:
+        return self._loaded().by_name.get(name)
+
+    @staticmethod
+    def _lookup(parameters: list[dict], index: dict[str, list[int]], keys: list[str]) -> list[dict]:
+        positions: set[int] = set()
+        for key in keys:
+            positions.update(index.get(key, ()))
+        # Keep registry order so results are stable across calls
+        return [parameters[i] for i in sorted(positions)]
+
+    def by_asset_types(self, asset_types: list[str], state: RegistryState | None = None) -> list[dict]:
+        if state is None:
+            state = self.current()
+        if state.snapshot is None:
+            return self._lookup(state.parameters, state.by_asset_type, asset_types)
+        indices = state.snapshot.select_asset_types(asset_types)
+        if state.parameters is not None:
+            return [state.parameters[i] for i in indices]
+        return state.snapshot.records(indices)
+
+    def by_sections(self, sections: list[str]) -> list[dict]:
+        state = self._loaded()
+        return self._lookup(state.parameters, state.by_section, sections)
+
+    def by_categories(self, categories: list[str]) -> list[dict]:
+        state = self._loaded()
+        return self._lookup(state.parameters, state.by_category, categories)
+
+
+registry = ParameterRegistry()
 
 
 def load_parameters() -> list[dict]:
     """Load all parameters from the registry."""
-    registry_path = DATA_DIR / "parameter_registry.json"
-    with open(registry_path, "r") as f:
-        return json.load(f)
+    return registry.all()
 
 
-def filter_parameters(asset_types: list[str]) -> list[dict]:
-    """Filter parameters by applicable asset types."""
-    all_params = load_parameters()
+def filter_parameters(asset_types: list[str], state: RegistryState | None = None) -> list[dict]:
+    """Filter parameters by applicable asset types, from `state` if given (see ParameterRegistry.current)."""
     if not asset_types:
-        return all_params
-    return [
-        p for p in all_params
-        if any(at in p["applicable_asset_types"] for at in asset_types)
-    ]
+        return registry.all(state)
+    return registry.by_asset_types(asset_types, state)
@@ -0,0 +1,489 @@
+import codecs
+import json
+import math
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator
+
+import anyio.to_thread
+import numpy as np
+
+from app.metrics import REGISTRY, Counter, timed
+from app.services.formula_engine import FormulaError
+from app.services.formula_graph import FormulaGraph
+from app.services.import_service import ParameterImportError, iter_csv_batches
+from app.services.onboarding_store import store as onboarding_store
+from app.services.readings_store import ReadingsStore, Series
+from app.services.rollups import RollupStore
+
+# Ingestion of parameter readings for an onboarded plant.
+# A reading row is one timestamp (and optionally one asset) with values for
+# any of the plant's enabled input/output parameters:
+#
+#   NDJSON: {"timestamp": "2024-05-01T10:00:00Z", "asset": "boiler_1", "steam_generation": 412.5}
+#   CSV:    timestamp,asset,steam_generation,coal_consumption
+#
+# Rows are parsed a block at a time into columnar arrays per parameter and
+# buffered; every FLUSH_ROWS rows (and at the end of the upload) the
+# buffer evaluates the plant's calculated parameters over the whole batch
+# through the fused formula plan, appends one chunk to the readings log and
+# merges the chunk into the hour/day rollups.
+
+FLUSH_ROWS = 64 * 1024
+MAX_LINE_SIZE = 1024 * 1024  # one NDJSON line
+MAX_ERRORS = 20
+TIMESTAMP_FIELD = "timestamp"
+ASSET_FIELD = "asset"
+PLANT_LEVEL = ""  # asset of readings that are not tied to one asset
+
+readings_ingested = REGISTRY.register(Counter(
+    "readings_ingested_total", "Parameter readings ingested, by kind.", ("kind",),
+))
+
+
+class ReadingsFormatError(ValueError):
+    """Raised when an upload cannot be ingested at all (e.g. bad CSV header)."""
+
+
+class PlantModel:
+    """What ingestion needs to know about one onboarded plant."""
+
+    def __init__(self, plant: dict):
+        enabled = [p for p in plant["parameters"] if p["enabled"]]
+        self.plant_id: int = plant["id"]
+        self.sections = {p["name"]: p["section"] for p in enabled}
+        self.calculated = {p["name"] for p in enabled if p["category"] == "calculated"}
+        self.measured = self.sections.keys() - self.calculated
+        formulas = [f for f in plant["formulas"] if f["parameter_name"] in self.calculated]
+        self.graph = FormulaGraph(formulas) if formulas else None
+        self.assets = {PLANT_LEVEL: 0}
+        for asset in plant["assets"]:
+            self.assets.setdefault(asset["name"], len(self.assets))
+        self.asset_names = list(self.assets)
+
+    def check_parameter(self, name: str) -> str | None:
+        """Why readings for `name` are not accepted, or None."""
+        if name in self.measured:
+            return None
+        if name in self.calculated:
+            return f"'{name}' is calculated from its formula"
+        return f"Unknown or disabled parameter '{name}'"
+
+
+_models: dict[int, PlantModel] = {}
+_models_lock = threading.Lock()
+
+
+def load_plant_model(plant_id: int) -> PlantModel | None:
+    """PlantModel for an onboarded plant (cached; plants do not change), or None."""
+    model = _models.get(plant_id)
+    if model is None:
+        plant = onboarding_store.get_plant(plant_id)
+        if plant is None:
+            return None
+        try:
+            model = PlantModel(plant)
+        except FormulaError as e:
+            raise ReadingsFormatError(f"Plant formulas cannot be evaluated: {e}") from e
+        with _models_lock:
+            model = _models.setdefault(plant_id, model)
+    return model
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MS = timedelta(milliseconds=1)
+_MS_RANGE = range(-2**63, 2**63)  # timestamps are stored as int64 milliseconds
+
+
+def timestamp_ms(value) -> int:
+    """
+    Epoch milliseconds from a number (epoch seconds) or an ISO 8601 string
+    (naive times are UTC). Raises ValueError, also for times outside the
+    int64 millisecond range.
+    """
+    if type(value) in (int, float):
+        try:
+            seconds = float(value)
+        except OverflowError:
+            raise ValueError("timestamp out of range") from None
+    elif isinstance(value, str):
+        value = value.strip()
+        try:
+            seconds = float(value)
+        except ValueError:
+            parsed = datetime.fromisoformat(value)
+            if parsed.tzinfo is None:
+                parsed = parsed.replace(tzinfo=timezone.utc)
+            return (parsed - _EPOCH) // _MS
+    else:
+        raise ValueError("missing timestamp")
+    if not math.isfinite(seconds):
+        raise ValueError("timestamp is not finite")
+    ms = seconds * 1000
+    if not math.isfinite(ms) or round(ms) not in _MS_RANGE:
+        raise ValueError("timestamp out of range")
+    return round(ms)
+
+
+def _reading_count(obj: dict) -> int:
+    return len(obj) - (TIMESTAMP_FIELD in obj) - (ASSET_FIELD in obj)
+
+
+class Block:
+    """
+    One parsed block of rows in columnar form: timestamps and asset codes
+    per row, and per parameter the rows that have a value.
+    """
+
+    def __init__(self):
+        self.timestamps: list[int] = []
+        self.assets: list[int] = []
+        self.columns: dict[str, tuple[np.ndarray, np.ndarray]] = {}  # name -> (row indices, values)
+        self.rejected = 0
+        self.errors: list[str] = []
+
+    def reject(self, count: int, message: str) -> None:
+        self.rejected += count
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(message)
+
+
+def parse_ndjson_lines(model: PlantModel, lines: list[str], first_line: int = 1) -> Block:
+    """Parse complete NDJSON lines (blank lines are skipped)."""
+    block = Block()
+    lines = [(first_line + i, line) for i, line in enumerate(lines) if line.strip()]
+    try:
+        # One C-level parse for the whole block; per line only on a bad line
+        objects = json.loads("[" + ",".join(line for _, line in lines) + "]")
+    except ValueError:
+        objects = []
+        for number, line in lines:
+            try:
+                objects.append(json.loads(line))
+            except ValueError:
+                objects.append(None)
+
+    columns: dict[str, tuple[list[int], list[float]]] = {}
+    asset_codes = model.assets
+    row = 0
+    for (number, _), obj in zip(lines, objects):
+        if not isinstance(obj, dict):
+            block.reject(1, f"Line {number}: not a JSON object")
+            continue
+        try:
+            ts = timestamp_ms(obj.get(TIMESTAMP_FIELD))
+        except ValueError as e:
+            block.reject(_reading_count(obj), f"Line {number}: invalid timestamp ({e})")
+            continue
+        asset = obj.get(ASSET_FIELD, PLANT_LEVEL)
+        code = asset_codes.get(asset) if isinstance(asset, str) else None
+        if code is None:
+            block.reject(_reading_count(obj), f"Line {number}: unknown asset {asset!r}")
+            continue
+        for name, value in obj.items():
+            if name == TIMESTAMP_FIELD or name == ASSET_FIELD or value is None:
+                continue
+            try:
+                # float() also rejects ints too large for a float64 (OverflowError)
+                value = float(value) if type(value) in (int, float) else math.nan
+            except OverflowError:
+                value = math.nan
+            if not math.isfinite(value):
+                block.reject(1, f"Line {number}: '{name}' is not a finite number")
+                continue
+            column = columns.get(name)
+            if column is None:
+                problem = model.check_parameter(name)
+                if problem:
+                    block.reject(1, f"Line {number}: {problem}")
+                    continue
+                column = columns[name] = ([], [])
+            column[0].append(row)
+            column[1].append(value)
+        block.timestamps.append(ts)
+        block.assets.append(code)
+        row += 1
+
+    block.columns = {
+        name: (np.array(rows, dtype=np.intp), np.array(values, dtype=float))
+        for name, (rows, values) in columns.items()
+    }
+    return block
+
+
+def _to_floats(cells: tuple[str, ...]) -> tuple[np.ndarray, int]:
+    """
+    Column of CSV cells as floats; empty cells are NaN.
+    Infinite values are bad cells, as in NDJSON. Returns (values, bad cells).
+    """
+    try:
+        values, bad = np.array(cells, dtype=float), 0
+    except ValueError:
+        values = np.empty(len(cells))
+        bad = 0
+        for i, cell in enumerate(cells):
+            try:
+                values[i] = float(cell) if cell.strip() else math.nan
+            except ValueError:
+                values[i] = math.nan
+                bad += 1
+    infinite = np.isinf(values)
+    if infinite.any():
+        values[infinite] = math.nan
+        bad += int(infinite.sum())
+    return values, bad
+
+
+class CsvHeader:
+    """Column roles of a readings CSV, checked once per upload."""
+
+    def __init__(self, model: PlantModel, header: list[str]):
+        names = [h.strip() for h in header]
+        if TIMESTAMP_FIELD not in names:
+            raise ReadingsFormatError(f"CSV header must include a '{TIMESTAMP_FIELD}' column")
+        self.width = len(names)
+        self.timestamp = names.index(TIMESTAMP_FIELD)
+        self.asset = names.index(ASSET_FIELD) if ASSET_FIELD in names else None
+        self.parameters: list[tuple[int, str]] = []
+        self.problems: list[tuple[int, str]] = []  # columns whose readings are rejected
+        for i, name in enumerate(names):
+            if i in (self.timestamp, self.asset):
+                continue
+            problem = model.check_parameter(name)
+            if problem:
+                self.problems.append((i, f"Column '{name}': {problem}"))
+            else:
+                self.parameters.append((i, name))
+
+
+def parse_csv_rows(model: PlantModel, header: CsvHeader, rows: list[list[str]], first_row: int = 2) -> Block:
+    """Parse data rows of a readings CSV; cells are converted a column at a time."""
+    block = Block()
+    good = []
+    for i, row in enumerate(rows):
+        if len(row) == header.width:
+            good.append(row)
+        elif any(cell.strip() for cell in row):
+            block.reject(max(0, len(row) - 1), f"Row {first_row + i}: expected {header.width} columns")
+    if not good:
+        return block
+    cells = list(zip(*good))
+
+    keep = np.ones(len(good), dtype=bool)
+    timestamps = []
+    for i, value in enumerate(cells[header.timestamp]):
+        try:
+            timestamps.append(timestamp_ms(value))
+        except ValueError as e:
+            timestamps.append(0)
+            keep[i] = False
+            block.reject(0, f"Row {first_row + i}: invalid timestamp ({e})")
+    if header.asset is None:
+        assets = [0] * len(good)
+    else:
+        assets = [model.assets.get(a.strip(), -1) for a in cells[header.asset]]
+        for i, code in enumerate(assets):
+            if code < 0 and keep[i]:
+                keep[i] = False
+                block.reject(0, f"Row {first_row + i}: unknown asset {cells[header.asset][i]!r}")
+
+    for i, problem in header.problems:
+        count = sum(1 for cell in cells[i] if cell.strip())
+        if count:
+            block.reject(count, problem)
+
+    kept = np.flatnonzero(keep)
+    for i, name in header.parameters:
+        values, bad = _to_floats(cells[i])
+        if bad:
+            block.reject(bad, f"Column '{name}': {bad} value(s) are not finite numbers")
+        present = ~np.isnan(values)
+        block.rejected += int((present & ~keep).sum())
+        present &= keep
+        values = values[kept]
+        rows = np.flatnonzero(present[kept])
+        if len(rows):
+            block.columns[name] = (rows, values[rows])
+    block.timestamps = np.asarray(timestamps, dtype=np.int64)[kept].tolist()
+    block.assets = np.asarray(assets)[kept].tolist()
+    return block
+
+
+class ReadingBuffer:
+    """
+    Columnar buffer of parsed blocks for one plant. flush() turns it into
+    one chunk in the readings log, with calculated parameters evaluated
+    over the whole batch, and updates the rollups.
+    """
+
+    def __init__(self, model: PlantModel, store: ReadingsStore, rollups: RollupStore | None = None):
+        self.model = model
+        self.store = store
+        self.rollups = rollups
+        self.rows = 0
+        self._timestamps: list[list[int]] = []
+        self._assets: list[list[int]] = []
+        self._columns: dict[str, list[tuple[np.ndarray, np.ndarray]]] = {}
+        self.totals = {"rows": 0, "readings": 0, "calculated": 0, "rejected": 0, "chunks": 0}
+        self.errors: list[str] = []
+
+    def add(self, block: Block) -> None:
+        for name, (rows, values) in block.columns.items():
+            self._columns.setdefault(name, []).append((rows + self.rows, values))
+        self._timestamps.append(block.timestamps)
+        self._assets.append(block.assets)
+        self.rows += len(block.timestamps)
+        self.totals["rejected"] += block.rejected
+        self.errors.extend(block.errors[:MAX_ERRORS - len(self.errors)])
+
+    def _dense(self) -> tuple[np.ndarray, np.ndarray, dict[str, np.ndarray]]:
+        n = self.rows
+        timestamps = np.fromiter((t for part in self._timestamps for t in part), dtype=np.int64, count=n)
+        assets = np.fromiter((a for part in self._assets for a in part), dtype=np.int32, count=n)
+        columns = {}
+        for name, parts in self._columns.items():
+            column = np.full(n, np.nan)
+            for rows, values in parts:
+                column[rows] = values
+            columns[name] = column
+        return timestamps, assets, columns
+
+    def flush(self) -> None:
+        """Evaluate calculated parameters and append the buffered rows as one chunk."""
+        if not self.rows:
+            return
+        with timed("readings_flush"):
+            timestamps, assets, columns = self._dense()
+            readings = int(sum(len(values) for parts in self._columns.values() for _, values in parts))
+
+            calculated = {}
+            if self.model.graph is not None:
+                inputs = {name: columns.get(name, np.full(self.rows, np.nan)) for name in self.model.graph.inputs}
+                results = self.model.graph.evaluate(inputs)
+                for name in self.model.graph.order:
+                    values = np.broadcast_to(results[name], (self.rows,))
+                    # Rows missing an input (NaN) or dividing by zero (inf) have no value
+                    calculated[name] = np.where(np.isfinite(values), values, np.nan)
+
+            series = self._series(timestamps, assets, {**columns, **calculated})
+            self.store.append(self.model.plant_id, series)
+            if self.rollups is not None:
+                # After the log: a crash in between is repaired with `python -m app.services.rollups`
+                self.rollups.add(self.model.plant_id, series)
+
+        computed = sum(len(s[2]) for s in series if s[1] in calculated)
+        self.totals["rows"] += self.rows
+        self.totals["readings"] += readings
+        self.totals["calculated"] += computed
+        self.totals["chunks"] += 1
+        readings_ingested.inc("measured", amount=readings)
+        readings_ingested.inc("calculated", amount=computed)
+        self.rows = 0
+        self._timestamps, self._assets, self._columns = [], [], {}
+
+    def _series(self, timestamps: np.ndarray, assets: np.ndarray, columns: dict[str, np.ndarray]) -> list[Series]:
+        """Split every column by asset, dropping rows without a value."""
+        order = np.argsort(assets, kind="stable")
+        assets = assets[order]
+        timestamps = timestamps[order]
+        codes = np.unique(assets)
+        bounds = np.searchsorted(assets, codes).tolist() + [len(assets)]
+        series = []
+        for name, column in columns.items():
+            column = column[order]
+            for code, start, end in zip(codes.tolist(), bounds, bounds[1:]):
+                values = column[start:end]
+                present = ~np.isnan(values)
+                if present.any():
+                    series.append((self.model.asset_names[code], name,
+                                   timestamps[start:end][present], values[present]))
+        return series
+
+    def summary(self) -> dict:
+        return {"plant_id": self.model.plant_id, **self.totals, "errors": self.errors}
+
+
+def _timed_parse(parse, *args) -> Block:
+    with timed("readings_parse"):
+        return parse(*args)
+
+
+async def _iter_ndjson_lines(
+    chunks: AsyncIterator[bytes], max_line_size: int = MAX_LINE_SIZE
+) -> AsyncIterator[list[str]]:
+    """
+    Yield lists of complete lines as they become available. Lines end at
+    "\n" only (str.splitlines() would also split on "\r", "\x1c" or
+    "\u2028", which JSON strings may hold), and each character is scanned
+    once. A line longer than `max_line_size` raises ReadingsFormatError
+    instead of buffering the rest of the upload.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    scanned = 0  # length of `pending` already searched for "\n"
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        cut = pending.rfind("\n", scanned) + 1
+        if cut:
+            yield pending[:cut - 1].split("\n")
+            pending = pending[cut:]
+        scanned = len(pending)
+        if scanned > max_line_size:
+            raise ReadingsFormatError(f"An NDJSON line is longer than {max_line_size // 1024} KB")
+    pending += decoder.decode(b"", final=True)
+    if pending.strip():
+        yield pending.split("\n")
+
+
+async def ingest_readings(
+    model: PlantModel,
+    chunks: AsyncIterator[bytes],
+    csv_format: bool,
+    store: ReadingsStore,
+    rollups: RollupStore | None,
+    flush_rows: int = FLUSH_ROWS,
+) -> dict:
+    """
+    Parse an upload of readings (NDJSON, or CSV with csv_format) into
+    `store`, buffer it and flush every `flush_rows` rows and at the end.
+    The stores are required so readings and their rollups (None for none)
+    always land side by side. Blocks are parsed and flushed in worker
+    threads, so the event loop keeps serving.
+    Returns {plant_id, rows, readings, calculated, rejected, chunks, errors}.
+    Raises ReadingsFormatError for a CSV without a usable header, or a
+    line or record too long to be one reading.
+    """
+    buffer = ReadingBuffer(model, store, rollups)
+
+    async def add(block: Block) -> None:
+        buffer.add(block)
+        if buffer.rows >= flush_rows:
+            await anyio.to_thread.run_sync(buffer.flush)
+
+    if csv_format:
+        header = None
+        line = 2
+        try:
+            async for _, rows in iter_csv_batches(chunks):
+                if header is None:
+                    if not rows:
+                        continue
+                    header = CsvHeader(model, rows[0])
+                    rows = rows[1:]
+                block = await anyio.to_thread.run_sync(_timed_parse, parse_csv_rows, model, header, rows, line)
+                line += len(rows)
+                await add(block)
+        except ParameterImportError as e:
+            raise ReadingsFormatError(str(e)) from e
+        if header is None:
+            raise ReadingsFormatError("CSV upload is empty")
+    else:
+        line = 1
+        async for lines in _iter_ndjson_lines(chunks):
+            block = await anyio.to_thread.run_sync(_timed_parse, parse_ndjson_lines, model, lines, line)
+            line += len(lines)
+            await add(block)
+
+    await anyio.to_thread.run_sync(buffer.flush)
+    readings_ingested.inc("rejected", amount=buffer.totals["rejected"])
+    return buffer.summary()
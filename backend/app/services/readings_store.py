@@ -0,0 +1,127 @@
+import json
+import mmap
+import os
+import struct
+import threading
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are serialized within one process only
+    fcntl = None
+
+from app.metrics import timed
+
+# Append-only store of parameter readings, one log file per plant.
+# Each flush appends one chunk; a chunk is column-oriented per series
+# (one asset + parameter):
+#
+#   header: magic, metadata length, data length
+#   metadata: JSON {"series": [[asset, parameter, count], ...]}
+#   data: per series, `count` int64 timestamps (epoch ms) then `count`
+#         float64 values, in metadata order
+#
+# Chunks are written with one write() on an O_APPEND descriptor under an
+# exclusive flock, so several worker processes can append to one plant.
+
+READINGS_DIR = Path(__file__).parent.parent / "data" / "readings"
+LOG_NAME = "readings.log"
+MAGIC = b"PRMREAD1"
+CHUNK_HEADER = struct.Struct("<8sIQ")
+
+Series = tuple[str, str, np.ndarray, np.ndarray]  # (asset, parameter, timestamps_ms, values)
+
+
+class ReadingsStoreError(ValueError):
+    """Raised when a readings log is corrupt."""
+
+
+def encode_chunk(series: list[Series]) -> bytes:
+    meta = json.dumps({"series": [[asset, parameter, len(ts)] for asset, parameter, ts, _ in series]},
+                      separators=(",", ":")).encode("utf-8")
+    data = b"".join(
+        part
+        for _, _, ts, values in series
+        for part in (np.asarray(ts, dtype="<i8").tobytes(), np.asarray(values, dtype="<f8").tobytes())
+    )
+    return CHUNK_HEADER.pack(MAGIC, len(meta), len(data)) + meta + data
+
+
+class ReadingsStore:
+    """Append-only columnar log of readings per plant."""
+
+    def __init__(self, directory: Path = READINGS_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    def path_for(self, plant_id: int) -> Path:
+        return self.directory / str(plant_id) / LOG_NAME
+
+    def append(self, plant_id: int, series: list[Series]) -> int:
+        """Append one chunk of series. Returns the number of bytes written."""
+        series = [s for s in series if len(s[2])]
+        if not series:
+            return 0
+        chunk = encode_chunk(series)
+        path = self.path_for(plant_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with timed("readings_append"), self._lock:
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                view = memoryview(chunk)
+                while view:
+                    view = view[os.write(fd, view):]
+            finally:
+                os.close(fd)  # also releases the flock
+        return len(chunk)
+
+    def scan(self, plant_id: int) -> Iterator[Series]:
+        """
+        Every stored series chunk in append order. Arrays are read-only
+        views on a mapping of the log; copy them to keep them.
+        """
+        path = self.path_for(plant_id)
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        offset = 0
+        # A chunk still being appended by another process is skipped
+        while offset + CHUNK_HEADER.size <= len(buffer):
+            magic, meta_len, data_len = CHUNK_HEADER.unpack_from(buffer, offset)
+            if magic != MAGIC:
+                raise ReadingsStoreError(f"Corrupt readings log at byte {offset}")
+            start = offset + CHUNK_HEADER.size
+            end = start + meta_len + data_len
+            if end > len(buffer):
+                break
+            meta = json.loads(bytes(buffer[start:start + meta_len]))
+            position = start + meta_len
+            for asset, parameter, count in meta["series"]:
+                ts = np.frombuffer(buffer, dtype="<i8", count=count, offset=position)
+                values = np.frombuffer(buffer, dtype="<f8", count=count, offset=position + 8 * count)
+                position += 16 * count
+                yield asset, parameter, ts, values
+            offset = end
+
+    def plant_ids(self) -> list[int]:
+        """Plants that have a readings log, in id order."""
+        if not self.directory.is_dir():
+            return []
+        return sorted(int(d.name) for d in self.directory.iterdir()
+                      if d.name.isdigit() and (d / LOG_NAME).is_file())
+
+    def delete(self, plant_id: int) -> None:
+        self.path_for(plant_id).unlink(missing_ok=True)
+
+
+store = ReadingsStore()
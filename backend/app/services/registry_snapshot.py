@@ -0,0 +1,265 @@
+"""
+Compact binary snapshot of the parameter registry.
+
+Build it next to the JSON registry:
+
+    cd backend
+    python -m app.services.registry_snapshot
+
+The snapshot is column-oriented and memory-mapped at startup, so opening
+it costs no parsing and every worker process shares the same page cache.
+Layout (little-endian, each section 8-byte aligned):
+
+- header: magic, format version, counts, and the size, mtime and sha256
+  of the JSON file it was built from (a stale snapshot is ignored)
+- string table: u64 offsets + UTF-8 blob; every distinct string once
+- string columns: u32 string ids for name, display_name, unit, category,
+  section (one row per column)
+- asset types: u32 string ids, then a CSR list per parameter (u32
+  offsets + u32 asset-type ids) that keeps each parameter's own order
+- rows per asset type: the inverse CSR (u32 offsets per type + u32 row
+  indices, ascending)
+- asset-type bitmaps: an n-bit row of u64 words for every type that
+  applies to at least 1 / BITMAP_MIN_SHARE of the parameters (where the
+  bitmap is no bigger than the row list), and an i32 per type giving its
+  bitmap row or -1
+Filtering by asset types ORs the requested types' bitmaps and row lists
+only, so it costs the same at any number of asset types, and the file
+stays linear in the registry size.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from app.metrics import timed
+
+MAGIC = b"PRMSNAP1"
+FORMAT_VERSION = 2
+HEADER = struct.Struct("<8sIIIIIIQQ32s")
+STRING_FIELDS = ("name", "display_name", "unit", "category", "section")
+BITMAP_MIN_SHARE = 32  # a bitmap (n / 8 bytes) beats a u32 row list above n / 32 rows
+
+
+class SnapshotError(ValueError):
+    """Raised when a snapshot file is malformed or from another format version."""
+
+
+def snapshot_path_for(registry_path: Path) -> Path:
+    return registry_path.with_suffix(".snapshot")
+
+
+def _source_stamp(registry_path: Path) -> tuple[int, int]:
+    st = registry_path.stat()
+    return st.st_mtime_ns, st.st_size
+
+
+def _pad(buf: bytearray) -> None:
+    buf.extend(b"\0" * (-len(buf) % 8))
+
+
+def encode_snapshot(parameters: list[dict], source: bytes = b"", stamp: tuple[int, int] = (0, 0)) -> bytes:
+    """Serialize registry parameters into the snapshot format."""
+    strings: dict[str, int] = {}
+
+    def intern(s: str) -> int:
+        sid = strings.get(s)
+        if sid is None:
+            sid = strings[s] = len(strings)
+        return sid
+
+    n = len(parameters)
+    columns = np.array(
+        [[intern(p.get(field, "")) for p in parameters] for field in STRING_FIELDS], dtype="<u4",
+    ).reshape(len(STRING_FIELDS), n)
+    type_ids: dict[str, int] = {}
+    offsets = [0]
+    memberships: list[int] = []
+    for p in parameters:
+        for at in p.get("applicable_asset_types", []):
+            memberships.append(type_ids.setdefault(at, len(type_ids)))
+        offsets.append(len(memberships))
+    type_offsets = np.array(offsets, dtype="<u4")
+    type_strings = np.array([intern(t) for t in type_ids], dtype="<u4")
+    membership_ids = np.array(memberships, dtype="<u4")
+
+    # Inverse CSR: for each asset type, its parameter rows in ascending order
+    rows = np.repeat(np.arange(n, dtype="<u4"), np.diff(type_offsets))
+    type_rows = rows[np.argsort(membership_ids, kind="stable")]
+    counts = np.bincount(membership_ids, minlength=len(type_ids))
+    type_row_offsets = np.zeros(len(type_ids) + 1, dtype="<u4")
+    np.cumsum(counts, out=type_row_offsets[1:])
+
+    words = (n + 63) // 64
+    dense = np.flatnonzero(counts * BITMAP_MIN_SHARE >= max(n, 1))
+    bitmap_of_type = np.full(len(type_ids), -1, dtype="<i4")
+    bitmap_of_type[dense] = np.arange(len(dense))
+    bitmaps = np.zeros((len(dense), words), dtype="<u8")
+    for k, t in enumerate(dense.tolist()):
+        members = type_rows[type_row_offsets[t]:type_row_offsets[t + 1]].astype("<u8")
+        np.bitwise_or.at(bitmaps[k], members >> np.uint64(6), np.uint64(1) << (members & np.uint64(63)))
+
+    encoded = [s.encode("utf-8") for s in strings]
+    string_offsets = np.zeros(len(encoded) + 1, dtype="<u8")
+    np.cumsum([len(b) for b in encoded], out=string_offsets[1:])
+
+    buf = bytearray(HEADER.pack(
+        MAGIC, FORMAT_VERSION, n, len(encoded), len(type_ids), len(dense), len(memberships),
+        stamp[0], stamp[1], hashlib.sha256(source).digest(),
+    ))
+    for part in (string_offsets.tobytes(), b"".join(encoded), columns.tobytes(), type_strings.tobytes(),
+                 type_offsets.tobytes(), membership_ids.tobytes(), type_row_offsets.tobytes(),
+                 type_rows.tobytes(), bitmap_of_type.tobytes(), bitmaps.tobytes()):
+        _pad(buf)
+        buf.extend(part)
+    return bytes(buf)
+
+
+def build_snapshot(registry_path: Path, snapshot_path: Path | None = None) -> Path:
+    """Build (atomically replace) the snapshot for a JSON registry file."""
+    snapshot_path = snapshot_path or snapshot_path_for(registry_path)
+    with timed("registry_snapshot_build"):
+        stamp = _source_stamp(registry_path)
+        raw = registry_path.read_bytes()
+        data = encode_snapshot(json.loads(raw), raw, stamp)
+        tmp = snapshot_path.with_name(f".{snapshot_path.name}.{os.getpid()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, snapshot_path)
+    return snapshot_path
+
+
+class RegistrySnapshot:
+    """
+    Read-only view over a memory-mapped snapshot.
+    Columns are NumPy views on the mapping (no copies); parameter dicts are
+    materialized only for the rows a caller asks for.
+    """
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+        if len(buffer) < HEADER.size:
+            raise SnapshotError("Snapshot is truncated")
+        (magic, fmt, n, n_strings, n_types, n_bitmaps, n_members,
+         mtime_ns, size, digest) = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC or fmt != FORMAT_VERSION:
+            raise SnapshotError("Not a registry snapshot of this format version")
+        self.source_stamp = (mtime_ns, size)
+        self.digest = digest.hex()  # sha256 of the JSON it was built from
+        self.size = n
+
+        offset = HEADER.size
+
+        def section(dtype: str, count: int) -> np.ndarray:
+            nonlocal offset
+            offset += -offset % 8
+            array = np.frombuffer(buffer, dtype=dtype, count=count, offset=offset)
+            offset += array.nbytes
+            return array
+
+        self._string_offsets = section("<u8", n_strings + 1)
+        self._blob = section("u1", int(self._string_offsets[-1]))
+        self._columns = section("<u4", len(STRING_FIELDS) * n).reshape(len(STRING_FIELDS), n)
+        self._type_strings = section("<u4", n_types)
+        self._type_offsets = section("<u4", n + 1)
+        self._type_ids = section("<u4", n_members)
+        self._type_row_offsets = section("<u4", n_types + 1)
+        self._type_rows = section("<u4", n_members)
+        self._bitmap_of_type = section("<i4", n_types)
+        words = (n + 63) // 64
+        self._bitmaps = section("<u8", n_bitmaps * words).reshape(n_bitmaps, words)
+        self._strings: list[str | None] = [None] * n_strings
+        self._records: list[dict | None] = [None] * n  # rows materialized so far
+        self.asset_types = [self.string(int(s)) for s in self._type_strings]
+        self._type_index = {t: i for i, t in enumerate(self.asset_types)}
+
+    @classmethod
+    def open(cls, path: Path) -> "RegistrySnapshot":
+        with open(path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(buffer)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def string(self, sid: int) -> str:
+        s = self._strings[sid]
+        if s is None:
+            start, end = self._string_offsets[sid], self._string_offsets[sid + 1]
+            s = self._strings[sid] = self._blob[start:end].tobytes().decode("utf-8")
+        return s
+
+    def records(self, indices=None) -> list[dict]:
+        """
+        Parameters (all, or the given row indices) as registry dicts.
+        Each row is materialized once and then shared, so treat it as read-only.
+        """
+        rows = list(range(self.size)) if indices is None else [int(i) for i in indices]
+        cache = self._records
+        missing = [i for i in rows if cache[i] is None]
+        if missing:
+            for i, record in zip(missing, self._materialize(np.asarray(missing, dtype=np.intp))):
+                cache[i] = record
+        return [cache[i] for i in rows]
+
+    def _materialize(self, rows: np.ndarray) -> list[dict]:
+        columns = self._columns[:, rows].tolist()
+        starts = self._type_offsets[rows]
+        lengths = (self._type_offsets[rows + 1] - starts).tolist()
+        # Gather every selected row's asset-type ids in one vectorized take
+        total = sum(lengths)
+        flat = np.repeat(starts.astype(np.intp) - np.cumsum([0] + lengths[:-1]), lengths) + np.arange(total)
+        type_names = [self.asset_types[t] for t in self._type_ids[flat].tolist()]
+
+        string = self.string
+        out = []
+        pos = 0
+        for i, length in enumerate(lengths):
+            record = {field: string(columns[f][i]) for f, field in enumerate(STRING_FIELDS)}
+            record["applicable_asset_types"] = type_names[pos:pos + length]
+            pos += length
+            out.append(record)
+        return out
+
+    def select_asset_types(self, asset_types: list[str]) -> np.ndarray:
+        """Indices (registry order) of parameters applicable to any of the asset types."""
+        wanted = sorted({self._type_index[t] for t in asset_types if t in self._type_index})
+        if not wanted:
+            return np.empty(0, dtype=np.intp)
+        offsets, bitmap_of_type = self._type_row_offsets, self._bitmap_of_type
+        lists = [self._type_rows[offsets[t]:offsets[t + 1]] for t in wanted if bitmap_of_type[t] < 0]
+        bitmaps = [self._bitmaps[bitmap_of_type[t]] for t in wanted if bitmap_of_type[t] >= 0]
+        if not bitmaps:
+            # Only rare types: merging their row lists beats touching n bits
+            return np.unique(np.concatenate(lists)).astype(np.intp)
+        hits = np.bitwise_or.reduce(bitmaps) if len(bitmaps) > 1 else bitmaps[0].copy()
+        if lists:
+            rows = np.concatenate(lists).astype("<u8")
+            np.bitwise_or.at(hits, rows >> np.uint64(6), np.uint64(1) << (rows & np.uint64(63)))
+        bits = np.unpackbits(hits.view("u1"), bitorder="little")[:self.size]
+        return np.flatnonzero(bits)
+
+
+def load_fresh(registry_path: Path, snapshot_path: Path | None = None) -> RegistrySnapshot | None:
+    """Open the snapshot if it exists and was built from the current JSON file."""
+    snapshot_path = snapshot_path or snapshot_path_for(registry_path)
+    try:
+        snapshot = RegistrySnapshot.open(snapshot_path)
+    except (FileNotFoundError, ValueError, SnapshotError):
+        return None
+    if snapshot.source_stamp != _source_stamp(registry_path):
+        return None
+    return snapshot
+
+
+if __name__ == "__main__":
+    from app.services.parameter_service import REGISTRY_PATH
+
+    source = Path(sys.argv[1]) if len(sys.argv) > 1 else REGISTRY_PATH
+    path = build_snapshot(source)
+    print(f"[OK] Registry snapshot written: {path} ({path.stat().st_size:,} bytes)")
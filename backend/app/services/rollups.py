@@ -0,0 +1,241 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from app.metrics import timed
+from app.services.onboarding_store import POOL_SIZE, SQLiteStore
+from app.services.readings_store import READINGS_DIR, ReadingsStore, Series
+
+# Downsampled aggregates of stored readings, kept per tier (hour, day) for
+# every plant, parameter and asset as count/sum/min/max per bucket.
+# Rollups are merged incrementally at ingest: each flushed chunk is
+# aggregated per bucket with NumPy and merged in one transaction, so
+# dashboards read months of data without scanning the raw readings log.
+#
+# Buckets are stored densely, PARTITION_BUCKETS to a row, as one float64
+# array of shape (4, PARTITION_BUCKETS): count, sum, min, max (an empty
+# bucket has count 0). A year of hourly data for one parameter is ~35
+# rows, read with a primary-key range scan and np.frombuffer. Plant-wide
+# buckets (all assets merged) are kept in their own table, so the common
+# dashboard query needs no merging at read time. count/sum/min/max merge
+# exactly, and merges run under BEGIN IMMEDIATE, so concurrent workers
+# and late readings need no other coordination.
+#
+# Rollups are merged after the chunk is appended to the readings log, so a
+# crash in between leaves them short of the log. Rebuild them from the log
+# (all plants, or the ids given) while no ingestion is running:
+#
+#     cd backend
+#     python -m app.services.rollups [plant_id ...]
+
+TIERS = {"hour": 3_600_000, "day": 86_400_000}  # bucket width in ms
+PARTITION_BUCKETS = 256
+ROLLUPS_PATH = READINGS_DIR / "rollups.db"
+AGGREGATES = ("count", "sum", "min", "max", "avg")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS asset_rollups (
+    plant_id INTEGER NOT NULL,
+    tier TEXT NOT NULL,
+    parameter TEXT NOT NULL,
+    asset TEXT NOT NULL,
+    partition INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (plant_id, tier, parameter, asset, partition)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS plant_rollups (
+    plant_id INTEGER NOT NULL,
+    tier TEXT NOT NULL,
+    parameter TEXT NOT NULL,
+    partition INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (plant_id, tier, parameter, partition)
+) WITHOUT ROWID;
+"""
+
+# Key columns before `partition`; asset None selects the plant-wide table
+KEY_COLUMNS = {False: "plant_id, tier, parameter, asset", True: "plant_id, tier, parameter"}
+
+
+def bucket_aggregates(timestamps: np.ndarray, values: np.ndarray, width: int) -> tuple[np.ndarray, ...]:
+    """
+    Aggregate readings into buckets of `width` ms.
+    Returns (bucket_starts, count, sum, min, max), ordered by bucket.
+    """
+    buckets = timestamps // width * width
+    if len(buckets) > 1 and (np.diff(buckets) < 0).any():
+        order = np.argsort(buckets, kind="stable")
+        buckets, values = buckets[order], values[order]
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    counts = np.diff(np.r_[starts, len(buckets)])
+    return (
+        buckets[starts],
+        counts,
+        np.add.reduceat(values, starts),
+        np.minimum.reduceat(values, starts),
+        np.maximum.reduceat(values, starts),
+    )
+
+
+def empty_partition() -> np.ndarray:
+    block = np.zeros((4, PARTITION_BUCKETS))
+    block[2] = np.inf
+    block[3] = -np.inf
+    return block
+
+
+def merge_partition(into: np.ndarray, other: np.ndarray) -> np.ndarray:
+    """Merge the buckets of `other` into `into` in place."""
+    into[:2] += other[:2]
+    np.minimum(into[2], other[2], out=into[2])
+    np.maximum(into[3], other[3], out=into[3])
+    return into
+
+
+def partition_blocks(timestamps: np.ndarray, values: np.ndarray, width: int) -> dict[int, np.ndarray]:
+    """Aggregate readings into dense partition blocks, keyed by partition number."""
+    buckets, counts, sums, mins, maxs = bucket_aggregates(timestamps, values, width)
+    index = buckets // width
+    partitions = index // PARTITION_BUCKETS
+    slots = index % PARTITION_BUCKETS
+    blocks = {}
+    for partition in np.unique(partitions).tolist():
+        mask = partitions == partition
+        block = blocks[partition] = empty_partition()
+        columns = slots[mask]
+        block[0, columns] = counts[mask]
+        block[1, columns] = sums[mask]
+        block[2, columns] = mins[mask]
+        block[3, columns] = maxs[mask]
+    return blocks
+
+
+class RollupStore(SQLiteStore):
+    """Hour and day rollups of every plant's readings."""
+
+    schema = SCHEMA
+
+    def __init__(self, path: Path = ROLLUPS_PATH, pool_size: int = POOL_SIZE):
+        super().__init__(path, pool_size)
+
+    def add(self, plant_id: int, series: list[Series]) -> int:
+        """Merge a chunk of readings into every tier. Returns the partition rows written."""
+        # (plant_id, tier, parameter[, asset]) + (partition,) -> block
+        updates: dict[tuple, np.ndarray] = {}
+        with timed("rollups_aggregate"):
+            for asset, parameter, timestamps, values in series:
+                if not len(timestamps):
+                    continue
+                timestamps = np.asarray(timestamps)
+                values = np.asarray(values, dtype=float)
+                for tier, width in TIERS.items():
+                    for partition, block in partition_blocks(timestamps, values, width).items():
+                        for key in ((plant_id, tier, parameter, asset, partition),
+                                    (plant_id, tier, parameter, partition)):
+                            if key in updates:
+                                merge_partition(updates[key], block)
+                            else:
+                                updates[key] = block.copy()
+        if updates:
+            with timed("rollups_write"), self._transaction() as conn:
+                for key, block in updates.items():
+                    self._merge(conn, key, block)
+        return len(updates)
+
+    @staticmethod
+    def _merge(conn, key: tuple, block: np.ndarray) -> None:
+        plant_wide = len(key) == 4
+        table = "plant_rollups" if plant_wide else "asset_rollups"
+        columns = KEY_COLUMNS[plant_wide]
+        where = " AND ".join(f"{c} = ?" for c in columns.split(", ")) + " AND partition = ?"
+        row = conn.execute(f"SELECT data FROM {table} WHERE {where}", key).fetchone()
+        if row is not None:
+            merge_partition(block, np.frombuffer(row[0]).reshape(4, PARTITION_BUCKETS))
+        conn.execute(
+            f"INSERT OR REPLACE INTO {table} ({columns}, partition, data) VALUES ({', '.join('?' * len(key))}, ?)",
+            (*key, block.tobytes()),
+        )
+
+    def query(
+        self,
+        plant_id: int,
+        tier: str,
+        parameters: list[str],
+        asset: str | None = None,
+        start: int | None = None,
+        end: int | None = None,
+        aggregates: tuple[str, ...] = AGGREGATES,
+    ) -> list[dict]:
+        """
+        Aggregates per parameter and bucket in [start, end) (epoch ms).
+        With asset None, the plant-wide buckets (all assets merged).
+        Returns one columnar dict per parameter with readings:
+        {parameter, timestamps, <aggregate>: [...] for each of `aggregates`}.
+        """
+        width = TIERS[tier]
+        span = width * PARTITION_BUCKETS
+        low = -2**62 if start is None else start // width * width
+        high = 2**62 if end is None else end
+        plant_wide = asset is None
+        table = "plant_rollups" if plant_wide else "asset_rollups"
+        where = " AND ".join(f"{c} = ?" for c in KEY_COLUMNS[plant_wide].split(", "))
+        sql = (f"SELECT partition, data FROM {table} WHERE {where}"
+               " AND partition >= ? AND partition <= ? ORDER BY partition")
+
+        result = []
+        with timed("rollups_query"), self._connection() as conn:
+            for parameter in parameters:
+                key = (plant_id, tier, parameter) + (() if plant_wide else (asset,))
+                rows = conn.execute(sql, (*key, low // span, (high - 1) // span)).fetchall()
+                if not rows:
+                    continue
+                blocks = np.hstack([np.frombuffer(data).reshape(4, PARTITION_BUCKETS) for _, data in rows])
+                timestamps = np.concatenate([
+                    (partition * PARTITION_BUCKETS + np.arange(PARTITION_BUCKETS)) * width
+                    for partition, _ in rows
+                ])
+                keep = (blocks[0] > 0) & (timestamps >= low) & (timestamps < high)
+                if not keep.any():
+                    continue
+                counts, sums, mins, maxs = blocks[:, keep]
+                columns = {"count": counts.astype(np.int64), "sum": sums, "min": mins, "max": maxs,
+                           "avg": sums / counts}
+                result.append({
+                    "parameter": parameter,
+                    "timestamps": timestamps[keep].tolist(),
+                    **{name: columns[name].tolist() for name in aggregates},
+                })
+        return result
+
+    def rebuild(self, plant_id: int, readings: ReadingsStore) -> int:
+        """
+        Recompute a plant's rollups from its readings log. Returns the
+        readings scanned. Readings ingested during the rebuild may be
+        counted twice; run it while the plant's ingestion is stopped.
+        """
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM asset_rollups WHERE plant_id = ?", (plant_id,))
+            conn.execute("DELETE FROM plant_rollups WHERE plant_id = ?", (plant_id,))
+        scanned = 0
+        batch: list[Series] = []
+        for series in readings.scan(plant_id):
+            batch.append(series)
+            scanned += len(series[2])
+            if len(batch) >= 1000:
+                self.add(plant_id, batch)
+                batch = []
+        self.add(plant_id, batch)
+        return scanned
+
+
+store = RollupStore()
+
+
+if __name__ == "__main__":
+    from app.services.readings_store import store as readings_store
+
+    plant_ids = [int(arg) for arg in sys.argv[1:]] or readings_store.plant_ids()
+    for plant_id in plant_ids:
+        scanned = store.rebuild(plant_id, readings_store)
+        print(f"[OK] Plant {plant_id}: rollups rebuilt from {scanned:,} readings")
@@ -0,0 +1,504 @@
+import hashlib
+import json
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import anyio
+import anyio.to_thread
+
+try:
+    import fcntl
+except ImportError:  # Windows: patches are serialized within one process only
+    fcntl = None
+
+from app.metrics import REGISTRY, Counter, timed
+from app.services.file_utils import write_atomic
+from app.services.json_patch import PatchError, apply_patch, patch_format
+
+TEMPLATES_DIR = Path(__file__).parent.parent / "data" / "templates"
+INDEX_NAME = "_index.json"
+INDEX_LOCK_NAME = ".index.lock"
+HISTORY_DIR = "_history"
+HISTORY_KEEP = 100  # deltas kept per template; older clients reload in full
+TEMPLATE_ID_RE = re.compile(r"^[a-z0-9_]+$")
+IO_CONCURRENCY = 16
+CACHE_MAX_ENTRIES = 128
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+template_cache_events = REGISTRY.register(Counter(
+    "template_cache_events_total", "Parsed-template cache hits, misses and evictions.", ("event",),
+))
+
+
+def make_template_id(name: str) -> str:
+    """
+    Slugify a template name into its file id, by the rule TEMPLATE_ID_RE
+    enforces: accents are stripped ("Café" -> "cafe"), other characters
+    outside [a-z0-9_] dropped. May return "" (see TemplateStore.save).
+    """
+    ascii_name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii")
+    template_id = ascii_name.lower().replace(" ", "_").replace("-", "_")
+    return re.sub(r"[^a-z0-9_]", "", template_id)
+
+
+class TemplateVersionMismatch(ValueError):
+    """Raised when a template changed since the version a patch was based on."""
+
+
+class TemplateHistoryUnavailable(LookupError):
+    """Raised when the requested version is older than the kept deltas."""
+
+
+def _dump(data: dict) -> str:
+    # Compact separators keep json on its C encoder (indent forces the
+    # pure-Python one), which matters for multi-megabyte configs
+    return json.dumps(data, separators=(",", ":"))
+
+
+class TemplateCache:
+    """
+    LRU of parsed templates keyed by id and file version (mtime + size),
+    bounded by entry count and by total file size. Cached dicts are shared
+    between requests and must be treated as read-only.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, max_bytes: int = CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, tuple[str, int, dict]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hit": 0, "miss": 0, "eviction": 0}
+
+    def _count(self, event: str) -> None:
+        self.stats[event] += 1
+        template_cache_events.inc(event)
+
+    def get(self, template_id: str, version: str) -> dict | None:
+        with self._lock:
+            entry = self._entries.get(template_id)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(template_id)
+                self._count("hit")
+                return entry[2]
+            self._count("miss")
+            return None
+
+    def put(self, template_id: str, version: str, size: int, data: dict) -> None:
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._pop(template_id)
+            self._entries[template_id] = (version, size, data)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._count("eviction")
+
+    def _pop(self, template_id: str) -> None:
+        entry = self._entries.pop(template_id, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def invalidate(self, template_id: str) -> None:
+        with self._lock:
+            self._pop(template_id)
+
+
+class TemplateStore:
+    """
+    Template files plus a compact metadata index (`_index.json`).
+    - Listing and search read only the index, never the template configs
+    - The index is rewritten on save/delete and reloaded when its mtime/size changes
+    - A missing index is rebuilt once from the template files
+    - Patches bump an integer `version` and append a compact delta to
+      `_history/<id>.jsonl`, so clients can fetch only what changed
+    """
+
+    def __init__(self, directory: Path = TEMPLATES_DIR):
+        self.directory = directory
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.index_path = directory / INDEX_NAME
+        self.history_dir = directory / HISTORY_DIR
+        self._lock = threading.Lock()
+        self._stamp: tuple[int, int] | None = None
+        self._index: dict[str, dict] = {}
+        self.digest = ""  # content hash of the index, changes on every save/delete
+        self.cache = TemplateCache()
+        self._patch_locks: dict[str, threading.Lock] = {}
+
+    def path_for(self, template_id: str) -> Path | None:
+        """File path for an id, or None if the id is not a valid slug."""
+        if not TEMPLATE_ID_RE.match(template_id):
+            return None
+        return self.directory / f"{template_id}.json"
+
+    # --- Index ---
+
+    def template_files(self) -> list[Path]:
+        return [f for f in self.directory.glob("*.json") if f.name != INDEX_NAME]
+
+    def read_entry(self, path: Path) -> dict | None:
+        """Index entry for one template file, or None if it is unreadable."""
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        return self._entry(path.stem, data)
+
+    def install_index(self, entries: list[dict]) -> None:
+        with self._index_lock():
+            self._write_index({e["id"]: e for e in entries})
+
+    def _scan(self) -> list[dict]:
+        with timed("template_index_rebuild"):
+            entries = [self.read_entry(f) for f in self.template_files()]
+        return [e for e in entries if e is not None]
+
+    def rebuild(self) -> None:
+        """Rebuild the index by scanning every template file."""
+        self.install_index(self._scan())
+
+    @contextmanager
+    def _index_lock(self):
+        """
+        Serialize index writers across threads and, with several worker
+        processes, across processes (flock on a lock file next to the index).
+        """
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.directory / INDEX_LOCK_NAME, "w") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _entry(template_id: str, data: dict) -> dict:
+        return {
+            "id": template_id,
+            "name": data.get("name", template_id),
+            "description": data.get("description", ""),
+            "created_at": data.get("created_at", ""),
+            "version": data.get("version", 0),
+        }
+
+    def _write_index(self, index: dict[str, dict]) -> None:
+        text = json.dumps(list(index.values()))
+        write_atomic(self.index_path, text)
+        self._index = index
+        self.digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        self._stamp = self._index_stamp()
+
+    def _index_stamp(self) -> tuple[int, int]:
+        st = self.index_path.stat()
+        return st.st_mtime_ns, st.st_size
+
+    def _refresh(self) -> None:
+        try:
+            stamp = self._index_stamp()
+        except FileNotFoundError:
+            self.rebuild()
+            return
+        if stamp == self._stamp:
+            return
+        with self._lock:
+            self._load_index(stamp)
+
+    def _load_index(self, stamp: tuple[int, int]) -> None:
+        raw = self.index_path.read_bytes()
+        self._index = {e["id"]: e for e in json.loads(raw)}
+        self.digest = hashlib.sha256(raw).hexdigest()
+        self._stamp = stamp
+
+    # --- Queries ---
+
+    def list(self, query: str = "", offset: int = 0, limit: int | None = None) -> tuple[list[dict], int]:
+        """
+        List template metadata, newest first, optionally filtered by a
+        case-insensitive substring of name or description.
+        Returns (page, total_matching).
+        """
+        self._refresh()
+        entries = list(self._index.values())
+        if query:
+            q = query.lower()
+            entries = [
+                e for e in entries
+                if q in e["name"].lower() or q in e["description"].lower()
+            ]
+        entries.sort(key=lambda e: e["created_at"], reverse=True)
+        end = None if limit is None else offset + limit
+        return entries[offset:end], len(entries)
+
+    def index_digest(self) -> str:
+        """Content hash of the current index; use as a version for listings."""
+        self._refresh()
+        return self.digest
+
+    def file_version(self, template_id: str) -> str | None:
+        """Cheap version of one template file (mtime + size), without reading it."""
+        path = self.path_for(template_id)
+        if path is None:
+            return None
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return None
+        return f"{st.st_mtime_ns}-{st.st_size}"
+
+    def get(self, template_id: str) -> dict | None:
+        """
+        Load the full template, including its config.
+        Served from the parsed-template cache while the file is unchanged.
+        """
+        path = self.path_for(template_id)
+        if path is None:
+            return None
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return None
+        version = f"{st.st_mtime_ns}-{st.st_size}"
+        data = self.cache.get(template_id, version)
+        if data is not None:
+            return data
+
+        with timed("template_read"):
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+            except FileNotFoundError:
+                return None
+        self.cache.put(template_id, version, st.st_size, data)
+        return data
+
+    def changes_since(self, template_id: str, since: int) -> dict | None:
+        """
+        Deltas applied after version `since`, oldest first, or None if the
+        template does not exist. Raises TemplateHistoryUnavailable when
+        `since` predates the kept history.
+        """
+        data = self.get(template_id)
+        if data is None:
+            return None
+        version = data.get("version", 0)
+        changes = []
+        if since < version:
+            path = self.history_dir / f"{template_id}.jsonl"
+            try:
+                lines = path.read_text(encoding="utf-8").splitlines()
+            except FileNotFoundError:
+                lines = []
+            changes = [c for c in map(json.loads, lines) if c["version"] > since]
+            if not changes or changes[0]["version"] != since + 1:
+                raise TemplateHistoryUnavailable(f"No history for {template_id} since version {since}")
+        return {"id": template_id, "version": version, "since": since, "changes": changes}
+
+    # --- Mutations ---
+
+    def _set_index_entry(self, template_id: str, entry: dict | None) -> None:
+        # Re-read under the lock: another worker may have just written the index
+        with self._index_lock():
+            try:
+                stamp = self._index_stamp()
+            except FileNotFoundError:
+                self._index = {e["id"]: e for e in self._scan()}
+            else:
+                if stamp != self._stamp:
+                    self._load_index(stamp)
+            index = dict(self._index)
+            if entry is None:
+                index.pop(template_id, None)
+            else:
+                index[template_id] = entry
+            self._write_index(index)
+
+    @contextmanager
+    def _patch_lock(self, template_id: str):
+        """
+        Serialize writers of one template across threads and, with several
+        worker processes, across processes (flock on a per-template file).
+        """
+        with self._lock:
+            lock = self._patch_locks.setdefault(template_id, threading.Lock())
+        with lock:
+            if fcntl is None:
+                yield
+                return
+            self.history_dir.mkdir(exist_ok=True)
+            with open(self.history_dir / f"{template_id}.lock", "w") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def save(self, name: str, description: str, config: dict) -> str:
+        """
+        Write a template and its index entry. Returns the template id.
+        Overwriting bumps the version and starts a new delta history.
+        Raises ValueError if nothing of the name is left for an id.
+        """
+        template_id = make_template_id(name)
+        if not template_id:
+            raise ValueError("Template name must contain a letter or digit")
+        # Read the previous version under the lock, from the file rather than
+        # the index, so a concurrent patch or save cannot lose its bump
+        with self._patch_lock(template_id):
+            try:
+                previous = self.get(template_id) or {}
+            except ValueError:
+                previous = {}  # an unreadable file is simply replaced
+            data = {
+                "name": name,
+                "description": description,
+                "config": config,
+                "created_at": datetime.utcnow().isoformat(),
+                "version": previous.get("version", 0) + 1,
+            }
+            with timed("template_write"):
+                write_atomic(self.directory / f"{template_id}.json", _dump(data))
+            self.cache.invalidate(template_id)
+            (self.history_dir / f"{template_id}.jsonl").unlink(missing_ok=True)
+            self._set_index_entry(template_id, self._entry(template_id, data))
+        return template_id
+
+    def patch(self, template_id: str, patch, media_type: str = "", expected_version: str | None = None) -> dict | None:
+        """
+        Apply a JSON Patch or merge patch to a template's config.
+        - `expected_version` (a file_version) guards against lost updates
+        - The delta is appended to the template's history
+        Returns {"id", "version"}, or None if the template does not exist.
+        """
+        with self._patch_lock(template_id):
+            data = self.get(template_id)
+            if data is None:
+                return None
+            if expected_version is not None and self.file_version(template_id) != expected_version:
+                raise TemplateVersionMismatch(f"Template {template_id} has changed")
+
+            config = apply_patch(data.get("config", {}), patch, media_type)
+            if not isinstance(config, dict):
+                raise PatchError("The patched config must be an object")
+            version = data.get("version", 0) + 1
+            updated = {**data, "config": config, "version": version,
+                       "updated_at": datetime.utcnow().isoformat()}
+
+            path = self.directory / f"{template_id}.json"
+            with timed("template_write"):
+                text = _dump(updated)
+                write_atomic(path, text)
+            st = path.stat()
+            self.cache.put(template_id, f"{st.st_mtime_ns}-{st.st_size}", st.st_size, updated)
+            self._append_delta(template_id, {
+                "version": version,
+                "format": patch_format(patch, media_type),
+                "patch": patch,
+                "at": updated["updated_at"],
+            })
+            self._set_index_entry(template_id, self._entry(template_id, updated))
+        return {"id": template_id, "version": version}
+
+    def _append_delta(self, template_id: str, delta: dict) -> None:
+        self.history_dir.mkdir(exist_ok=True)
+        path = self.history_dir / f"{template_id}.jsonl"
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(_dump(delta) + "\n")
+        if delta["version"] % HISTORY_KEEP == 0:
+            # Trim occasionally, so history stays between 1x and 2x HISTORY_KEEP
+            lines = path.read_text(encoding="utf-8").splitlines(keepends=True)
+            write_atomic(path, "".join(lines[-HISTORY_KEEP:]))
+
+    def delete(self, template_id: str) -> bool:
+        """Delete a template and its index entry. Returns False if missing."""
+        path = self.path_for(template_id)
+        if path is None:
+            return False
+        with self._patch_lock(template_id):
+            if not path.exists():
+                return False
+            with timed("template_delete"):
+                path.unlink()
+                (self.history_dir / f"{template_id}.jsonl").unlink(missing_ok=True)
+            self.cache.invalidate(template_id)
+            self._set_index_entry(template_id, None)
+        return True
+
+
+class AsyncTemplateStore:
+    """
+    Non-blocking facade over TemplateStore for async handlers.
+    Disk I/O runs in worker threads capped by a shared limiter, so a burst
+    of template requests cannot take over the whole threadpool; an index
+    rebuild reads the template files in parallel.
+    """
+
+    def __init__(self, store: TemplateStore, concurrency: int = IO_CONCURRENCY):
+        self.store = store
+        self._limiter: anyio.CapacityLimiter | None = None
+        self._concurrency = concurrency
+
+    async def _run(self, fn, *args):
+        if self._limiter is None:
+            # Created lazily: a limiter must be made inside a running event loop
+            self._limiter = anyio.CapacityLimiter(self._concurrency)
+        return await anyio.to_thread.run_sync(fn, *args, limiter=self._limiter)
+
+    async def _ensure_index(self) -> None:
+        # Build a missing index with the parallel reader, not the sync fallback
+        if not await self._run(self.store.index_path.exists):
+            await self.rebuild()
+
+    async def list(self, query: str = "", offset: int = 0, limit: int | None = None) -> tuple[list[dict], int]:
+        await self._ensure_index()
+        return await self._run(self.store.list, query, offset, limit)
+
+    async def index_digest(self) -> str:
+        await self._ensure_index()
+        return await self._run(self.store.index_digest)
+
+    async def file_version(self, template_id: str) -> str | None:
+        return await self._run(self.store.file_version, template_id)
+
+    async def get(self, template_id: str) -> dict | None:
+        return await self._run(self.store.get, template_id)
+
+    async def save(self, name: str, description: str, config: dict) -> str:
+        return await self._run(self.store.save, name, description, config)
+
+    async def patch(self, template_id: str, patch, media_type: str = "",
+                    expected_version: str | None = None) -> dict | None:
+        return await self._run(self.store.patch, template_id, patch, media_type, expected_version)
+
+    async def changes_since(self, template_id: str, since: int) -> dict | None:
+        return await self._run(self.store.changes_since, template_id, since)
+
+    async def delete(self, template_id: str) -> bool:
+        return await self._run(self.store.delete, template_id)
+
+    async def rebuild(self) -> None:
+        """Rebuild the index, reading template files concurrently."""
+        files = await self._run(self.store.template_files)
+        entries: list[dict | None] = [None] * len(files)
+
+        async def read(i: int, path: Path) -> None:
+            entries[i] = await self._run(self.store.read_entry, path)
+
+        with timed("template_index_rebuild"):
+            async with anyio.create_task_group() as tg:
+                for i, path in enumerate(files):
+                    tg.start_soon(read, i, path)
+        await self._run(self.store.install_index, [e for e in entries if e is not None])
+
+
+store = TemplateStore()
+async_store = AsyncTemplateStore(store)
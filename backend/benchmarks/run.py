@@ -0,0 +1,286 @@
+"""
+Benchmark suite for service functions and API endpoints.
+
+Generates synthetic registries, formulas, descriptions and CSVs at each
+scale, measures service calls directly and HTTP calls in-process through
+the FastAPI app, and reports throughput, p50/p99 latency and peak memory.
+Results can be saved as a baseline; later runs compare against it and
+exit non-zero on regressions. --compare without a saved baseline saves
+one instead, so the first run on a machine passes.
+
+Usage:
+    cd backend
+    python -m benchmarks.run                          # scales 100,1000,10000
+    python -m benchmarks.run --scales 100,1000000
+    python -m benchmarks.run --save-baseline
+    python -m benchmarks.run --compare --tolerance 0.25
+
+In-process HTTP benchmarks need httpx (pip install httpx).
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+
+from benchmarks import synthetic
+
+BASELINE_PATH = Path(__file__).parent / "baseline.json"
+TIME_BUDGET_S = 0.5
+MAX_ITERATIONS = 1000
+MIN_ITERATIONS = 5
+
+
+# ── Harness ──────────────────────────────────────────────────────
+
+def measure(fn: Callable[[], object], items: int = 1) -> dict:
+    """
+    Time `fn` repeatedly within the time budget, then measure peak memory
+    of one extra call. `items` is how many units one call processes.
+    """
+    fn()  # warm-up: caches, imports, lazy builds
+
+    samples: list[int] = []
+    deadline = time.perf_counter() + TIME_BUDGET_S
+    while len(samples) < MAX_ITERATIONS and (len(samples) < MIN_ITERATIONS or time.perf_counter() < deadline):
+        start = time.perf_counter_ns()
+        fn()
+        samples.append(time.perf_counter_ns() - start)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    samples.sort()
+    mean_s = statistics.fmean(samples) / 1e9
+    return {
+        "iterations": len(samples),
+        "p50_ms": samples[len(samples) // 2] / 1e6,
+        "p99_ms": samples[min(len(samples) - 1, int(len(samples) * 0.99))] / 1e6,
+        "throughput": items / mean_s if mean_s else float("inf"),
+        "peak_kb": peak / 1024,
+    }
+
+
+def run_async(coro_fn: Callable[[], object]) -> Callable[[], object]:
+    return lambda: asyncio.run(coro_fn())
+
+
+# ── Service benchmarks ───────────────────────────────────────────
+
+def service_benchmarks(n: int, workdir: Path) -> dict[str, tuple[Callable[[], object], int]]:
+    from app.services.parameter_service import ParameterRegistry
+    from app.services.formula_validator import validate_formula, validate_formulas
+    from app.services.formula_engine import compile_formula
+    from app.services.formula_graph import FormulaGraph
+    from app.services.ai_suggester import suggest_parameters, RegistryRanker
+    from app.services.import_service import import_csv, CHUNK_SIZE
+    from app.services.template_store import TemplateStore
+    from app.services.registry_snapshot import build_snapshot, load_fresh
+    from app.services.readings_ingest import PlantModel, ingest_readings
+    from app.services.readings_store import ReadingsStore
+    from app.services.rollups import RollupStore
+
+    registry_path = workdir / f"registry_{n}.json"
+    synthetic.write_registry(registry_path, n)
+    registry = ParameterRegistry(registry_path)
+    registry.refresh()
+    ranker = RegistryRanker(registry)
+    # Same registry under another name, with a binary snapshot next to it
+    snapshot_source = workdir / f"snapshot_registry_{n}.json"
+    snapshot_source.write_bytes(registry_path.read_bytes())
+    build_snapshot(snapshot_source)
+    snapshot_registry = ParameterRegistry(snapshot_source)
+    snapshot_registry.refresh()
+
+    n_formulas = min(n, 10_000)
+    formulas, enabled = synthetic.make_formulas(n_formulas)
+    descriptions = synthetic.make_descriptions(100)
+    csv_bytes = synthetic.make_csv(n)
+
+    rng = np.random.default_rng(0)
+    readings = {f"input_{i}": rng.random(n) + 1 for i in range(50)}
+    compiled = compile_formula(formulas[0]["expression"])
+    graph = FormulaGraph(formulas[:min(n_formulas, 1000)])
+    values = graph.evaluate(readings)
+
+    store = TemplateStore(workdir / f"templates_{n}")
+    for i in range(min(n, 2000)):
+        store.save(f"Template {i}", synthetic.make_descriptions(1, seed=i)[0], {"i": i})
+
+    plant = synthetic.make_plant(n_inputs=5)
+    readings_model = PlantModel(plant)
+    readings_store = ReadingsStore(workdir / f"readings_{n}")
+    readings_rollups = RollupStore(workdir / f"rollups_{n}.db")
+    readings_body = synthetic.make_readings(plant, n)
+
+    async def readings_ingest():
+        async def chunks():
+            for i in range(0, len(readings_body), CHUNK_SIZE):
+                yield readings_body[i:i + CHUNK_SIZE]
+        await ingest_readings(readings_model, chunks(), csv_format=True, store=readings_store,
+                              rollups=readings_rollups)
+
+    async def csv_import():
+        async def chunks():
+            for i in range(0, len(csv_bytes), CHUNK_SIZE):
+                yield csv_bytes[i:i + CHUNK_SIZE]
+        async for _ in import_csv(chunks()):
+            pass
+
+    return {
+        "filter_parameters": (lambda: registry.by_asset_types(["boiler", "turbine"]), 1),
+        "filter_parameters (snapshot)": (lambda: snapshot_registry.by_asset_types(["boiler", "turbine"]), 1),
+        "registry_reload": (lambda: (setattr(registry, "_stamp", None), registry.refresh()), n),
+        "snapshot_open": (lambda: load_fresh(snapshot_source), n),
+        "validate_formula": (lambda: [validate_formula(f["expression"], enabled) for f in formulas[:100]], 100),
+        "validate_formulas_batch": (lambda: validate_formulas(formulas, enabled), n_formulas),
+        "formula_evaluate": (lambda: compiled.evaluate(readings), n),
+        "graph_evaluate (fused plan)": (lambda: graph.evaluate(readings), n),
+        "graph_recompute": (lambda: graph.recompute(values, {"input_0": readings["input_0"]}), n),
+        "suggest_parameters": (lambda: [suggest_parameters(d, ["boiler"]) for d in descriptions], len(descriptions)),
+        "rank_parameters": (lambda: [ranker.rank(d, ["boiler"]) for d in descriptions[:10]], 10),
+        "csv_import": (run_async(csv_import), n),
+        "readings_ingest (csv)": (run_async(readings_ingest), n * 5),
+        "template_list": (lambda: store.list("plant", 0, 50), 1),
+    }
+
+
+# ── HTTP benchmarks ──────────────────────────────────────────────
+
+def http_benchmarks(n: int, workdir: Path) -> dict[str, tuple[Callable[[], object], int]]:
+    try:
+        from fastapi.testclient import TestClient
+    except RuntimeError:  # starlette raises this when httpx is missing
+        print("  (httpx not installed; skipping HTTP benchmarks)")
+        return {}
+
+    from app.main import app
+    from app.routers import onboarding, templates
+    from app.services import parameter_service
+    from app.services.onboarding_store import OnboardingStore
+    from app.services.template_store import AsyncTemplateStore, TemplateStore
+
+    # Point the app's module-level stores at synthetic data for this scale
+    registry_path = workdir / f"http_registry_{n}.json"
+    synthetic.write_registry(registry_path, n)
+    parameter_service.registry.path = registry_path
+    parameter_service.registry.refresh()
+    templates.async_store = AsyncTemplateStore(TemplateStore(workdir / f"http_templates_{n}"))
+    onboarding.store = OnboardingStore(workdir / f"onboarding_{n}.db")
+
+    client = TestClient(app)
+    template_id = client.post(
+        "/api/templates",
+        json={"name": "Bench Template", "description": "bench", "config": synthetic.make_onboarding_payload(min(n, 5000))},
+    ).json()["id"]
+    formulas, enabled = synthetic.make_formulas(min(n, 1000))
+    csv_bytes = synthetic.make_csv(n)
+    payload = synthetic.make_onboarding_payload(min(n, 5000))
+    etag = client.get("/api/parameters").headers["etag"]
+
+    return {
+        "GET /api/parameters": (lambda: client.get("/api/parameters"), 1),
+        "GET /api/parameters (304)": (lambda: client.get("/api/parameters", headers={"If-None-Match": etag}), 1),
+        "GET /api/parameters?asset_types": (lambda: client.get("/api/parameters?asset_types=boiler,turbine"), 1),
+        "POST /api/validate-formula": (
+            lambda: client.post("/api/validate-formula",
+                                json={"expression": formulas[0]["expression"], "enabled_parameters": enabled}), 1),
+        "POST /api/validate-formulas": (
+            lambda: client.post("/api/validate-formulas",
+                                json={"formulas": formulas, "enabled_parameters": enabled}), len(formulas)),
+        "POST /api/suggest-parameters": (
+            lambda: client.post("/api/suggest-parameters",
+                                json={"description": "coal fired power plant", "asset_types": ["boiler"]}), 1),
+        "POST /api/suggest-parameters (ranked)": (
+            lambda: client.post("/api/suggest-parameters",
+                                json={"description": "coal fired power plant", "asset_types": ["boiler"],
+                                      "mode": "ranked"}), 1),
+        "POST /api/import-parameters": (
+            lambda: client.post("/api/import-parameters", files={"file": ("bench.csv", csv_bytes)}), n),
+        "GET /api/templates": (lambda: client.get("/api/templates"), 1),
+        "GET /api/templates/{id}": (lambda: client.get(f"/api/templates/{template_id}"), 1),
+        "POST /api/onboarding": (lambda: client.post("/api/onboarding", json=payload), 1),
+    }
+
+
+# ── Reporting ────────────────────────────────────────────────────
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base and result["p50_ms"] > base["p50_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{key}: p50 {result['p50_ms']:.3f} ms vs baseline {base['p50_ms']:.3f} ms "
+                f"(+{(result['p50_ms'] / base['p50_ms'] - 1) * 100:.0f}%)"
+            )
+    return regressions
+
+
+def print_row(key: str, r: dict) -> None:
+    print(f"  {key:<55} {r['p50_ms']:>10.3f} {r['p99_ms']:>10.3f} {r['throughput']:>14,.0f} {r['peak_kb']:>10,.0f}")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default="100,1000,10000", help="comma-separated sizes, e.g. 100,1000000")
+    parser.add_argument("--only", default="", help="substring filter on benchmark names")
+    parser.add_argument("--no-http", action="store_true", help="skip in-process HTTP benchmarks")
+    parser.add_argument("--save-baseline", action="store_true", help=f"write results to {BASELINE_PATH.name}")
+    parser.add_argument("--compare", action="store_true",
+                        help="compare against the saved baseline (saving one if there is none)")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p50 slowdown (0.25 = 25%%)")
+    parser.add_argument("--output", type=Path, help="also write results as JSON here")
+    args = parser.parse_args(argv)
+
+    scales = [int(float(s)) for s in args.scales.split(",") if s.strip()]
+    results: dict[str, dict] = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        for n in scales:
+            print(f"\n[n={n:,}]")
+            print(f"  {'benchmark':<55} {'p50 ms':>10} {'p99 ms':>10} {'items/s':>14} {'peak KB':>10}")
+            suites = [("service", service_benchmarks)]
+            if not args.no_http:
+                suites.append(("http", http_benchmarks))
+            for prefix, build in suites:
+                for name, (fn, items) in build(n, workdir).items():
+                    key = f"{prefix}.{name}[n={n}]"
+                    if args.only and args.only not in key:
+                        continue
+                    results[key] = measure(fn, items)
+                    print_row(key, results[key])
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    if args.compare and not BASELINE_PATH.exists():
+        # Baselines are per machine: the first comparing run records one
+        print("\n[!] No baseline saved yet; this run becomes the baseline")
+        args.save_baseline, args.compare = True, False
+    if args.save_baseline:
+        BASELINE_PATH.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"\n[OK] Baseline saved to {BASELINE_PATH}")
+    if args.compare:
+        regressions = compare(results, json.loads(BASELINE_PATH.read_text(encoding="utf-8")), args.tolerance)
+        if regressions:
+            print("\n[REGRESSION]")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("\n[OK] No regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
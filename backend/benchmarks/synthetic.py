@@ -0,0 +1,128 @@
+"""
+Synthetic data generators for the benchmark suite.
+
+Everything is generated from a seeded RNG so runs are comparable.
+"""
+
+import json
+import random
+from pathlib import Path
+
+ASSET_TYPES = ["boiler", "turbine", "cooling_tower", "kiln", "pump", "compressor", "furnace", "mill"]
+SECTIONS = ["COGEN BOILER", "TURBINE", "COOLING TOWER", "KILN", "UTILITIES", "PLANT SUMMARY"]
+WORDS = [
+    "coal", "steam", "feed", "water", "temperature", "pressure", "flow", "power", "generation",
+    "efficiency", "speed", "vibration", "level", "fuel", "gas", "oil", "heat", "rate", "load",
+    "air", "exhaust", "inlet", "outlet", "drum", "condenser", "vacuum", "clinker", "cement",
+]
+CATEGORIES = ["input", "output", "calculated"]
+
+
+def make_registry(n: int, seed: int = 0) -> list[dict]:
+    """`n` registry parameters spread over a few hundred asset types at scale."""
+    rng = random.Random(seed)
+    # More asset types as the registry grows, like a real multi-plant catalogue
+    asset_types = ASSET_TYPES + [f"asset_{i}" for i in range(max(0, n // 100))]
+    params = []
+    for i in range(n):
+        words = rng.sample(WORDS, 3)
+        params.append({
+            "name": f"{'_'.join(words)}_{i}",
+            "display_name": " ".join(w.capitalize() for w in words),
+            "unit": rng.choice(["TPH", "°C", "bar", "%", "MW", "RPM"]),
+            "category": rng.choice(CATEGORIES),
+            "section": rng.choice(SECTIONS),
+            "applicable_asset_types": rng.sample(asset_types, rng.randint(1, 3)),
+        })
+    return params
+
+
+def write_registry(path: Path, n: int, seed: int = 0) -> list[dict]:
+    params = make_registry(n, seed)
+    path.write_text(json.dumps(params), encoding="utf-8")
+    return params
+
+
+def make_formulas(n: int, n_inputs: int = 50, seed: int = 0) -> tuple[list[dict], list[str]]:
+    """
+    `n` calculated-parameter formulas layered into a DAG over `n_inputs`
+    inputs. Returns (formulas, enabled_parameters).
+    """
+    rng = random.Random(seed)
+    inputs = [f"input_{i}" for i in range(n_inputs)]
+    calculated: list[str] = []
+    formulas = []
+    ops = ["+", "-", "*", "/"]
+    for i in range(n):
+        pool = inputs + calculated[-20:]
+        a, b, c = (rng.choice(pool) for _ in range(3))
+        expression = f"({a} {rng.choice(ops)} {b}) {rng.choice(ops)} max({c}, 1) * {rng.randint(1, 100)}"
+        name = f"calc_{i}"
+        formulas.append({"parameter_name": name, "expression": expression})
+        calculated.append(name)
+    return formulas, inputs + calculated
+
+
+def make_plant(n_inputs: int = 5, seed: int = 0) -> dict:
+    """An onboarded plant (get_plant shape) with `n_inputs` inputs and two calculated parameters."""
+    inputs = [f"input_{i}" for i in range(n_inputs)]
+    parameters = [
+        {"name": name, "display_name": name, "unit": "t/h", "category": "input", "section": "BOILER", "enabled": True}
+        for name in inputs
+    ] + [
+        {"name": name, "display_name": name, "unit": "%", "category": "calculated", "section": "BOILER", "enabled": True}
+        for name in ("ratio", "scaled_ratio")
+    ]
+    return {
+        "id": seed,
+        "assets": [{"name": f"asset_{i}", "display_name": f"Asset {i}", "asset_type": "boiler"} for i in range(4)],
+        "parameters": parameters,
+        "formulas": [
+            {"parameter_name": "ratio", "expression": f"{inputs[0]} / {inputs[1]} * 100", "depends_on": []},
+            {"parameter_name": "scaled_ratio", "expression": f"ratio * {inputs[-1]} + {inputs[0]} / {inputs[1]}",
+             "depends_on": []},
+        ],
+    }
+
+
+def make_readings(plant: dict, n: int, seed: int = 0) -> bytes:
+    """A readings CSV for `plant`: `n` rows, one minute apart, spread over its assets."""
+    rng = random.Random(seed)
+    inputs = [p["name"] for p in plant["parameters"] if p["category"] != "calculated"]
+    assets = [a["name"] for a in plant["assets"]]
+    lines = [",".join(["timestamp", "asset", *inputs])]
+    start = 1_700_000_000
+    for i in range(n):
+        values = ",".join(f"{rng.uniform(1, 500):.3f}" for _ in inputs)
+        lines.append(f"{start + 60 * i},{assets[i % len(assets)]},{values}")
+    return ("\n".join(lines) + "\n").encode()
+
+
+def make_descriptions(n: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    extra = ["cement", "power", "steel", "boiler", "turbine", "cooling", "plant", "station", "facility"]
+    return [" ".join(rng.choices(WORDS + extra, k=rng.randint(5, 30))) for _ in range(n)]
+
+
+def make_csv(n: int, seed: int = 0) -> bytes:
+    """A parameter-import CSV with `n` rows, ~2% of them invalid."""
+    rng = random.Random(seed)
+    lines = ["name,display_name,unit,category,section"]
+    for i in range(n):
+        category = rng.choice(CATEGORIES) if rng.random() > 0.02 else "bogus"
+        words = rng.sample(WORDS, 2)
+        lines.append(f"{'_'.join(words)}_{i},\"{' '.join(words).title()}\",TPH,{category},{rng.choice(SECTIONS)}")
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def make_onboarding_payload(n_parameters: int, seed: int = 0) -> dict:
+    params = make_registry(n_parameters, seed)
+    formulas, _ = make_formulas(max(1, n_parameters // 10), seed=seed)
+    return {
+        "plant": {"name": "Bench Plant", "address": "Bench Street", "manager_email": "bench@plant.com"},
+        "assets": [{"name": f"a{i}", "display_name": f"Asset {i}", "asset_type": t}
+                   for i, t in enumerate(ASSET_TYPES)],
+        "parameters": [{k: p[k] for k in ("name", "display_name", "unit", "category", "section")}
+                       for p in params],
+        "formulas": formulas,
+    }
@@ -0,0 +1,35 @@
+"""
+Gunicorn settings for multi-worker serving.
+
+    gunicorn -c gunicorn.conf.py app.main:app
+
+- Uvicorn workers, one per core by default (override with WEB_CONCURRENCY)
+- The app is imported and the registry, suggestion and template indexes
+  are built once in the master (preload_app + when_ready); workers fork
+  afterwards and share those pages copy-on-write instead of each loading
+  its own copy; with a registry snapshot (seed_data.py builds one) the
+  registry itself is a read-only memory mapping shared through the page cache
+- gc.freeze() moves the preloaded objects out of the collector's reach,
+  so garbage collections in the workers do not touch (and un-share) them
+"""
+
+import gc
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+os.environ["WEB_CONCURRENCY"] = str(workers)  # CPU pools split the cores between workers
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = 120  # large imports stream for a while
+graceful_timeout = 30
+
+
+def when_ready(server):
+    from app.main import preload_shared_state
+
+    preload_shared_state()
+    gc.collect()
+    gc.freeze()
+    server.log.info("Shared state preloaded; forking %d workers", server.num_workers)
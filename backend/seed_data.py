@@ -12,6 +12,9 @@ Usage:
 import json
 from pathlib import Path
 
+from app.services.registry_snapshot import build_snapshot
+from app.services.template_store import TemplateStore
+
 DATA_DIR = Path(__file__).parent / "app" / "data"
 TEMPLATES_DIR = DATA_DIR / "templates"
 TEMPLATES_DIR.mkdir(parents=True, exist_ok=True)
@@ -94,4 +97,12 @@ template2_path = TEMPLATES_DIR / "cooling_tower_plant.json"
 template2_path.write_text(json.dumps(cooling_template, indent=2), encoding="utf-8")
 print(f"[OK] Sample template created: {template2_path.name}")
 
+# ── 4. Rebuild the template index ────────────────────────────────
+TemplateStore(TEMPLATES_DIR).rebuild()
+print("[OK] Template index rebuilt")
+
+# ── 5. Build the binary registry snapshot ────────────────────────
+snapshot_path = build_snapshot(registry_path)
+print(f"[OK] Registry snapshot built: {snapshot_path.name}")
+
 print("\nSeed data complete! Templates are ready to load from the wizard.")
@@ -3,14 +3,29 @@ Unit tests for core backend logic.
 
 Tests cover:
   - Formula validation (syntax, safety, variable resolution)
-  - Parameter service (loading, filtering)
+  - Parameter service (loading, filtering, binary snapshot)
   - AI suggestion engine (keyword matching)
+  - Formula engine (compiled, vectorized evaluation)
+  - Formula dry run (numeric issues over sample inputs)
+  - Formula graph (topological order, cycles, incremental recompute, fused plan)
+  - CSV / Excel import (chunked parsing, batched validation)
+  - Import merge (registry dedup classification, atomic merge plans)
+  - CPU process pool (offloaded jobs, timeouts, backpressure)
+  - Template store (metadata index, search, pagination, parsed-template cache, patches)
+  - JSON Patch / merge patch
+  - Onboarding store (SQLite persistence, concurrent writes)
+  - Readings ingestion (NDJSON/CSV, columnar buffering, calculated parameters, readings log)
+  - Readings rollups (hour/day buckets, incremental merges, aggregate queries)
+  - HTTP caching (ETags, conditional GETs)
+  - Metrics (histograms, Prometheus exposition)
+  - API (invalid input to the template, formula, import merge and readings endpoints)
 
 Run:
     cd backend
     python -m pytest tests/ -v
 """
 
+import json
 import pytest
 import sys
 import os
@@ -18,9 +33,27 @@ import os
 # Add parent dir to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
-from app.services.formula_validator import validate_formula
-from app.services.parameter_service import load_parameters, filter_parameters
-from app.services.ai_suggester import suggest_parameters
+from app.services.formula_validator import validate_formula, validate_formulas
+from app.services.parameter_service import load_parameters, filter_parameters, ParameterRegistry
+from app.services.registry_snapshot import build_snapshot, load_fresh
+from app.services.ai_suggester import suggest_parameters, SuggestionIndex, RegistryRanker, rank_parameters
+from app.services.formula_engine import compile_formula, evaluate_formulas, FormulaError
+from app.services.formula_dry_run import dry_run, dry_run_formulas, sample_grid, DryRunError
+from app.services.formula_graph import FormulaGraph, FormulaCycleError
+from app.services.formula_plan import FormulaPlan
+from app.services.template_store import (
+    TemplateStore, AsyncTemplateStore, TemplateCache, TemplateHistoryUnavailable, TemplateVersionMismatch,
+)
+from app.services.json_patch import apply_json_patch, apply_merge_patch, apply_patch, PatchError, PatchTestFailed
+from app.services.onboarding_store import OnboardingStore
+from app.services.readings_ingest import PlantModel, ReadingsFormatError, ingest_readings, timestamp_ms
+from app.services.readings_store import ReadingsStore
+from app.services.rollups import RollupStore, bucket_aggregates
+from app.metrics import Histogram, Gauge, MetricsRegistry, service_operation_duration, timed
+from app.http_cache import make_etag, not_modified, negotiate_encoding, EncodedBody, EncodedBodyCache, fast_json_response
+from app.services.import_service import import_csv, import_rows, CsvRecordSplitter, iter_xlsx_batches, ParameterImportError
+from app.services.import_merge import ImportMerger, apply_merge_plan
+from app.services.cpu_pool import CpuPool, JobTimeout, PoolBusy
 
 
 # ════════════════════════════════════════════════════════════════
@@ -123,6 +156,65 @@ class TestFormulaValidator:
         assert result["valid"] is True
         assert result["depends_on"] == ["a_param", "z_param"]
 
+    def test_batch_matches_single(self):
+        enabled = ["steam_generation", "coal_consumption"]
+        expressions = ["steam_generation / coal_consumption", "eval('x')", "steam_generation / / 2", "a + 1"]
+        result = validate_formulas(
+            [{"parameter_name": f"p{i}", "expression": e} for i, e in enumerate(expressions)],
+            enabled,
+        )
+        assert result["valid"] is False
+        for r, expression in zip(result["results"], expressions):
+            single = validate_formula(expression, enabled)
+            assert r["valid"] == single["valid"]
+            assert r["error"] == single["error"]
+
+    def test_batch_detects_cycle(self):
+        result = validate_formulas(
+            [
+                {"parameter_name": "a", "expression": "b + x"},
+                {"parameter_name": "b", "expression": "a * 2"},
+                {"parameter_name": "c", "expression": "x"},
+            ],
+            ["a", "b", "c", "x"],
+        )
+        assert result["valid"] is False
+        assert "Circular dependency" in result["errors"][0]
+        by_name = {r["parameter_name"]: r for r in result["results"]}
+        assert by_name["a"]["valid"] is False
+        assert by_name["c"]["valid"] is True
+
+    def test_batch_rejects_duplicate_parameter(self):
+        result = validate_formulas(
+            [
+                {"parameter_name": "a", "expression": "x + 1"},
+                {"parameter_name": "b", "expression": "a * 2"},
+                {"parameter_name": "a", "expression": "x + 2"},
+            ],
+            ["a", "b", "x"],
+            calculated_parameters={"a"},
+            dry_run=True,
+        )
+        assert result["valid"] is False
+        assert result["errors"] == ["Duplicate formula for parameter: a"]
+        assert [r["valid"] for r in result["results"]] == [False, True, False]
+        assert result["evaluation_order"] == ["b"]
+        assert result["warnings"] == []
+
+    def test_batch_order_and_calculated_warnings(self):
+        result = validate_formulas(
+            [
+                {"parameter_name": "heat_rate", "expression": "boiler_efficiency * turbine_efficiency"},
+                {"parameter_name": "boiler_efficiency", "expression": "steam_generation / coal_consumption"},
+            ],
+            ["boiler_efficiency", "turbine_efficiency", "steam_generation", "coal_consumption"],
+            calculated_parameters={"boiler_efficiency", "turbine_efficiency"},
+        )
+        assert result["valid"] is True
+        assert result["evaluation_order"] == ["boiler_efficiency", "heat_rate"]
+        assert len(result["warnings"]) == 1
+        assert "turbine_efficiency" in result["warnings"][0]
+
 
 # ════════════════════════════════════════════════════════════════
 # Parameter Service Tests
@@ -176,6 +268,102 @@ class TestParameterService:
         for p in params:
             assert p["category"] in valid_categories, f"Invalid category in {p['name']}: {p['category']}"
 
+    def test_registry_indexes(self):
+        registry = ParameterRegistry()
+        boiler = registry.by_asset_types(["boiler"])
+        assert boiler == filter_parameters(["boiler"])
+        for p in registry.by_categories(["calculated"]):
+            assert p["category"] == "calculated"
+        assert registry.get("coal_consumption")["unit"] == "MT"
+
+    def test_registry_reloads_on_mtime_change(self, tmp_path):
+        import json
+        path = tmp_path / "registry.json"
+        path.write_text(json.dumps([{"name": "a", "display_name": "A", "unit": "", "category": "input",
+                                     "section": "S", "applicable_asset_types": ["boiler"]}]))
+        registry = ParameterRegistry(path)
+        assert len(registry.all()) == 1
+        assert registry.all() is registry.all()  # not re-parsed
+
+        path.write_text(json.dumps([]))
+        os.utime(path, (path.stat().st_atime, path.stat().st_mtime + 10))
+        assert registry.all() == []
+        assert registry.by_asset_types(["boiler"]) == []
+
+    def test_registry_reloads_on_size_change_within_same_mtime(self, tmp_path):
+        import json
+        path = tmp_path / "registry.json"
+        path.write_text(json.dumps([]))
+        registry = ParameterRegistry(path)
+        assert registry.all() == []
+        mtime_ns = path.stat().st_mtime_ns
+
+        # A rewrite within the filesystem's timestamp granularity
+        path.write_text(json.dumps([{"name": "a", "category": "input", "applicable_asset_types": []}]))
+        os.utime(path, ns=(path.stat().st_atime_ns, mtime_ns))
+        assert [p["name"] for p in registry.all()] == ["a"]
+
+
+class TestRegistrySnapshot:
+    """Tests for the memory-mapped binary registry snapshot."""
+
+    PARAMS = [
+        {"name": "a", "display_name": "Á", "unit": "°C", "category": "input", "section": "S1",
+         "applicable_asset_types": ["turbine", "boiler"]},
+        {"name": "b", "display_name": "B", "unit": "°C", "category": "output", "section": "S1",
+         "applicable_asset_types": []},
+        {"name": "c", "display_name": "C", "unit": "MW", "category": "calculated", "section": "S2",
+         "applicable_asset_types": ["boiler"]},
+    ]
+
+    def write(self, tmp_path, params=None):
+        import json
+        path = tmp_path / "registry.json"
+        path.write_text(json.dumps(self.PARAMS if params is None else params), encoding="utf-8")
+        build_snapshot(path)
+        return path
+
+    def test_round_trip_and_filter(self, tmp_path):
+        snapshot = load_fresh(self.write(tmp_path))
+        assert snapshot.records() == self.PARAMS
+        assert snapshot.select_asset_types(["boiler"]).tolist() == [0, 2]
+        assert snapshot.select_asset_types(["turbine", "kiln"]).tolist() == [0]
+        assert snapshot.select_asset_types(["kiln"]).tolist() == []
+
+    def test_filter_at_any_type_count(self, tmp_path):
+        # 300 rare types use row lists, the common ones bitmaps; filters mix both
+        params = [
+            {"name": f"p{i}", "display_name": "", "unit": "", "category": "", "section": "",
+             "applicable_asset_types": ["common"] + ([f"t{i % 300}"] if i % 3 else []) + (["half"] if i % 2 else [])}
+            for i in range(1000)
+        ]
+        path = tmp_path / "parameters.json"
+        path.write_text(json.dumps(params), encoding="utf-8")
+        build_snapshot(path)
+        snapshot = load_fresh(path)
+        assert snapshot._bitmaps.shape == (2, 16)
+        for wanted in (["t299"], ["t1", "t299", "half"], ["common"], ["missing"]):
+            expected = [i for i, p in enumerate(params) if set(wanted) & set(p["applicable_asset_types"])]
+            assert snapshot.select_asset_types(wanted).tolist() == expected
+
+    def test_registry_uses_fresh_snapshot_only(self, tmp_path):
+        import hashlib
+        path = self.write(tmp_path)
+        registry = ParameterRegistry(path)
+        assert registry.by_asset_types(["boiler"]) == [self.PARAMS[0], self.PARAMS[2]]
+        assert registry.snapshot is not None and not registry._materialized
+        assert registry.digest == hashlib.sha256(path.read_bytes()).hexdigest()
+        assert registry.get("c")["unit"] == "MW"
+
+        path.write_text("[]", encoding="utf-8")  # snapshot is now stale
+        os.utime(path, (path.stat().st_atime, path.stat().st_mtime + 10))
+        assert registry.all() == [] and registry.snapshot is None
+
+    def test_rejects_garbage(self, tmp_path):
+        path = self.write(tmp_path)
+        path.with_suffix(".snapshot").write_bytes(b"not a snapshot")
+        assert load_fresh(path) is None
+
 
 # ════════════════════════════════════════════════════════════════
 # AI Suggester Tests
@@ -229,6 +417,1538 @@ class TestAISuggester:
         assert "clinker_production" in names
         assert "gross_generation" in names
 
+    def test_word_boundary(self):
+        """'power' must not match inside 'powerful'."""
+        suggestions = suggest_parameters("A powerful new facility", [])
+        assert "gross_generation" not in {s["name"] for s in suggestions}
+
+    def test_plural_and_punctuation(self):
+        names = {s["name"] for s in suggest_parameters("Two boilers, (cement)!", [])}
+        assert "steam_flow_rate" in names
+        assert "clinker_production" in names
+
+    def test_underscored_asset_type(self):
+        names = {s["name"] for s in suggest_parameters("", ["cooling_tower"])}
+        assert "wet_bulb_temperature" in names
+
+    def test_phrase_keywords(self):
+        index = SuggestionIndex({"blast furnace": [{"name": "coke_rate"}], "blast": [{"name": "blast_volume"}]})
+        assert index.match("A blast furnace plant") == ["blast furnace", "blast"]
+        assert index.match("blast") == ["blast"]
+
+    def test_suggestions_do_not_leak_between_calls(self):
+        first = suggest_parameters("cement", ["boiler"])
+        first[0]["unit"] = "changed"
+        second = suggest_parameters("cement", ["kiln"])
+        assert second[0]["unit"] != "changed"
+        assert second[0]["applicable_asset_types"] == ["kiln"]
+
+
+class TestRegistryRanker:
+    """Tests for BM25-ranked suggestions over the parameter registry."""
+
+    def test_ranked_from_registry(self):
+        results = rank_parameters("coal fired boiler", [], top_k=3)
+        assert results[0]["name"] == "coal_consumption"
+        assert len(results) == 3
+        scores = [r["score"] for r in results]
+        assert scores == sorted(scores, reverse=True)
+        assert "reason" in results[0]
+
+    def test_top_k_and_no_match(self):
+        assert len(rank_parameters("steam", [], top_k=1)) == 1
+        assert rank_parameters("zzz unrelated", []) == []
+
+    def test_rare_terms_score_higher(self, tmp_path):
+        import json
+        params = [
+            {"name": f"p{i}", "display_name": "Pump Flow", "unit": "", "category": "input",
+             "section": "PUMPS", "applicable_asset_types": ["pump"]}
+            for i in range(10)
+        ] + [{"name": "vib", "display_name": "Pump Vibration", "unit": "", "category": "input",
+              "section": "PUMPS", "applicable_asset_types": ["pump"]}]
+        path = tmp_path / "registry.json"
+        path.write_text(json.dumps(params))
+        ranker = RegistryRanker(ParameterRegistry(path))
+        assert ranker.rank("pump vibration monitoring", [], top_k=1)[0]["name"] == "vib"
+
+
+# ════════════════════════════════════════════════════════════════
+# Formula Engine Tests
+# ════════════════════════════════════════════════════════════════
+
+class TestFormulaEngine:
+    """Tests for the compiled, vectorized formula engine."""
+
+    def test_vectorized_evaluation(self):
+        f = compile_formula("steam_generation / coal_consumption * 100")
+        result = f.evaluate({"steam_generation": [10, 20, 30], "coal_consumption": [5, 10, 15]})
+        assert result.tolist() == [200.0, 200.0, 200.0]
+
+    def test_variables_extracted(self):
+        f = compile_formula("max(b, a) + sqrt(c) * pi")
+        assert f.variables == ("a", "b", "c")
+
+    def test_compiled_form_is_cached(self):
+        assert compile_formula("a + b") is compile_formula("a + b")
+
+    def test_constant_broadcasts_to_rows(self):
+        f = compile_formula("a * 0 + 5")
+        assert f.evaluate({"a": [1, 2, 3]}).tolist() == [5.0, 5.0, 5.0]
+
+    def test_division_by_zero_gives_inf(self):
+        result = compile_formula("a / b").evaluate({"a": [1.0], "b": [0.0]})
+        assert result[0] == float("inf")
+
+    @pytest.mark.parametrize("expression", [
+        "__import__('os')",
+        "a.real",
+        "a[0]",
+        "lambda: 1",
+        "open('x')",
+        "'text'",
+        "a if b else c",
+    ])
+    def test_rejects_non_whitelisted_syntax(self, expression):
+        with pytest.raises(FormulaError):
+            compile_formula(expression)
+
+    def test_syntax_error(self):
+        with pytest.raises(FormulaError, match="Syntax error"):
+            compile_formula("a / / b")
+
+    def test_missing_input(self):
+        with pytest.raises(FormulaError, match="Missing input"):
+            compile_formula("a + b").evaluate({"a": [1]})
+
+    def test_evaluate_batch(self):
+        results = evaluate_formulas(
+            [{"parameter_name": "x", "expression": "a + 1"}, {"parameter_name": "y", "expression": "a * 2"}],
+            {"a": [1, 2]},
+        )
+        assert results["x"].tolist() == [2.0, 3.0]
+        assert results["y"].tolist() == [2.0, 4.0]
+
+    def test_constants_use_numpy_semantics(self):
+        import math
+        # Python would hang on 9**9**9 and raise on 1/0 and 10.0**400
+        assert compile_formula("9**9**9").evaluate({}) == math.inf
+        assert compile_formula("a * 9**9**9").evaluate({"a": [1]}).tolist() == [math.inf]
+        assert compile_formula("1/0").evaluate({}) == math.inf
+        assert compile_formula("10.0**400").evaluate({}) == math.inf
+        assert compile_formula("round(a, 1) + 2**10").evaluate({"a": [1.26]}).tolist() == [1025.3]
+        with pytest.raises(FormulaError):
+            compile_formula("round(a, 1.5)").evaluate({"a": [1.0]})
+
+    @pytest.mark.parametrize("expression", ["round(a, 9**9**9)", "round(a, 16)", "round(a, 1+1)", "round(a, b)"])
+    def test_round_decimals_must_be_small_literal(self, expression):
+        with pytest.raises(FormulaError, match="decimals"):
+            compile_formula(expression)
+
+    def test_round_decimals_in_range(self):
+        f = compile_formula("round(a, -1) + round(a, 15)")
+        assert f.evaluate({"a": [14.0]}).tolist() == [24.0]
+
+    @pytest.mark.parametrize("expression", ["log(a, b)", "sqrt(a, b)", "pow(a, b, c)", "pow(a)", "abs()", "max()"])
+    def test_arity_checked_at_compile_time(self, expression):
+        with pytest.raises(FormulaError, match="argument"):
+            compile_formula(expression)
+
+
+# ════════════════════════════════════════════════════════════════
+# Formula Dry Run Tests
+# ════════════════════════════════════════════════════════════════
+
+class TestFormulaDryRun:
+    """Tests for evaluating formulas over sample inputs to find numeric issues."""
+
+    def kinds(self, issues: list[dict]) -> dict[str, str]:
+        return {i["expression"]: i["kind"] for i in issues}
+
+    def test_division_by_zero_located(self):
+        issues = dry_run("steam_generation / coal_consumption * 100")["issues"]
+        assert self.kinds(issues) == {"steam_generation / coal_consumption": "division_by_zero"}
+        assert issues[0]["example"]["coal_consumption"] == 0.0
+
+    def test_domain_errors(self):
+        issues = dry_run("log(a) + sqrt(b)")["issues"]
+        assert self.kinds(issues) == {"log(a)": "domain", "sqrt(b)": "domain"}
+
+    def test_overflow(self):
+        assert self.kinds(dry_run("a ** 500")["issues"]) == {"a ** 500": "overflow"}
+
+    def test_safe_formula_has_no_issues(self):
+        assert dry_run("a * 2 + round(b, 1) - pi")["issues"] == []
+        assert dry_run("(a + b) / (abs(a) + 1)")["issues"] == []
+
+    def test_grid_covers_edges_per_input(self):
+        grid = sample_grid(["a", "b"])
+        assert (grid["a"] == 0).sum() == 1 and (grid["b"] == -1).sum() == 1
+        assert sample_grid(["a", "b"])["a"].tolist() == grid["a"].tolist()
+
+    def test_uploaded_samples_and_percent_range(self):
+        run = dry_run("s / c * 100", samples={"s": [90, 120, 50], "c": [100, 100, 0]}, unit="%")
+        assert run["rows"] == 3
+        kinds = self.kinds(run["issues"])
+        assert kinds == {"s / c": "division_by_zero", "s / c * 100": "out_of_range"}
+        out_of_range = next(i for i in run["issues"] if i["kind"] == "out_of_range")
+        assert out_of_range["rows"] == 1 and out_of_range["example"] == {"c": 100.0, "s": 120.0}
+
+    def test_percent_range_needs_samples(self):
+        assert dry_run("s / c * 100", unit="%")["issues"][0]["kind"] == "division_by_zero"
+        assert len(dry_run("s / c * 100", unit="%")["issues"]) == 1
+
+    def test_mismatched_samples(self):
+        with pytest.raises(DryRunError):
+            dry_run("a + b", samples={"a": [1, 2], "b": [1]})
+
+    def test_batch_propagates_upstream_results(self):
+        issues = dry_run_formulas(PLANT_FORMULAS, ["boiler_efficiency", "turbine_efficiency", "heat_rate", "aux_ratio"])
+        assert self.kinds(issues["boiler_efficiency"]) == {"steam_generation / coal_consumption": "division_by_zero"}
+        assert self.kinds(issues["heat_rate"]) == {"boiler_efficiency * turbine_efficiency": "non_finite"}
+        assert issues["heat_rate"][0]["example"]["boiler_efficiency"] is None
+
+    def test_validator_dry_run(self):
+        result = validate_formula("a / b", ["a", "b"], dry_run=True)
+        assert result["valid"] is True
+        assert [i["kind"] for i in result["issues"]] == ["division_by_zero"]
+        assert "issues" not in validate_formula("a / b", ["a", "b"])
+
+        batch = validate_formulas(
+            [{"parameter_name": "x", "expression": "a / b"}, {"parameter_name": "y", "expression": "a < b"}],
+            ["a", "b"], dry_run=True,
+        )
+        assert batch["results"][0]["issues"][0]["kind"] == "division_by_zero"
+        assert batch["results"][1]["valid"] is False
+
+    def test_function_name_as_value_is_invalid(self):
+        result = validate_formula("abs + 1", [], dry_run=True)
+        assert result["valid"] is False and "function" in result["error"]
+        with pytest.raises(FormulaError):
+            compile_formula("sqrt(abs)")
+
+    @pytest.mark.parametrize("expression", ["round(a, 2)", "round(a, -1)", "round(a, 1+1)", "round(a, 99)"])
+    def test_round_agrees_with_engine(self, expression):
+        try:
+            compile_formula(expression).evaluate({"a": [1.0]})
+            engine_ok = True
+        except FormulaError:
+            engine_ok = False
+        assert validate_formula(expression, ["a"], dry_run=True)["valid"] is engine_ok
+
+
+# ════════════════════════════════════════════════════════════════
+# Formula Graph Tests
+# ════════════════════════════════════════════════════════════════
+
+PLANT_FORMULAS = [
+    {"parameter_name": "heat_rate", "expression": "boiler_efficiency * turbine_efficiency"},
+    {"parameter_name": "boiler_efficiency", "expression": "steam_generation / coal_consumption"},
+    {"parameter_name": "turbine_efficiency", "expression": "power_generation / steam_generation"},
+    {"parameter_name": "aux_ratio", "expression": "auxiliary_power / power_generation"},
+]
+
+
+class TestFormulaGraph:
+    """Tests for dependency-graph evaluation of calculated parameters."""
+
+    def test_topological_order(self):
+        order = FormulaGraph(PLANT_FORMULAS).order
+        assert order.index("boiler_efficiency") < order.index("heat_rate")
+        assert order.index("turbine_efficiency") < order.index("heat_rate")
+
+    def test_inputs(self):
+        graph = FormulaGraph(PLANT_FORMULAS)
+        assert graph.inputs == {"steam_generation", "coal_consumption", "power_generation", "auxiliary_power"}
+
+    def test_cycle_detected(self):
+        with pytest.raises(FormulaCycleError) as exc:
+            FormulaGraph([
+                {"parameter_name": "a", "expression": "b + 1"},
+                {"parameter_name": "b", "expression": "c * 2"},
+                {"parameter_name": "c", "expression": "a - x"},
+            ])
+        assert exc.value.cycle[0] == exc.value.cycle[-1]
+        assert set(exc.value.cycle) == {"a", "b", "c"}
+
+    def test_self_reference_is_cycle(self):
+        with pytest.raises(FormulaCycleError):
+            FormulaGraph([{"parameter_name": "a", "expression": "a + 1"}])
+
+    def test_long_chain_cycle(self):
+        # Deeper than the recursion limit
+        chain = [{"parameter_name": f"p{i}", "expression": f"p{i + 1} + 1"} for i in range(5000)]
+        chain.append({"parameter_name": "p5000", "expression": "p0 * 2"})
+        with pytest.raises(FormulaCycleError) as exc:
+            FormulaGraph(chain)
+        assert len(exc.value.cycle) == 5002
+
+    def test_duplicate_parameter_rejected(self):
+        with pytest.raises(FormulaError, match="Duplicate formula for parameter: a"):
+            FormulaGraph([{"parameter_name": "a", "expression": "x + 1"}, {"parameter_name": "a", "expression": "y"}])
+
+    def test_downstream_only(self):
+        graph = FormulaGraph(PLANT_FORMULAS)
+        assert graph.downstream({"coal_consumption"}) == ["boiler_efficiency", "heat_rate"]
+        assert graph.downstream({"auxiliary_power"}) == ["aux_ratio"]
+
+    def test_incremental_recompute_matches_full(self):
+        graph = FormulaGraph(PLANT_FORMULAS)
+        inputs = {"steam_generation": [100.0], "coal_consumption": [20.0],
+                  "power_generation": [50.0], "auxiliary_power": [5.0]}
+        values = graph.evaluate(inputs)
+        recomputed = graph.recompute(values, {"coal_consumption": [25.0]})
+
+        assert recomputed == ["boiler_efficiency", "heat_rate"]
+        full = graph.evaluate({**inputs, "coal_consumption": [25.0]})
+        for name in graph.order:
+            assert values[name].tolist() == full[name].tolist()
+
+
+class TestFormulaPlan:
+    """Tests for the fused plan that shares sub-expressions across formulas."""
+
+    def plan(self, formulas: list[dict]) -> FormulaPlan:
+        return FormulaGraph(formulas).plan
+
+    def test_shared_subexpression_planned_once(self):
+        plan = self.plan([
+            {"parameter_name": "boiler_efficiency", "expression": "steam_generation / coal_consumption * 100"},
+            {"parameter_name": "steam_rate", "expression": "(steam_generation / coal_consumption) / hours"},
+        ])
+        divisions = [s for s in plan.steps if s[1].__name__ == "truediv"]
+        assert len(divisions) == 2  # the shared ratio plus "/ hours"
+        assert plan.stats["shared"] == 1
+
+    def test_commutative_operands_normalized(self):
+        plan = self.plan([
+            {"parameter_name": "x", "expression": "a * b + max(a, c)"},
+            {"parameter_name": "y", "expression": "b * a - max(c, a)"},
+        ])
+        assert plan.stats["shared"] == 2
+        assert len(plan.steps) == 4
+
+    def test_non_commutative_operands_kept(self):
+        plan = self.plan([
+            {"parameter_name": "x", "expression": "a / b"},
+            {"parameter_name": "y", "expression": "b / a"},
+        ])
+        assert plan.stats["shared"] == 0
+
+    def test_calculated_reference_links_to_output(self):
+        plan = self.plan(PLANT_FORMULAS)
+        assert plan.inputs == sorted(FormulaGraph(PLANT_FORMULAS).inputs)
+
+    def test_constants_folded(self):
+        plan = self.plan([{"parameter_name": "x", "expression": "a * (2 * 3) + -1"}])
+        assert {-1, 6} <= set(plan.constants.values())
+        assert len(plan.steps) == 2
+
+    def test_literal_beyond_float_range_is_formula_error(self):
+        import ast
+        from types import SimpleNamespace
+
+        # The plan binds literals through the engine's check, even for a tree it did not compile
+        formula = SimpleNamespace(tree=ast.parse("a + 1" + "0" * 400, mode="eval"), variables=("a",))
+        with pytest.raises(FormulaError, match="too large"):
+            FormulaPlan({"x": formula}, ["x"])
+
+    def test_matches_per_formula_evaluation(self):
+        import numpy as np
+
+        formulas = PLANT_FORMULAS + [
+            {"parameter_name": "ratio", "expression": "steam_generation / coal_consumption * 100 + round(pi, 2)"},
+            {"parameter_name": "constant", "expression": "5"},
+            {"parameter_name": "spread", "expression": "max(power_generation, 1) - min(1, power_generation) % 3"},
+        ]
+        rng = np.random.default_rng(1)
+        inputs = {"steam_generation": rng.random(50), "coal_consumption": np.r_[0.0, rng.random(49)],
+                  "power_generation": rng.random(50), "auxiliary_power": rng.random(50)}
+        graph = FormulaGraph(formulas)
+        fused = graph.evaluate(inputs)
+        for name in graph.order:
+            expected = graph.formulas[name].evaluate(fused)
+            assert np.array_equal(fused[name], expected, equal_nan=True)
+        assert fused["constant"] == 5.0
+
+    def test_folding_uses_numpy_semantics(self):
+        import math
+        # Folded with Python ints these would hang the build or raise ZeroDivisionError
+        formulas = [{"parameter_name": "x", "expression": "a * 9**9**9"},
+                    {"parameter_name": "y", "expression": "a + 1/0"},
+                    {"parameter_name": "z", "expression": "round(a, 1) + 2**10"}]
+        fused = FormulaGraph(formulas).evaluate({"a": [1.26]})
+        assert fused["x"].tolist() == [math.inf] and fused["y"].tolist() == [math.inf]
+        assert fused["z"].tolist() == [1025.3]
+        with pytest.raises(FormulaError):
+            FormulaGraph([{"parameter_name": "x", "expression": "round(a, 1.5)"}]).evaluate({"a": [1.0]})
+        with pytest.raises(FormulaError):
+            FormulaGraph([{"parameter_name": "x", "expression": "round(a, 9**9**9)"}]).plan
+
+    def test_signed_zero_constants_kept_apart(self):
+        import math
+        formulas = [{"parameter_name": "x", "expression": "a * 0 + 1"},
+                    {"parameter_name": "y", "expression": "a / -0.0"}]
+        graph = FormulaGraph(formulas)
+        fused = graph.evaluate({"a": [1.0]})
+        assert fused["y"].tolist() == [-math.inf] == graph.formulas["y"].evaluate({"a": [1.0]}).tolist()
+
+    def test_missing_input(self):
+        with pytest.raises(FormulaError, match="Missing input"):
+            FormulaGraph(PLANT_FORMULAS).evaluate({"steam_generation": [1.0]})
+
+
+# ════════════════════════════════════════════════════════════════
+# CSV Import Tests
+# ════════════════════════════════════════════════════════════════
+
+def run_import(data: bytes, chunk_size: int = 7, batch_size: int = 2) -> list[dict]:
+    """Feed `data` to import_csv in small chunks and collect the events."""
+    import asyncio
+
+    async def chunks():
+        for i in range(0, len(data), chunk_size):
+            yield data[i:i + chunk_size]
+
+    async def collect():
+        return [event async for event in import_csv(chunks(), batch_size=batch_size)]
+
+    return asyncio.run(collect())
+
+
+class TestCSVImport:
+    """Tests for the chunked CSV import service."""
+
+    CSV = (
+        "\ufeffname,display_name,unit,category,section\n"
+        "coal_feed,Coal Feed,TPH,input,BOILER\n"
+        ",No Name,%,input,BOILER\n"
+        "note,\"Multi\nline, quoted\",-,output,MISC\n"
+        "\n"
+        "bad_cat,Bad,-,other,MISC\n"
+        "eff,Efficiency,%,calculated,BOILER\n"
+    ).encode("utf-8")
+
+    def test_rows_parsed_across_chunks(self):
+        events = run_import(self.CSV)
+        params = [p for e in events if "parameters" in e for p in e["parameters"]]
+        assert [p["name"] for p in params] == ["coal_feed", "note", "eff"]
+        assert params[1]["display_name"] == "Multi\nline, quoted"
+
+    def test_batches_and_summary(self):
+        events = run_import(self.CSV)
+        assert all(len(e["parameters"]) + len(e["errors"]) <= 2 for e in events[:-1])
+        assert events[-1]["summary"] == {"count": 3, "error_count": 2, "rows": 5}
+
+    def test_row_numbers_in_errors(self):
+        events = run_import(self.CSV)
+        errors = [err for e in events if "errors" in e for err in e["errors"]]
+        assert errors[0].startswith("Row 3:")
+        assert errors[1].startswith("Row 5:")
+
+    def test_chunk_size_does_not_change_result(self):
+        assert run_import(self.CSV, chunk_size=1) == run_import(self.CSV, chunk_size=4096)
+
+    def test_missing_columns(self):
+        with pytest.raises(ParameterImportError, match="Missing required columns"):
+            run_import(b"name,unit\na,b\n")
+
+    def test_empty_file(self):
+        with pytest.raises(ParameterImportError):
+            run_import(b"")
+
+    def test_splitter_carries_quote_state(self):
+        splitter = CsvRecordSplitter()
+        assert splitter.feed('a,"x\n') == ""
+        assert splitter.scanned == len('a,"x\n') and splitter.in_quotes
+        assert splitter.feed('y",b\nc,') == 'a,"x\ny",b\n'
+        assert splitter.feed("d") == "" and splitter.finish() == "c,d"
+
+    def test_long_quoted_field_within_record_limit(self):
+        description = "x" * 200_000  # over the csv module's default field limit
+        data = f'name,display_name,unit,category,section\na,"{description}",-,input,S\n'.encode()
+        events = run_import(data, chunk_size=64 * 1024)
+        assert events[0]["parameters"][0]["display_name"] == description
+        # A longer field arriving in one chunk is reported, not a 500
+        data = data.replace(b"x" * 200_000, b"x" * 2_000_000)
+        with pytest.raises(ParameterImportError, match="Malformed CSV"):
+            run_import(data, chunk_size=len(data))
+
+    def test_unbalanced_quote_capped(self):
+        data = b"name,display_name,unit,category,section\n" + b'a,"open,-,input,S\n' + b"b,B,-,input,S\n" * 200_000
+        with pytest.raises(ParameterImportError, match="unbalanced quote"):
+            run_import(data, chunk_size=64 * 1024)
+
+    def test_block_jobs_match_inline_import(self):
+        import asyncio
+        inline = CpuPool(workers=0)
+
+        async def collect(data):
+            async def chunks():
+                for i in range(0, len(data), 7):
+                    yield data[i:i + 7]
+            return [e async for e in import_csv(chunks(), batch_size=2, run=inline.run)]
+
+        events = asyncio.run(collect(self.CSV))
+        expected = run_import(self.CSV)
+        assert all(len(e["parameters"]) + len(e["errors"]) <= 2 for e in events[:-1])
+        assert [p for e in events[:-1] for p in e["parameters"]] == [p for e in expected[:-1] for p in e["parameters"]]
+        assert [x for e in events[:-1] for x in e["errors"]] == [x for e in expected[:-1] for x in e["errors"]]
+        assert events[-1] == expected[-1]
+        with pytest.raises(ParameterImportError):
+            asyncio.run(collect(b"name,unit\na,b\n"))
+
+
+def run_xlsx_import(sheets: dict[str, list[list]]) -> list[dict]:
+    """Build an in-memory workbook and collect import_rows events for it."""
+    import asyncio
+    import io
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    for title, rows in sheets.items():
+        ws = wb.create_sheet(title)
+        for row in rows:
+            ws.append(row)
+    buf = io.BytesIO()
+    wb.save(buf)
+    buf.seek(0)
+
+    async def batches():
+        for item in iter_xlsx_batches(buf, batch_size=2):
+            yield item
+
+    async def collect():
+        return [event async for event in import_rows(batches(), batch_size=2)]
+
+    return asyncio.run(collect())
+
+
+class TestExcelImport:
+    """Tests for the read-only .xlsx import path."""
+
+    HEADER = ["name", "display_name", "unit", "category", "section"]
+
+    def test_every_sheet_imported(self):
+        events = run_xlsx_import({
+            "Boiler": [self.HEADER, ["coal_feed", "Coal Feed", "TPH", "input", "BOILER"],
+                       ["eff", "Efficiency", "%", "calculated", "BOILER"]],
+            "Turbine": [self.HEADER, ["speed", "Speed", 3000, "input", "TURBINE"]],
+        })
+        params = [p for e in events if "parameters" in e for p in e["parameters"]]
+        assert [p["name"] for p in params] == ["coal_feed", "eff", "speed"]
+        assert params[2]["unit"] == "3000"
+        assert events[-1]["summary"]["count"] == 3
+
+    def test_errors_name_the_sheet(self):
+        events = run_xlsx_import({
+            "Boiler": [self.HEADER, [None, "No Name", "%", "input", "BOILER"]],
+            "Notes": [["free text"]],
+            "Turbine": [self.HEADER, ["speed", "Speed", "RPM", "input", "TURBINE"]],
+        })
+        errors = [err for e in events if "errors" in e for err in e["errors"]]
+        assert errors[0] == "[Boiler] Row 2: missing name"
+        assert errors[1].startswith("[Notes] Missing required columns")
+        assert events[-1]["summary"] == {"count": 1, "error_count": 2, "rows": 2}
+
+    def test_no_usable_sheet(self):
+        with pytest.raises(ParameterImportError, match="Missing required columns"):
+            run_xlsx_import({"Notes": [["free text"]]})
+
+    def test_not_a_workbook(self):
+        import io
+        with pytest.raises(ParameterImportError, match="Could not read workbook"):
+            list(iter_xlsx_batches(io.BytesIO(b"not a zip")))
+
+
+# ════════════════════════════════════════════════════════════════
+# Import Merge Tests
+# ════════════════════════════════════════════════════════════════
+
+def imported(name: str, display_name: str = "", unit: str = "TPH", category: str = "input",
+             section: str = "BOILER") -> dict:
+    return {"name": name, "display_name": display_name or name, "unit": unit, "category": category,
+            "section": section, "applicable_asset_types": [], "enabled": True}
+
+
+class TestImportMerge:
+    """Tests for import deduplication and atomic merges into the registry."""
+
+    @pytest.fixture
+    def registry(self, tmp_path):
+        path = tmp_path / "parameter_registry.json"
+        path.write_text(json.dumps([
+            {"name": "coal", "display_name": "coal", "unit": "TPH", "category": "input",
+             "section": "BOILER", "applicable_asset_types": ["boiler"]},
+            {"name": "steam", "display_name": "steam", "unit": "TPH", "category": "output",
+             "section": "BOILER", "applicable_asset_types": ["boiler"]},
+        ]))
+        return ParameterRegistry(path)
+
+    def test_classifies_rows(self, registry):
+        merger = ImportMerger(registry)
+        first = merger.classify([imported("coal"), imported("steam", unit="kg/s"), imported("feed")])
+        second = merger.classify([imported("feed"), imported("coal", section="MISC"), imported("aux")])
+        assert first["identical"] == 1
+        assert [p["name"] for p in first["add"]] == ["feed"]
+        assert "enabled" not in first["add"][0]
+        [conflict] = first["conflicts"]
+        assert conflict["name"] == "steam" and conflict["fields"] == ["unit", "category"]
+        assert conflict["existing"]["unit"] == "TPH" and conflict["incoming"]["unit"] == "kg/s"
+        # Repeats are checked against the first row with the name, across batches
+        assert second["duplicates"] == [{"name": "feed", "fields": []},
+                                        {"name": "coal", "fields": ["section"]}]
+        assert merger.totals == {"new": 2, "identical": 1, "conflict": 1, "duplicate": 2}
+
+    def test_apply_plan(self, registry):
+        merger = ImportMerger(registry)
+        plan = merger.classify([imported("steam", unit="kg/s", category="output"), imported("feed")])
+        result = apply_merge_plan(plan["add"], plan["conflicts"], ["steam"], registry)
+        assert result == {"added": 1, "replaced": 1, "unchanged": 0, "count": 3}
+        steam = registry.get("steam")
+        assert steam["unit"] == "kg/s" and steam["applicable_asset_types"] == ["boiler"]
+        assert registry.get("feed")["section"] == "BOILER"
+        assert not list(registry.path.parent.glob("*.tmp"))
+        # Conflicts not named in `replace` keep the registry's fields
+        plan = ImportMerger(registry).classify([imported("coal", unit="MT")])
+        assert apply_merge_plan([], plan["conflicts"], [], registry)["unchanged"] == 1
+        assert registry.get("coal")["unit"] == "TPH"
+
+    def test_rebuilds_snapshot(self, registry):
+        build_snapshot(registry.path)
+        apply_merge_plan([imported("feed")], [], [], registry)
+        assert load_fresh(registry.path) is not None
+        assert registry.get("feed") is not None
+
+    def test_stale_plan_writes_nothing(self, registry):
+        from app.services.import_merge import MergePlanConflict
+        one = ImportMerger(registry).classify([imported("feed"), imported("steam", unit="kg/s")])
+        two = ImportMerger(registry).classify([imported("feed", unit="MT"), imported("aux"),
+                                               imported("steam", unit="t/h")])
+        apply_merge_plan(one["add"], one["conflicts"], ["steam"], registry)
+        before = registry.path.read_bytes()
+        with pytest.raises(MergePlanConflict) as e:
+            apply_merge_plan(two["add"], two["conflicts"], ["steam"], registry)
+        assert e.value.names == ["feed", "steam"]
+        assert registry.path.read_bytes() == before
+        # Plans over different names merge concurrently without conflict
+        three = ImportMerger(registry).classify([imported("aux")])
+        assert apply_merge_plan(three["add"], [], [], registry)["added"] == 1
+        assert apply_merge_plan(two["add"][1:], [], [], registry)["unchanged"] == 1  # aux now identical
+
+    def test_replace_must_name_a_conflict(self, registry):
+        with pytest.raises(ValueError, match="Not a conflict"):
+            apply_merge_plan([], [], ["coal"], registry)
+
+
+# ════════════════════════════════════════════════════════════════
+# CPU Pool Tests
+# ════════════════════════════════════════════════════════════════
+
+class TestCpuPool:
+    """Tests for the bounded process pool (real worker processes)."""
+
+    def test_runs_job_in_worker_process(self):
+        import anyio
+        pool = CpuPool(workers=1)
+        try:
+            assert anyio.run(pool.run, os.getpid) != os.getpid()
+            formulas = [{"parameter_name": "b", "expression": "a * 2"}]
+            assert anyio.run(pool.run, validate_formulas, formulas, ["a", "b"]) == validate_formulas(formulas, ["a", "b"])
+        finally:
+            pool.shutdown()
+
+    def test_job_timeout(self):
+        import anyio
+        import time
+        pool = CpuPool(workers=1, timeout=0.2)
+        try:
+            with pytest.raises(JobTimeout):
+                anyio.run(pool.run, time.sleep, 5)
+            assert anyio.run(pool.run, abs, -3) == 3  # worker still usable
+        finally:
+            pool.shutdown()
+
+    def test_backpressure_rejects_when_full(self):
+        import anyio
+        import time
+        pool = CpuPool(workers=1, max_jobs=1, wait=0.1)
+        outcomes = []
+
+        async def job():
+            try:
+                await pool.run(time.sleep, 1)
+                outcomes.append("ok")
+            except PoolBusy:
+                outcomes.append("busy")
+
+        async def main():
+            async with anyio.create_task_group() as tg:
+                tg.start_soon(job)
+                tg.start_soon(job)
+
+        try:
+            anyio.run(main)
+        finally:
+            pool.shutdown()
+        assert sorted(outcomes) == ["busy", "ok"]
+
+
+# ════════════════════════════════════════════════════════════════
+# Template Store Tests
+# ════════════════════════════════════════════════════════════════
+
+class TestTemplateStore:
+    """Tests for the indexed template store."""
+
+    def test_save_get_delete(self, tmp_path):
+        store = TemplateStore(tmp_path)
+        template_id = store.save("Cooling Plant", "Water focus", {"assets": []})
+        assert template_id == "cooling_plant"
+        assert store.get(template_id)["config"] == {"assets": []}
+        assert store.delete(template_id) is True
+        assert store.get(template_id) is None
+        assert store.delete(template_id) is False
+
+    def test_index_writers_across_stores(self, tmp_path):
+        import threading
+        # Two stores on one directory stand in for two worker processes
+        stores = [TemplateStore(tmp_path), TemplateStore(tmp_path)]
+
+        def save_many(store, prefix):
+            for i in range(20):
+                store.save(f"{prefix} {i}", "", {})
+
+        threads = [threading.Thread(target=save_many, args=(store, f"w{n}")) for n, store in enumerate(stores)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert stores[0].list()[1] == stores[1].list()[1] == 40
+        assert TemplateStore(tmp_path).list()[1] == 40
+
+    def test_ids_are_reachable_slugs(self, tmp_path):
+        store = TemplateStore(tmp_path)
+        template_id = store.save("Café Plant #2", "", {})
+        assert template_id == "cafe_plant_2"
+        assert store.get(template_id) is not None
+        assert store.delete(template_id) is True
+        with pytest.raises(ValueError, match="letter or digit"):
+            store.save("!!!", "", {})
+        assert not (tmp_path / ".json").exists()
+
+    def test_listing_reads_index_only(self, tmp_path):
+        store = TemplateStore(tmp_path)
+        store.save("Big", "Huge config", {"parameters": list(range(1000))})
+        (tmp_path / "big.json").write_text("corrupted")
+        templates, total = store.list()
+        assert total == 1
+        assert templates[0]["name"] == "Big"
+        assert "config" not in templates[0]
+
+    def test_search_and_pagination(self, tmp_path):
+        store = TemplateStore(tmp_path)
+        for i in range(5):
+            store.save(f"Power Plant {i}", "coal fired", {})
+        store.save("Cooling Tower", "water", {})
+
+        page, total = store.list("power", offset=1, limit=2)
+        assert total == 5
+        assert len(page) == 2
+        assert store.list("WATER")[1] == 1
+
+    def test_index_rebuilt_when_missing(self, tmp_path):
+        import json
+        (tmp_path / "legacy.json").write_text(json.dumps({"name": "Legacy", "config": {}}))
+        templates, total = TemplateStore(tmp_path).list()
+        assert total == 1 and templates[0]["id"] == "legacy"
+
+    def test_index_shared_between_instances(self, tmp_path):
+        a, b = TemplateStore(tmp_path), TemplateStore(tmp_path)
+        assert b.list()[1] == 0
+        a.save("Shared", "", {})
+        assert b.list()[1] == 1
+
+    def test_rejects_path_traversal(self, tmp_path):
+        store = TemplateStore(tmp_path / "templates")
+        (tmp_path / "secret.json").write_text("{}")
+        assert store.get("../secret") is None
+        assert store.delete("../secret") is False
+
+    def test_async_concurrent_saves_never_tear(self, tmp_path):
+        import anyio
+        import json
+        store = AsyncTemplateStore(TemplateStore(tmp_path), concurrency=8)
+
+        async def main():
+            async with anyio.create_task_group() as tg:
+                for i in range(20):
+                    tg.start_soon(store.save, "Same", f"writer {i}", {"payload": "x" * 10_000, "i": i})
+            return await store.get("same")
+
+        data = anyio.run(main)
+        assert data["config"]["payload"] == "x" * 10_000
+        assert not list(tmp_path.glob("*.tmp"))
+        json.loads((tmp_path / "same.json").read_text())
+
+    def test_async_parallel_rebuild(self, tmp_path):
+        import anyio
+        import json
+        for i in range(30):
+            (tmp_path / f"t{i}.json").write_text(json.dumps({"name": f"T{i}", "config": {}}))
+        (tmp_path / "broken.json").write_text("{")
+        store = AsyncTemplateStore(TemplateStore(tmp_path))
+
+        templates, total = anyio.run(store.list)
+        assert total == 30
+        assert anyio.run(store.get, "missing") is None
+
+    def test_cache_hits_until_file_changes(self, tmp_path):
+        import json
+        store = TemplateStore(tmp_path)
+        store.save("Cached", "", {"v": 1})
+        first = store.get("cached")
+        assert store.get("cached") is first
+        assert store.cache.stats == {"hit": 1, "miss": 1, "eviction": 0}
+
+        # Edited outside the store: new mtime/size means a fresh parse
+        (tmp_path / "cached.json").write_text(json.dumps({**first, "config": {"v": 22}}))
+        assert store.get("cached")["config"] == {"v": 22}
+
+    def test_cache_invalidated_on_save_and_delete(self, tmp_path):
+        store = TemplateStore(tmp_path)
+        store.save("Cached", "", {"v": 1})
+        store.get("cached")
+        store.save("Cached", "", {"v": 2})
+        assert store.get("cached")["config"] == {"v": 2}
+        store.delete("cached")
+        assert store.get("cached") is None
+
+    def test_cache_evicts_least_recently_used(self, tmp_path):
+        store = TemplateStore(tmp_path)
+        store.cache = TemplateCache(max_entries=2)
+        for name in ("a", "b", "c"):
+            store.save(name, "", {})
+        store.get("a"), store.get("b"), store.get("a"), store.get("c")
+        assert store.cache.stats["eviction"] == 1
+        store.get("a")
+        assert store.cache.stats["hit"] == 2  # "b" was evicted, "a" survived
+
+    def test_patch_bumps_version_and_records_delta(self, tmp_path):
+        store = TemplateStore(tmp_path)
+        store.save("Plant", "", {"parameters": [{"name": "a", "enabled": True}]})
+        before = store.get("plant")
+        result = store.patch("plant", [{"op": "replace", "path": "/parameters/0/enabled", "value": False}])
+        assert result == {"id": "plant", "version": 2}
+        assert store.get("plant")["config"]["parameters"][0]["enabled"] is False
+        assert before["config"]["parameters"][0]["enabled"] is True  # cached copy untouched
+        store.patch("plant", {"plant": {"name": "X"}})
+
+        changes = store.changes_since("plant", 1)
+        assert [c["version"] for c in changes["changes"]] == [2, 3]
+        assert [c["format"] for c in changes["changes"]] == ["json-patch", "merge-patch"]
+        assert store.changes_since("plant", 3)["changes"] == []
+        assert store.list()[0][0]["version"] == 3
+
+    def test_patch_history_resets_on_save(self, tmp_path):
+        store = TemplateStore(tmp_path)
+        store.save("Plant", "", {})
+        store.patch("plant", {"a": 1})
+        store.save("Plant", "", {"b": 2})
+        assert store.get("plant")["version"] == 3
+        with pytest.raises(TemplateHistoryUnavailable):
+            store.changes_since("plant", 1)
+
+    def test_patch_rejects_stale_version(self, tmp_path):
+        store = TemplateStore(tmp_path)
+        store.save("Plant", "", {})
+        stale = store.file_version("plant")
+        store.patch("plant", {"a": 1})
+        with pytest.raises(TemplateVersionMismatch):
+            store.patch("plant", {"a": 2}, expected_version=stale)
+        assert store.patch("missing", {"a": 1}) is None
+
+    def test_concurrent_patches_are_serialized(self, tmp_path):
+        from concurrent.futures import ThreadPoolExecutor
+        store = TemplateStore(tmp_path)
+        store.save("Plant", "", {"items": []})
+        with ThreadPoolExecutor(8) as pool:
+            list(pool.map(lambda i: store.patch("plant", [{"op": "add", "path": "/items/-", "value": i}]), range(40)))
+        data = TemplateStore(tmp_path).get("plant")
+        assert sorted(data["config"]["items"]) == list(range(40))
+        assert data["version"] == 41
+
+    def test_concurrent_saves_and_patches_keep_every_bump(self, tmp_path):
+        from concurrent.futures import ThreadPoolExecutor
+        store = TemplateStore(tmp_path)
+        store.save("Plant", "", {})
+
+        def write(i):
+            if i % 2:
+                store.save("Plant", "", {"i": i})
+            else:
+                store.patch("plant", {"i": i})
+
+        with ThreadPoolExecutor(8) as pool:
+            list(pool.map(write, range(40)))
+        assert TemplateStore(tmp_path).get("plant")["version"] == 41
+        assert store.list()[0][0]["version"] == 41
+
+
+# ════════════════════════════════════════════════════════════════
+# JSON Patch Tests
+# ════════════════════════════════════════════════════════════════
+
+class TestJsonPatch:
+    """Tests for JSON Patch and merge-patch application."""
+
+    def test_operations(self):
+        doc = {"a": {"b": 1}, "list": [1, 2, 3], "x~y/z": 0}
+        result = apply_json_patch(doc, [
+            {"op": "add", "path": "/list/-", "value": 4},
+            {"op": "remove", "path": "/list/0"},
+            {"op": "replace", "path": "/a/b", "value": 2},
+            {"op": "copy", "from": "/a", "path": "/c"},
+            {"op": "move", "from": "/x~0y~1z", "path": "/moved"},
+            {"op": "test", "path": "/moved", "value": 0},
+        ])
+        assert result == {"a": {"b": 2}, "c": {"b": 2}, "list": [2, 3, 4], "moved": 0}
+        assert doc == {"a": {"b": 1}, "list": [1, 2, 3], "x~y/z": 0}
+
+    def test_only_copies_touched_path(self):
+        doc = {"big": [{"v": i} for i in range(100)], "other": {"k": 1}}
+        result = apply_json_patch(doc, [{"op": "replace", "path": "/big/5/v", "value": -1}])
+        assert result["other"] is doc["other"]
+        assert result["big"][6] is doc["big"][6]
+        assert doc["big"][5]["v"] == 5
+
+    @pytest.mark.parametrize("actual, expected", [
+        (1, True), (0, False), (True, 1.0), ([1, 0], [True, False]), ({"k": 1}, {"k": True}), (1, "1"), (None, False),
+    ])
+    def test_test_op_keeps_json_types_apart(self, actual, expected):
+        with pytest.raises(PatchTestFailed):
+            apply_json_patch({"a": actual}, [{"op": "test", "path": "/a", "value": expected}])
+
+    def test_test_op_compares_numbers_by_value(self):
+        doc = {"a": [1, {"b": 2.0, "c": True}]}
+        assert apply_json_patch(doc, [{"op": "test", "path": "/a", "value": [1.0, {"b": 2, "c": True}]}]) is doc
+
+    def test_errors(self):
+        with pytest.raises(PatchTestFailed):
+            apply_json_patch({"a": 1}, [{"op": "test", "path": "/a", "value": 2}])
+        for ops in ([{"op": "remove", "path": "/missing"}], [{"op": "add", "path": "/l/9", "value": 1}],
+                    [{"op": "frobnicate", "path": "/a"}], {"op": "add"},
+                    [{"op": "remove", "path": 5}], [{"op": "copy", "from": None, "path": "/x"}],
+                    [{"op": "remove", "path": "/l/\u00b2"}]):
+            with pytest.raises(PatchError):
+                apply_json_patch({"l": []}, ops)
+
+    def test_merge_patch(self):
+        doc = {"a": {"b": 1, "c": 2}, "d": [1]}
+        assert apply_merge_patch(doc, {"a": {"b": None, "e": 3}, "d": [2]}) == {"a": {"c": 2, "e": 3}, "d": [2]}
+        assert doc == {"a": {"b": 1, "c": 2}, "d": [1]}
+        assert apply_patch({"a": 1}, [{"op": "remove", "path": "/a"}]) == {}
+        assert apply_patch({"a": 1}, {"a": None}) == {}
+
+
+# ════════════════════════════════════════════════════════════════
+# Onboarding Store Tests
+# ════════════════════════════════════════════════════════════════
+
+def make_payload(name: str) -> dict:
+    return {
+        "plant": {"name": name, "address": "Mumbai", "manager_email": "ops@plant.com", "description": ""},
+        "assets": [{"name": "b1", "display_name": "Boiler 1", "asset_type": "boiler"}],
+        "parameters": [
+            {"name": "coal_consumption", "display_name": "Coal", "unit": "MT", "category": "input",
+             "section": "BOILER", "enabled": True},
+            {"name": "boiler_efficiency", "display_name": "Eff", "unit": "%", "category": "calculated",
+             "section": "BOILER", "enabled": False},
+        ],
+        "formulas": [{"parameter_name": "boiler_efficiency", "expression": "coal_consumption * 2",
+                      "depends_on": ["coal_consumption"]}],
+    }
+
+
+class TestOnboardingStore:
+    """Tests for the SQLite onboarding store."""
+
+    def test_round_trip(self, tmp_path):
+        store = OnboardingStore(tmp_path / "onboarding.db")
+        plant = store.save(make_payload("Plant A"))
+        stored = store.get_plant(plant["id"])
+        payload = make_payload("Plant A")
+
+        assert stored["plant"] == payload["plant"]
+        assert stored["assets"] == payload["assets"]
+        assert stored["parameters"] == payload["parameters"]
+        assert stored["formulas"] == payload["formulas"]
+
+    def test_missing_plant(self, tmp_path):
+        assert OnboardingStore(tmp_path / "onboarding.db").get_plant(42) is None
+
+    def test_paging(self, tmp_path):
+        store = OnboardingStore(tmp_path / "onboarding.db")
+        for i in range(5):
+            store.save(make_payload(f"Plant {i}"))
+        page, total = store.list_plants(offset=1, limit=2)
+        assert total == 5
+        assert [p["name"] for p in page] == ["Plant 3", "Plant 2"]
+        assert page[0]["num_parameters"] == 2
+
+    def test_failed_save_rolls_back(self, tmp_path):
+        store = OnboardingStore(tmp_path / "onboarding.db")
+        payload = make_payload("Broken")
+        del payload["assets"][0]["asset_type"]
+        with pytest.raises(KeyError):
+            store.save(payload)
+        assert store.list_plants()[1] == 0
+
+    def test_concurrent_submissions(self, tmp_path):
+        from concurrent.futures import ThreadPoolExecutor
+        store = OnboardingStore(tmp_path / "onboarding.db", pool_size=4)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            ids = list(pool.map(lambda i: store.save(make_payload(f"P{i}"))["id"], range(40)))
+        assert len(set(ids)) == 40
+        assert store.list_plants()[1] == 40
+
+
+# ════════════════════════════════════════════════════════════════
+# Readings Ingestion Tests
+# ════════════════════════════════════════════════════════════════
+
+READINGS_PLANT = {
+    "id": 7,
+    "assets": [{"name": "b1", "display_name": "Boiler 1", "asset_type": "boiler"}],
+    "parameters": [
+        {"name": n, "display_name": n, "unit": u, "category": c, "section": sec, "enabled": e}
+        for n, u, c, sec, e in [
+            ("steam_generation", "TPH", "input", "BOILER", True),
+            ("coal_consumption", "MT", "input", "BOILER", True),
+            ("power_generation", "MW", "output", "TURBINE", True),
+            ("auxiliary_power", "MW", "input", "TURBINE", False),
+            ("boiler_efficiency", "%", "calculated", "BOILER", True),
+        ]
+    ],
+    "formulas": [{"parameter_name": "boiler_efficiency",
+                  "expression": "steam_generation / coal_consumption * 100", "depends_on": []}],
+}
+
+
+def run_ingest(body: bytes, store, csv_format: bool = False, flush_rows: int = 1000, chunk_size: int = 13,
+               rollups=None) -> dict:
+    import asyncio
+
+    async def chunks():
+        for i in range(0, len(body), chunk_size):
+            yield body[i:i + chunk_size]
+
+    model = PlantModel(READINGS_PLANT)
+    return asyncio.run(ingest_readings(model, chunks(), csv_format, store=store, rollups=rollups,
+                                       flush_rows=flush_rows))
+
+
+def stored_series(store, plant_id: int = 7) -> dict[tuple[str, str], list[tuple[int, float]]]:
+    series: dict[tuple[str, str], list[tuple[int, float]]] = {}
+    for asset, parameter, ts, values in store.scan(plant_id):
+        series.setdefault((asset, parameter), []).extend(zip(ts.tolist(), values.tolist()))
+    return series
+
+
+class TestReadingsIngest:
+    """Tests for columnar readings ingestion and the append-only readings log."""
+
+    def test_timestamps(self):
+        assert timestamp_ms(1714557600) == 1714557600000
+        assert timestamp_ms("1714557600.5") == 1714557600500
+        assert timestamp_ms("2024-05-01T10:00:00Z") == 1714557600000
+        assert timestamp_ms("2024-05-01T10:00:00") == 1714557600000
+        assert timestamp_ms("2024-05-01T15:30:00+05:30") == 1714557600000
+        for bad in ("yesterday", None, True, float("nan"), 1e20, "-1e20", "1e307", 1e307, 10**400):
+            with pytest.raises(ValueError):
+                timestamp_ms(bad)
+
+    def test_out_of_range_timestamps_rejected(self, tmp_path):
+        ndjson = b'{"timestamp": 1e20, "steam_generation": 1}\n{"timestamp": 0, "steam_generation": 2}\n'
+        csv = b"timestamp,steam_generation\n1e20,1\n0,2\n"
+        for body, csv_format in ((ndjson, False), (csv, True)):
+            summary = run_ingest(body, ReadingsStore(tmp_path / str(csv_format)), csv_format=csv_format)
+            assert summary["readings"] == 1 and summary["rejected"] == 1
+
+    def test_huge_integers_rejected(self, tmp_path):
+        big = "1" + "0" * 400
+        body = (f'{{"timestamp": {big}, "steam_generation": 1}}\n'
+                f'{{"timestamp": 0, "steam_generation": {big}, "coal_consumption": 2}}\n').encode()
+        summary = run_ingest(body, ReadingsStore(tmp_path))
+        assert summary["readings"] == 1 and summary["rejected"] == 2
+
+    def test_ndjson_with_calculated(self, tmp_path):
+        store = ReadingsStore(tmp_path)
+        lines = [
+            {"timestamp": 0, "asset": "b1", "steam_generation": 90, "coal_consumption": 100},
+            {"timestamp": 60, "steam_generation": 50, "power_generation": 12.5},
+            {"timestamp": 120, "asset": "b1", "steam_generation": 10, "coal_consumption": 0},
+        ]
+        summary = run_ingest("\n".join(json.dumps(line) for line in lines).encode(), store)
+        assert summary["rows"] == 3 and summary["readings"] == 6 and summary["rejected"] == 0
+        # Row 2 lacks coal_consumption and row 3 divides by zero: no efficiency for them
+        assert summary["calculated"] == 1
+        series = stored_series(store)
+        assert series[("b1", "boiler_efficiency")] == [(0, 90.0)]
+        assert series[("", "steam_generation")] == [(60000, 50.0)]
+        assert series[("b1", "steam_generation")] == [(0, 90.0), (120000, 10.0)]
+
+    def test_rejections(self, tmp_path):
+        body = "\n".join([
+            '{"timestamp": 0, "steam_generation": "high", "auxiliary_power": 1}',
+            '{"timestamp": 0, "boiler_efficiency": 50}',
+            '{"timestamp": "soon", "steam_generation": 1}',
+            '{"timestamp": 0, "asset": "b9", "steam_generation": 1}',
+            "not json",
+            "",
+            '{"timestamp": 0, "coal_consumption": 2}',
+        ]).encode()
+        summary = run_ingest(body, ReadingsStore(tmp_path))
+        assert summary["readings"] == 1
+        assert summary["rejected"] == 6
+        assert any("calculated" in e for e in summary["errors"])
+        assert any("disabled" in e for e in summary["errors"])
+        assert "Line 5: not a JSON object" in summary["errors"]
+
+    def test_csv_matches_ndjson(self, tmp_path):
+        rows = [(i * 60, "b1" if i % 2 else "", 100 + i, 50 + i) for i in range(50)]
+        csv_body = "timestamp,asset,steam_generation,coal_consumption\n" + "".join(
+            f"{t},{a},{s},{c}\n" for t, a, s, c in rows)
+        ndjson_body = "".join(json.dumps({"timestamp": t, "asset": a, "steam_generation": s,
+                                          "coal_consumption": c}) + "\n" for t, a, s, c in rows)
+        csv_store, ndjson_store = ReadingsStore(tmp_path / "csv"), ReadingsStore(tmp_path / "ndjson")
+        csv_summary = run_ingest(csv_body.encode(), csv_store, csv_format=True)
+        ndjson_summary = run_ingest(ndjson_body.encode(), ndjson_store)
+        assert csv_summary["readings"] == ndjson_summary["readings"] == 100
+        assert stored_series(csv_store) == stored_series(ndjson_store)
+
+    def test_csv_header_and_bad_cells(self, tmp_path):
+        body = b"timestamp,steam_generation,bogus\n0,1,2\n60,,3\n120,x,\nsoon,4,\n1,2\n180,inf,\n"
+        summary = run_ingest(body, ReadingsStore(tmp_path), csv_format=True)
+        assert summary["rows"] == 4
+        assert summary["readings"] == 1
+        assert summary["rejected"] == 6  # 2 bogus, "x", "inf", 1 behind a bad timestamp, 1 short row
+        with pytest.raises(ReadingsFormatError):
+            run_ingest(b"time,steam_generation\n0,1\n", ReadingsStore(tmp_path), csv_format=True)
+
+    def test_flushes_in_chunks(self, tmp_path):
+        store = ReadingsStore(tmp_path)
+        body = "".join(json.dumps({"timestamp": i, "steam_generation": i}) + "\n" for i in range(250))
+        summary = run_ingest(body.encode(), store, flush_rows=100, chunk_size=512)
+        assert summary["chunks"] == 3
+        assert [v for _, v in stored_series(store)[("", "steam_generation")]] == list(range(250))
+
+    def test_partial_chunk_ignored(self, tmp_path):
+        import numpy as np
+        store = ReadingsStore(tmp_path)
+        store.append(1, [("", "a", np.array([1, 2]), np.array([1.0, 2.0]))])
+        store.append(1, [("", "a", np.array([3]), np.array([3.0]))])
+        path = store.path_for(1)
+        path.write_bytes(path.read_bytes()[:-4])  # a writer died mid-append
+        assert [ts.tolist() for _, _, ts, _ in store.scan(1)] == [[1, 2]]
+        assert list(store.scan(2)) == []
+
+
+# ════════════════════════════════════════════════════════════════
+# Readings Rollup Tests
+# ════════════════════════════════════════════════════════════════
+
+HOUR_MS = 3_600_000
+
+
+class TestRollups:
+    """Tests for hour/day rollups and aggregate queries."""
+
+    def test_bucket_aggregates(self):
+        import numpy as np
+        ts = np.array([HOUR_MS + 5, 10, HOUR_MS, 0])  # out of order
+        buckets, counts, sums, mins, maxs = bucket_aggregates(ts, np.array([4.0, 2.0, 3.0, 1.0]), HOUR_MS)
+        assert buckets.tolist() == [0, HOUR_MS]
+        assert counts.tolist() == [2, 2]
+        assert sums.tolist() == [3.0, 7.0]
+        assert mins.tolist() == [1.0, 3.0] and maxs.tolist() == [2.0, 4.0]
+
+    def test_query_merges_assets(self, tmp_path):
+        import numpy as np
+        rollups = RollupStore(tmp_path / "rollups.db")
+        ts = np.array([0, 60_000, HOUR_MS])
+        rollups.add(1, [("a", "p", ts, np.array([1.0, 2.0, 3.0])),
+                        ("b", "p", ts[:1], np.array([9.0]))])
+        [plant] = rollups.query(1, "hour", ["p", "missing"])
+        assert plant == {"parameter": "p", "timestamps": [0, HOUR_MS], "count": [3, 1],
+                         "sum": [12.0, 3.0], "min": [1.0, 3.0], "max": [9.0, 3.0], "avg": [4.0, 3.0]}
+        [asset_b] = rollups.query(1, "hour", ["p"], asset="b", aggregates=("max",))
+        assert asset_b == {"parameter": "p", "timestamps": [0], "max": [9.0]}
+        [day] = rollups.query(1, "day", ["p"])
+        assert day["count"] == [4] and day["sum"] == [15.0]
+        assert rollups.query(2, "hour", ["p"]) == []
+
+    def test_range_filter_across_partitions(self, tmp_path):
+        import numpy as np
+        rollups = RollupStore(tmp_path / "rollups.db")
+        hours = np.arange(1000)  # spans several partitions
+        rollups.add(1, [("", "p", hours * HOUR_MS, hours.astype(float))])
+        [s] = rollups.query(1, "hour", ["p"], start=250 * HOUR_MS + 1, end=600 * HOUR_MS)
+        # start is rounded down to its bucket; end is exclusive
+        assert s["timestamps"] == [h * HOUR_MS for h in range(250, 600)]
+        assert s["avg"] == [float(h) for h in range(250, 600)]
+
+    def test_incremental_matches_rebuild(self, tmp_path):
+        import numpy as np
+        rng = np.random.default_rng(1)
+        readings = ReadingsStore(tmp_path / "log")
+        incremental = RollupStore(tmp_path / "incremental.db")
+        for _ in range(5):  # late and overlapping chunks
+            chunk = [(asset, "p", np.sort(rng.integers(0, 3 * 86_400_000, 200)), rng.uniform(0, 10, 200))
+                     for asset in ("a", "b")]
+            readings.append(1, chunk)
+            incremental.add(1, chunk)
+        rebuilt = RollupStore(tmp_path / "rebuilt.db")
+        assert readings.plant_ids() == [1]
+        assert rebuilt.rebuild(1, readings) == 2000
+        for tier in ("hour", "day"):
+            for asset in (None, "a"):
+                [got] = incremental.query(1, tier, ["p"], asset=asset)
+                [want] = rebuilt.query(1, tier, ["p"], asset=asset)
+                assert got["timestamps"] == want["timestamps"] and got["count"] == want["count"]
+                assert got["min"] == want["min"] and got["max"] == want["max"]
+                assert np.allclose(got["sum"], want["sum"])
+        assert sum(incremental.query(1, "day", ["p"])[0]["count"]) == 2000
+
+    def test_ingest_updates_rollups(self, tmp_path):
+        rollups = RollupStore(tmp_path / "rollups.db")
+        body = "".join(json.dumps({"timestamp": i * 600, "asset": "b1", "steam_generation": 80,
+                                   "coal_consumption": 100}) + "\n" for i in range(12))
+        run_ingest(body.encode(), ReadingsStore(tmp_path), flush_rows=5, rollups=rollups)
+        series = {s["parameter"]: s for s in rollups.query(7, "hour", ["steam_generation", "boiler_efficiency"])}
+        assert series["steam_generation"]["count"] == [6, 6]
+        assert series["boiler_efficiency"]["avg"] == [80.0, 80.0]
+
+
+# ════════════════════════════════════════════════════════════════
+# HTTP Caching Tests
+# ════════════════════════════════════════════════════════════════
+
+def make_request(headers: dict[str, str]):
+    from starlette.requests import Request
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+    })
+
+
+class TestHTTPCache:
+    """Tests for ETag generation and If-None-Match handling."""
+
+    def test_etag_stable_and_parameter_sensitive(self):
+        assert make_etag("v1", "boiler") == make_etag("v1", "boiler")
+        assert make_etag("v1", "boiler") != make_etag("v1", "turbine")
+        assert make_etag("v1") != make_etag("v2")
+
+    def test_matching_etag_gives_304(self):
+        etag = make_etag("v1")
+        response = not_modified(make_request({"If-None-Match": etag}), etag, "no-cache")
+        assert response.status_code == 304
+        assert response.headers["etag"] == etag
+
+    def test_weak_list_and_star(self):
+        etag = make_etag("v1")
+        assert not_modified(make_request({"If-None-Match": f'"other", W/{etag}'}), etag, "no-cache")
+        assert not_modified(make_request({"If-None-Match": "*"}), etag, "no-cache")
+
+    def test_stale_or_missing_etag(self):
+        etag = make_etag("v1")
+        assert not_modified(make_request({"If-None-Match": make_etag("v0")}), etag, "no-cache") is None
+        assert not_modified(make_request({}), etag, "no-cache") is None
+
+    def test_registry_digest_tracks_content(self, tmp_path):
+        import json
+        path = tmp_path / "registry.json"
+        path.write_text(json.dumps([]))
+        registry = ParameterRegistry(path)
+        registry.refresh()
+        first = registry.digest
+        path.write_text(json.dumps([{"name": "a", "category": "input", "section": "S"}]))
+        os.utime(path, (path.stat().st_atime, path.stat().st_mtime + 10))
+        registry.refresh()
+        assert registry.digest != first
+
+    def test_registry_state_pins_body_to_digest(self, tmp_path):
+        import json
+        path = tmp_path / "registry.json"
+        path.write_text(json.dumps([]))
+        registry = ParameterRegistry(path)
+        pinned = registry.current()
+        path.write_text(json.dumps([{"name": "a", "category": "input", "section": "S"}]))
+        os.utime(path, (path.stat().st_atime, path.stat().st_mtime + 10))
+        assert registry.current().digest != pinned.digest and registry.version == pinned.version + 1
+        # A request that read the old digest keeps answering from the old load
+        assert registry.all(pinned) == [] and len(registry.all()) == 1
+
+    def test_template_versions_change_on_save(self, tmp_path):
+        store = TemplateStore(tmp_path)
+        before = store.index_digest()
+        store.save("A", "", {})
+        assert store.index_digest() != before
+        assert store.file_version("a") is not None
+        assert store.file_version("missing") is None
+
+    def test_negotiate_encoding(self):
+        assert negotiate_encoding("gzip, deflate") in ("gzip", "br")
+        assert negotiate_encoding("identity") is None
+        assert negotiate_encoding("gzip;q=0") is None
+        assert negotiate_encoding("") is None
+
+    def test_encoded_body_compresses_once(self):
+        import gzip
+        body = EncodedBody(b'{"x": "' + b"a" * 5000 + b'"}')
+        compressed = body.get("gzip")
+        assert body.get("gzip") is compressed
+        assert gzip.decompress(compressed) == body.identity
+        assert EncodedBody(b"{}").get("gzip") == b"{}"  # too small to bother
+
+    def test_encoded_body_cache_builds_once_per_key(self):
+        cache = EncodedBodyCache(max_entries=2)
+        calls = []
+        build = lambda: calls.append(1) or b"[]"
+        cache.get(("v1", "a"), build)
+        cache.get(("v1", "a"), build)
+        assert len(calls) == 1
+        cache.get(("v1", "b"), build)
+        cache.get(("v1", "c"), build)
+        cache.get(("v1", "a"), build)  # evicted, rebuilt
+        assert len(calls) == 4
+
+    def test_fast_json_response(self):
+        import gzip
+        content = {"values": list(range(1000))}
+        response = fast_json_response(make_request({"accept-encoding": "gzip"}), content)
+        assert response.headers["content-encoding"] == "gzip"
+        assert json.loads(gzip.decompress(response.body)) == content
+        plain = fast_json_response(make_request({}), content)
+        assert "content-encoding" not in plain.headers
+        assert json.loads(plain.body) == content
+
+
+# ════════════════════════════════════════════════════════════════
+# Metrics Tests
+# ════════════════════════════════════════════════════════════════
+
+class TestMetrics:
+    """Tests for the in-process metrics and Prometheus text output."""
+
+    def test_histogram_buckets_are_cumulative(self):
+        h = Histogram("latency_seconds", "Latency.", ("route",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 5.0):
+            h.observe(value, "/api/x")
+        text = "\n".join(h.render())
+        assert 'latency_seconds_bucket{route="/api/x",le="0.1"} 1' in text
+        assert 'latency_seconds_bucket{route="/api/x",le="1.0"} 3' in text
+        assert 'latency_seconds_bucket{route="/api/x",le="+Inf"} 4' in text
+        assert 'latency_seconds_count{route="/api/x"} 4' in text
+        assert 'latency_seconds_sum{route="/api/x"} 6.05' in text
+
+    def test_gauge_and_registry_render(self):
+        registry = MetricsRegistry()
+        g = registry.register(Gauge("in_flight", "In flight.", ("method",)))
+        g.inc("GET")
+        g.inc("GET")
+        g.dec("GET")
+        text = registry.render()
+        assert "# TYPE in_flight gauge" in text
+        assert 'in_flight{method="GET"} 1' in text
+
+    def test_label_escaping(self):
+        h = Histogram("x", "X.", ("route",), buckets=(1.0,))
+        h.observe(0.5, 'a"b')
+        assert 'route="a\\"b"' in "\n".join(h.render())
+
+    def test_timed_records_operation(self):
+        with timed("test_operation"):
+            pass
+        assert 'operation="test_operation"' in "\n".join(service_operation_duration.render())
+
+
+
+# ════════════════════════════════════════════════════════════════
+# API Tests
+# ════════════════════════════════════════════════════════════════
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+    from app.main import app
+    # Without `with`, the lifespan (registry preload, pool shutdown) is skipped
+    return TestClient(app, raise_server_exceptions=False)
+
+
+class TestTemplatesAPI:
+    """Invalid input to PATCH /api/templates/{id} gets a 4xx, never a 500."""
+
+    @pytest.fixture(autouse=True)
+    def store(self, tmp_path, monkeypatch):
+        from app.routers import templates
+        store = AsyncTemplateStore(TemplateStore(tmp_path))
+        monkeypatch.setattr(templates, "async_store", store)
+        store.store.save("Plant", "", {"items": [1]})
+        return store
+
+    @pytest.mark.parametrize("patch", [
+        [{"op": "remove", "path": 5}],
+        [{"op": "copy", "from": ["a"], "path": "/b"}],
+        [{"op": "remove", "path": "/items/\u00b2"}],
+        [{"op": "add"}],
+        "not a patch",
+    ])
+    def test_malformed_patch_is_400(self, client, patch):
+        response = client.patch("/api/templates/plant", json=patch)
+        assert response.status_code == 400
+        assert "error" in response.json()
+
+    def test_body_must_be_json(self, client):
+        response = client.patch("/api/templates/plant", content=b"{", headers={"content-type": "application/json"})
+        assert response.status_code == 400
+
+    def test_failed_test_op_is_409(self, client):
+        response = client.patch("/api/templates/plant", json=[{"op": "test", "path": "/items/0", "value": 2}])
+        assert response.status_code == 409
+
+    def test_stale_if_match_is_412(self, client):
+        etag = client.get("/api/templates/plant").headers["etag"]
+        assert client.patch("/api/templates/plant", json={"a": 1}, headers={"If-Match": etag}).status_code == 200
+        assert client.patch("/api/templates/plant", json={"a": 2}, headers={"If-Match": etag}).status_code == 412
+
+    def test_weak_if_match_is_412(self, client):
+        etag = client.get("/api/templates/plant").headers["etag"]
+        assert client.patch("/api/templates/plant", json={"a": 1}, headers={"If-Match": f"W/{etag}"}).status_code == 412
+        assert client.patch("/api/templates/plant", json={"a": 1}, headers={"If-Match": f'"x", {etag}'}).status_code == 200
+
+    def test_missing_template_is_404(self, client):
+        assert client.patch("/api/templates/missing", json={"a": 1}).status_code == 404
+
+    def test_cors_exposes_etag(self, client):
+        response = client.get("/api/templates/plant", headers={"Origin": "http://localhost:3000"})
+        assert "etag" in response.headers["access-control-expose-headers"].lower()
+
+
+
+class TestFormulasAPI:
+    """Invalid input to the formula validation endpoints gets a structured answer, never a 500."""
+
+    @pytest.mark.parametrize("expression", ["abs + 1", "log(a, a)", "round(a, 9**9**9)", "round(a, 1+1)", "a < 1",
+                                            "a + 1" + "0" * 400])
+    def test_dry_run_reports_invalid(self, client, expression):
+        response = client.post("/api/validate-formula",
+                               json={"expression": expression, "enabled_parameters": ["a"], "dry_run": True})
+        assert response.status_code == 200
+        assert response.json()["valid"] is False
+
+    def test_dry_run_mismatched_samples_is_400(self, client):
+        response = client.post("/api/validate-formula", json={
+            "expression": "a + b", "enabled_parameters": ["a", "b"], "dry_run": True,
+            "samples": {"a": [1, 2], "b": [1]},
+        })
+        assert response.status_code == 400
+
+    def test_batch_dry_run_marks_invalid_formula(self, client):
+        response = client.post("/api/validate-formulas", json={
+            "enabled_parameters": ["a"], "dry_run": True,
+            "formulas": [{"parameter_name": "x", "expression": "abs + 1"},
+                         {"parameter_name": "y", "expression": "a / a"}],
+        })
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert results[0]["valid"] is False and results[1]["valid"] is True
+
+    def test_batch_dry_run_rejects_literal_beyond_float_range(self, client):
+        response = client.post("/api/validate-formulas", json={
+            "enabled_parameters": ["a"], "dry_run": True,
+            "formulas": [{"parameter_name": "x", "expression": "a + 1" + "0" * 400}],
+        })
+        assert response.status_code == 200
+        body = response.json()
+        assert body["valid"] is False and body["results"][0]["valid"] is False
+
+
+class TestImportMergeAPI:
+    """Invalid merge plans are rejected before they reach the registry."""
+
+    @pytest.mark.parametrize("name", ["", "   "])
+    def test_blank_parameter_name_is_422(self, client, name):
+        response = client.post("/api/import-parameters/merge", json={"add": [{
+            "name": name, "display_name": "X", "unit": "", "category": "input", "section": "S",
+        }]})
+        assert response.status_code == 422
+
+
+class TestReadingsAPI:
+    """Invalid input to the readings endpoints gets a 4xx or a rejection count, never a 500."""
+
+    @pytest.fixture(autouse=True)
+    def plant(self, tmp_path, monkeypatch):
+        from app.routers import readings
+        from app.services import readings_ingest
+        monkeypatch.setitem(readings_ingest._models, 7, PlantModel(READINGS_PLANT))
+        monkeypatch.setattr(readings, "readings_store", ReadingsStore(tmp_path / "readings"))
+        monkeypatch.setattr(readings, "rollup_store", RollupStore(tmp_path / "rollups.db"))
+
+    def post(self, client, body: bytes, content_type: str = "application/x-ndjson"):
+        return client.post("/api/plants/7/readings", content=body, headers={"content-type": content_type})
+
+    def test_huge_numbers_are_rejected_rows(self, client):
+        big = "1" + "0" * 400
+        body = (f'{{"timestamp": {big}, "steam_generation": 1}}\n'
+                f'{{"timestamp": 1e307, "steam_generation": 1}}\n'
+                f'{{"timestamp": 0, "steam_generation": {big}}}\n'
+                '{"timestamp": 60, "steam_generation": 5}\n').encode()
+        response = self.post(client, body)
+        assert response.status_code == 200
+        assert response.json()["readings"] == 1 and response.json()["rejected"] == 3
+
+    def test_ndjson_lines_split_on_newline_only(self, client):
+        body = ('{"timestamp": 0, "asset": "boiler\u2028\x85", "steam_generation": 1}\r\n'
+                '{"timestamp": 60, "steam_generation": 2}\n').encode()
+        response = self.post(client, body)
+        assert response.status_code == 200
+        summary = response.json()
+        assert summary["readings"] == 1 and summary["rejected"] == 1
+        assert summary["errors"][0].startswith("Line 1: unknown asset")
+
+    def test_ndjson_overlong_line_is_400(self, client):
+        body = b'{"timestamp": 0, "note": "' + b"x" * (2 * 1024 * 1024)
+        assert self.post(client, body).status_code == 400
+
+    def test_unsupported_content_type_is_415(self, client):
+        assert self.post(client, b"x", "text/plain").status_code == 415
+
+    def test_csv_without_timestamp_is_400(self, client):
+        assert self.post(client, b"steam_generation\n1\n", "text/csv").status_code == 400
+
+    def test_aggregates(self, client):
+        self.post(client, b'{"timestamp": 0, "steam_generation": 4}\n{"timestamp": 60, "steam_generation": 6}\n')
+        response = client.get("/api/plants/7/readings/aggregates", params={"parameters": "steam_generation"})
+        assert response.status_code == 200
+        assert response.json()["series"][0]["avg"] == [5.0]
+
+    @pytest.mark.parametrize("params", [
+        {"start": "1e307"}, {"end": "1" + "0" * 400}, {"start": "soon"},
+        {"aggregates": "median"}, {"asset": "b9"}, {"interval": "week"},
+    ])
+    def test_aggregates_invalid_query(self, client, params):
+        response = client.get("/api/plants/7/readings/aggregates", params=params)
+        assert response.status_code in (400, 422)
+
+    def test_csv_unbalanced_quote_is_400(self, client):
+        body = b'timestamp,steam_generation\n0,"1\n' + b"60,2\n" * 250_000
+        assert self.post(client, body, "text/csv").status_code == 400
+
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -1,7 +1,7 @@
 "use client";
 
 import React, { useRef, useState } from "react";
-import { Parameter } from "@/app/types/onboarding";
+import { ImportMergePlan, Parameter } from "@/app/types/onboarding";
 import { importParameters } from "@/app/services/api";
 
 interface ExcelImportProps {
@@ -11,7 +11,7 @@ interface ExcelImportProps {
 export default function ExcelImport({ onImport }: ExcelImportProps) {
     const fileRef = useRef<HTMLInputElement>(null);
     const [loading, setLoading] = useState(false);
-    const [result, setResult] = useState<{ count: number; errors: string[] } | null>(null);
+    const [result, setResult] = useState<{ count: number; errors: string[]; merge?: ImportMergePlan } | null>(null);
 
     const handleFile = async (e: React.ChangeEvent<HTMLInputElement>) => {
         const file = e.target.files?.[0];
@@ -22,7 +22,7 @@ export default function ExcelImport({ onImport }: ExcelImportProps) {
         try {
             const res = await importParameters(file);
             onImport(res.parameters);
-            setResult({ count: res.count, errors: res.errors });
+            setResult({ count: res.count, errors: res.errors, merge: res.merge });
         } catch {
             setResult({ count: 0, errors: ["Failed to import file. Make sure the backend is running."] });
         } finally {
@@ -35,14 +35,14 @@ export default function ExcelImport({ onImport }: ExcelImportProps) {
         <div className="excel-import">
             <div className="import-header">
                 <span className="import-icon">📥</span>
-                <span className="import-label">Import from CSV</span>
+                <span className="import-label">Import from CSV / Excel</span>
             </div>
 
             <div className="import-body">
                 <input
                     ref={fileRef}
                     type="file"
-                    accept=".csv,.tsv,.txt"
+                    accept=".csv,.tsv,.txt,.xlsx"
                     onChange={handleFile}
                     style={{ display: "none" }}
                     id="csv-upload"
@@ -52,7 +52,7 @@ export default function ExcelImport({ onImport }: ExcelImportProps) {
                     onClick={() => fileRef.current?.click()}
                     disabled={loading}
                 >
-                    {loading ? "Importing…" : "📄 Upload CSV File"}
+                    {loading ? "Importing…" : "📄 Upload CSV or Excel File"}
                 </button>
                 <span className="import-hint">
                     Required columns: name, display_name, unit, category, section
@@ -64,6 +64,17 @@ export default function ExcelImport({ onImport }: ExcelImportProps) {
                     {result.count > 0 && (
                         <span className="import-success">✔ Imported {result.count} parameters</span>
                     )}
+                    {result.merge && (
+                        <span className="import-merge">
+                            {result.merge.summary.new} new · {result.merge.summary.identical} already in registry ·{" "}
+                            {result.merge.summary.conflict} conflicting · {result.merge.summary.duplicate} repeated in file
+                        </span>
+                    )}
+                    {result.merge?.conflicts.map((c) => (
+                        <span key={c.name} className="import-error">
+                            ⚠ {c.name}: {c.fields.map((f) => `${f} "${c.existing[f]}" → "${c.incoming[f]}"`).join(", ")}
+                        </span>
+                    ))}
                     {result.errors.map((err, i) => (
                         <span key={i} className="import-error">⚠ {err}</span>
                     ))}
@@ -29,6 +29,8 @@ export default function Step4Formulas({ parameters, formulas, onChange }: Step4P
     const enabledParamNames = parameters.filter((p) => p.enabled).map((p) => p.name);
     const enabledParamNamesRef = useRef(enabledParamNames);
     enabledParamNamesRef.current = enabledParamNames;
+    const parametersRef = useRef(parameters);
+    parametersRef.current = parameters;
 
     // Auto-sync formulas with calculated parameters
     useEffect(() => {
@@ -50,7 +52,7 @@ export default function Step4Formulas({ parameters, formulas, onChange }: Step4P
         (paramName: string, expression: string) => {
             const updated = formulasRef.current.map((f) =>
                 f.parameter_name === paramName
-                    ? { ...f, expression, valid: undefined as boolean | undefined, error: null as string | null }
+                    ? { ...f, expression, valid: undefined as boolean | undefined, error: null as string | null, issues: [] }
                     : f
             );
             onChange(updated);
@@ -63,10 +65,11 @@ export default function Step4Formulas({ parameters, formulas, onChange }: Step4P
 
             debounceTimers.current[paramName] = setTimeout(async () => {
                 try {
-                    const result = await validateFormula(expression, enabledParamNamesRef.current);
+                    const unit = parametersRef.current.find((p) => p.name === paramName)?.unit;
+                    const result = await validateFormula(expression, enabledParamNamesRef.current, { unit });
                     const latest = formulasRef.current.map((f) =>
                         f.parameter_name === paramName
-                            ? { ...f, valid: result.valid, depends_on: result.depends_on, error: result.error }
+                            ? { ...f, valid: result.valid, depends_on: result.depends_on, error: result.error, issues: result.issues }
                             : f
                     );
                     onChange(latest);
@@ -150,6 +153,12 @@ export default function Step4Formulas({ parameters, formulas, onChange }: Step4P
 
                             {f.error && <div className="formula-error">{f.error}</div>}
 
+                            {f.issues?.map((issue) => (
+                                <div key={`${issue.kind}:${issue.expression}`} className="formula-issue">
+                                    ⚠ {issue.message}
+                                </div>
+                            ))}
+
                             {f.depends_on && f.depends_on.length > 0 && (
                                 <div className="formula-deps">
                                     Depends on:{" "}
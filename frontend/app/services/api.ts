@@ -1,4 +1,12 @@
-import { Parameter, FormulaValidationResponse, OnboardingResponse } from "@/app/types/onboarding";
+import {
+    Parameter,
+    FormulaValidationResponse,
+    FormulaDryRunOptions,
+    BatchFormulaValidationResponse,
+    ImportMergePlan,
+    ImportResponse,
+    OnboardingResponse,
+} from "@/app/types/onboarding";
 
 const API_BASE = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000";
 
@@ -13,17 +21,40 @@ export async function fetchParameters(assetTypes: string[]): Promise<Parameter[]
 
 export async function validateFormula(
     expression: string,
-    enabledParameters: string[]
+    enabledParameters: string[],
+    dryRun?: FormulaDryRunOptions
 ): Promise<FormulaValidationResponse> {
     const res = await fetch(`${API_BASE}/api/validate-formula`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ expression, enabled_parameters: enabledParameters }),
+        body: JSON.stringify({
+            expression,
+            enabled_parameters: enabledParameters,
+            ...(dryRun && { dry_run: true, ...dryRun }),
+        }),
     });
     if (!res.ok) throw new Error("Failed to validate formula");
     return res.json();
 }
 
+export async function validateFormulas(
+    formulas: { parameter_name: string; expression: string }[],
+    enabledParameters: string[],
+    dryRun?: { samples?: Record<string, number[]>; units?: Record<string, string> }
+): Promise<BatchFormulaValidationResponse> {
+    const res = await fetch(`${API_BASE}/api/validate-formulas`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({
+            formulas,
+            enabled_parameters: enabledParameters,
+            ...(dryRun && { dry_run: true, ...dryRun }),
+        }),
+    });
+    if (!res.ok) throw new Error("Failed to validate formulas");
+    return res.json();
+}
+
 export async function submitOnboarding(payload: unknown): Promise<OnboardingResponse> {
     const res = await fetch(`${API_BASE}/api/onboarding`, {
         method: "POST",
@@ -37,21 +68,21 @@ export async function submitOnboarding(payload: unknown): Promise<OnboardingResp
 // --- AI Suggestion ---
 export async function suggestParameters(
     description: string,
-    assetTypes: string[]
+    assetTypes: string[],
+    mode: "keyword" | "ranked" = "keyword",
+    topK = 10
 ): Promise<{ suggestions: Parameter[]; count: number }> {
     const res = await fetch(`${API_BASE}/api/suggest-parameters`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ description, asset_types: assetTypes }),
+        body: JSON.stringify({ description, asset_types: assetTypes, mode, top_k: topK }),
     });
     if (!res.ok) throw new Error("Failed to get suggestions");
     return res.json();
 }
 
 // --- CSV Import ---
-export async function importParameters(
-    file: File
-): Promise<{ parameters: Parameter[]; count: number; errors: string[] }> {
+export async function importParameters(file: File): Promise<ImportResponse> {
     const formData = new FormData();
     formData.append("file", file);
     const res = await fetch(`${API_BASE}/api/import-parameters`, {
@@ -62,15 +93,31 @@ export async function importParameters(
     return res.json();
 }
 
+/** Apply an import's merge plan to the registry; `replace` names conflicts that take the imported fields. */
+export async function applyImportMerge(
+    plan: ImportMergePlan,
+    replace: string[] = []
+): Promise<{ added: number; replaced: number; unchanged: number; count: number }> {
+    const res = await fetch(`${API_BASE}/api/import-parameters/merge`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ add: plan.add, conflicts: plan.conflicts, replace }),
+    });
+    if (res.status === 409) throw new Error("The registry changed since this import. Import the file again.");
+    if (!res.ok) throw new Error("Failed to merge parameters");
+    return res.json();
+}
+
 // --- Templates ---
 export interface TemplateInfo {
     id: string;
     name: string;
     description: string;
     created_at: string;
+    version: number;
 }
 
-export async function listTemplates(): Promise<{ templates: TemplateInfo[] }> {
+export async function listTemplates(): Promise<{ templates: TemplateInfo[]; total: number }> {
     const res = await fetch(`${API_BASE}/api/templates`);
     if (!res.ok) throw new Error("Failed to list templates");
     return res.json();
@@ -98,6 +145,47 @@ export async function saveTemplate(
     return res.json();
 }
 
+export type JsonPatchOperation =
+    | { op: "add" | "replace" | "test"; path: string; value: unknown }
+    | { op: "remove"; path: string }
+    | { op: "move" | "copy"; from: string; path: string };
+
+export interface TemplateChange {
+    version: number;
+    format: "json-patch" | "merge-patch";
+    patch: JsonPatchOperation[] | Record<string, unknown>;
+    at: string;
+}
+
+export async function patchTemplate(
+    id: string,
+    patch: JsonPatchOperation[] | Record<string, unknown>,
+    etag?: string
+): Promise<{ status: string; id: string; version: number; etag: string | null }> {
+    const headers: Record<string, string> = {
+        "Content-Type": Array.isArray(patch) ? "application/json-patch+json" : "application/merge-patch+json",
+    };
+    if (etag) headers["If-Match"] = etag;
+    const res = await fetch(`${API_BASE}/api/templates/${id}`, {
+        method: "PATCH",
+        headers,
+        body: JSON.stringify(patch),
+    });
+    if (res.status === 412) throw new Error("Template was changed elsewhere; reload it");
+    if (!res.ok) throw new Error("Failed to patch template");
+    return { ...(await res.json()), etag: res.headers.get("ETag") };
+}
+
+export async function getTemplateChanges(
+    id: string,
+    since: number
+): Promise<{ id: string; version: number; since: number; changes: TemplateChange[] } | null> {
+    const res = await fetch(`${API_BASE}/api/templates/${id}/changes?since=${since}`);
+    if (res.status === 410) return null; // history too old: reload the full template
+    if (!res.ok) throw new Error("Failed to load template changes");
+    return res.json();
+}
+
 export async function deleteTemplate(id: string): Promise<void> {
     const res = await fetch(`${API_BASE}/api/templates/${id}`, { method: "DELETE" });
     if (!res.ok) throw new Error("Failed to delete template");
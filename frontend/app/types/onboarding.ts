@@ -31,6 +31,7 @@ export interface Formula {
   depends_on: string[];
   valid?: boolean;
   error?: string | null;
+  issues?: FormulaIssue[];
 }
 
 // --- Wizard State ---
@@ -43,20 +44,67 @@ export interface WizardState {
 }
 
 // --- API Response Types ---
+export interface FormulaIssue {
+  kind: "division_by_zero" | "domain" | "overflow" | "nan" | "non_finite" | "out_of_range";
+  expression: string;
+  message: string;
+  rows: number;
+  example: Record<string, number | null>;
+}
+
+export interface FormulaDryRunOptions {
+  samples?: Record<string, number[]>;
+  unit?: string;
+}
+
 export interface FormulaValidationResponse {
   valid: boolean;
   depends_on: string[];
   error: string | null;
+  issues: FormulaIssue[];
+}
+
+export interface BatchFormulaValidationResponse {
+  valid: boolean;
+  results: (FormulaValidationResponse & { parameter_name: string })[];
+  evaluation_order: string[];
+  errors: string[];
+  warnings: string[];
+}
+
+type MergeFields = Pick<Parameter, "display_name" | "unit" | "category" | "section">;
+
+export interface ImportMergeConflict {
+  name: string;
+  fields: (keyof MergeFields)[];
+  existing: MergeFields;
+  incoming: MergeFields;
+}
+
+export interface ImportMergePlan {
+  summary: { new: number; identical: number; conflict: number; duplicate: number };
+  add: Omit<Parameter, "enabled">[];
+  conflicts: ImportMergeConflict[];
+  duplicates: { name: string; fields: (keyof MergeFields)[] }[];
+}
+
+export interface ImportResponse {
+  parameters: Parameter[];
+  count: number;
+  errors: string[];
+  merge: ImportMergePlan;
 }
 
 export interface OnboardingResponse {
   status: string;
   message: string;
   summary: {
+    plant_id: number;
     plant_name: string;
     num_assets: number;
     num_parameters: number;
     num_formulas: number;
+    evaluation_order: string[];
     submitted_at: string;
   };
 }